@@ -1,151 +1,473 @@
-from flask import Flask, render_template, request, jsonify
-from flask_socketio import SocketIO
 from dotenv import load_dotenv
 import os
-import chess
-from chess_engine.engine import ChessEngine
-from learning.analyzer import PositionAnalyzer
 
 # Load environment variables
 load_dotenv()
 
+# Green async modes must patch blocking I/O before anything else is imported,
+# so waiting on a Stockfish pipe yields to other games instead of pinning a thread
+ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE') or None
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+import logging
+from flask import Flask, Response, render_template, request, jsonify
+from flask_socketio import SocketIO, join_room, leave_room
+import chess
+from chess_engine import metrics, wire
+from chess_engine.book import OpeningBook, Tablebase
+from chess_engine.cache import AnalysisCache
+from chess_engine.logs import configure_logging
+from chess_engine.pool import EnginePool
+from chess_engine.sessions import SessionStore
+from chess_engine.streaming import AnalysisStreamer
+from learning.analyzer import PositionAnalyzer
+from learning.puzzles import PuzzleStore
+from learning.review import GameReviewer
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev')
-socketio = SocketIO(app)
+socketio = SocketIO(app, async_mode=ASYNC_MODE)
+
+# Initialize the engine pool (one Stockfish process per worker)
+# All workers share one analysis cache, opening book and tablebase
+analysis_cache = AnalysisCache.from_env()
+engine_pool = EnginePool(cache=analysis_cache, book=OpeningBook.from_env(), tablebase=Tablebase.from_env())
+position_analyzer = PositionAnalyzer(engine_pool)
+
+# Server-side games keyed by game ID, so clients only send their moves
+game_sessions = SessionStore()
+
+# Socket clients' negotiated encoding and delta channels, by socket session ID
+wire_clients = {}
 
-# Initialize chess engine
-chess_engine = ChessEngine()
-position_analyzer = PositionAnalyzer()
+# Whole-game reviews, fanned out over the engine pool
+game_reviewer = GameReviewer(engine_pool)
+
+# Puzzles mined offline by generate_puzzles.py (None when PUZZLE_DB_PATH is unset)
+puzzle_store = PuzzleStore.from_env()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def game_room(watch_id, encoding):
+    return f"game:{watch_id}:{encoding}"
+
+def wire_response(response):
+    # MessagePack for clients that prefer it, JSON for everyone else
+    if request.accept_mimetypes.best_match(['application/json', wire.MSGPACK_MIMETYPE]) == wire.MSGPACK_MIMETYPE \
+            and wire.msgpack is not None:
+        return Response(wire.encode(response, 'msgpack'), mimetype=wire.MSGPACK_MIMETYPE)
+    return jsonify(response)
+
+def publish_game(session, state, since=None):
+    """Records a game's new state and pushes it to the game's spectators.
+
+    Returns the fields for the player's response: only the changes when the
+    player already holds the previous state (`since` is its seq), otherwise
+    the whole state.
+    """
+    with session.channel.lock:
+        full, delta = session.channel.update(state)
+        # Spectators know the game by its watch ID only: the game ID would let them play
+        message = dict(delta or full, watch_id=session.watch_id)
+        # Encoded once per encoding, however many spectators there are
+        for encoding in set(session.watchers.values()):
+            socketio.emit('game_update', wire.encode(message, encoding), to=game_room(session.watch_id, encoding))
+    if delta is not None and since == delta['base']:
+        return {'seq': delta['seq'], 'base': delta['base'], 'delta': delta['delta']}
+    return dict(state, seq=full['seq'])
+
+def send_to_client(client_id, event, state):
+    """Emits `state` to one socket client, as a delta and/or MessagePack if it asked for them."""
+    client = wire_clients.get(client_id)
+    if client is None or not client.deltas:
+        socketio.emit(event, wire.encode(state, client.encoding if client else 'json'), to=client_id)
+        return
+    channel = client.channel(event)
+    with channel.lock:
+        full, delta = channel.update(state)
+        socketio.emit(event, wire.encode(delta or full, client.encoding), to=client_id)
+
+def session_for(data):
+    """The game named by data['game_id'], or a new game started from data['fen'].
+
+    Returns None when neither is usable; raises ValueError for a bad FEN.
+    """
+    session = game_sessions.get(data.get('game_id'))
+    if session is None and data.get('fen'):
+        session = game_sessions.create(data['fen'])
+    return session
+
 @app.route('/api/move', methods=['POST'])
 def make_move():
-    data = request.get_json()
-    move_uci = data.get('move') # e.g., "d2d4" or null for AI trigger
-    fen_before_move = data.get('fen') # FEN *before* the move_uci was attempted
-    
-    print(f"API: Received move request - Move: {move_uci}, FEN Before: {fen_before_move}")
-    
-    # --- Set Engine State to BEFORE the move --- 
-    if not chess_engine.set_position(fen_before_move):
-        print(f"API: Error - Failed to set engine position with FEN: {fen_before_move}")
-        return jsonify({'success': False, 'error': 'Invalid FEN received'})
-    
-    # Engine's internal board now reflects fen_before_move
-    board = chess_engine._board 
-    print(f"API: Engine board FEN set to: {board.fen()}")
-    # print(f"API: Legal moves according to engine board: {list(board.legal_moves)}")
+    with metrics.request_timer('api_move'):
+        return _make_move()
 
-    human_move_made = False
-    ai_move_made_uci = None # Store the AI move if one is made
+def _make_move():
+    with metrics.span('parse'):
+        data = request.get_json()
+        move_uci = data.get('move') # e.g., "d2d4" or null for AI trigger
+        # Clients send the game_id of their session; a FEN is only needed to start
+        # a new session (first move, or after the server forgot the game)
+        logger.debug("Move request - Move: %s, Game: %s, FEN: %s", move_uci, data.get('game_id'), data.get('fen'))
+        try:
+            session = session_for(data)
+        except ValueError:
+            logger.info("Invalid FEN received: %s", data.get('fen'))
+            return jsonify({'success': False, 'error': 'Invalid FEN received'})
+    if session is None:
+        return jsonify({'success': False, 'error': 'Unknown game', 'unknown_game': True})
     
-    try:
-        # --- Process Human Move (if any) --- 
-        if move_uci:
-            print(f"API: Processing human move: {move_uci}")
-            # make_move validates against the current board state (fen_before_move) 
-            # and updates the engine's internal board if valid.
-            if chess_engine.make_move(move_uci):
-                print(f"API: Human move {move_uci} successful (Engine board updated).")
-                human_move_made = True
-            else:
-                print(f"API: Illegal human move: {move_uci} for FEN {fen_before_move}")
-                # Return error immediately if human move is invalid
-                return jsonify({'success': False, 'error': f'Illegal move: {move_uci}'}) 
-        else:
-            print("API: No human move provided (likely AI trigger).")
-
-        # --- Check and Process AI Move (if applicable) --- 
-        # Check if AI should move based on the board state *after* the potential human move
-        if chess_engine.should_ai_move(): 
-            print(f"API: AI's turn. Getting AI move for position: {board.fen()}")
-            ai_move_made_uci = chess_engine.get_ai_move()
-            print(f"API: AI suggested move: {ai_move_made_uci}")
+    # The AI move and the analysis run on separate workers, each already in
+    # its own mode, and share one request budget
+    deadline = engine_pool.request_deadline()
+    with session.lock:
+        try:
+            with engine_pool.engine(prefer=session.last_engine, deadline=deadline) as chess_engine:
+                # --- Load the session's game into the engine --- 
+                with metrics.span('position'):
+                    chess_engine.set_game(session.game_id, session.board)
+                session.last_engine = chess_engine
+                
+                # Engine's internal board now holds the game before this move
+                board = chess_engine._board 
+                fen_before_move = board.fen()
+
+                ai_move_made_uci = None # Store the AI move if one is made
+
+                # --- Process Human Move (if any) --- 
+                if move_uci:
+                    # make_move validates against the current board state (fen_before_move) 
+                    # and updates the engine's internal board if valid.
+                    if not chess_engine.make_move(move_uci):
+                        logger.info("Illegal move %s for FEN %s", move_uci, fen_before_move)
+                        # Return error immediately if human move is invalid
+                        return jsonify({'success': False, 'error': f'Illegal move: {move_uci}'}) 
+
+                # --- Check and Process AI Move (if applicable) --- 
+                # Check if AI should move based on the board state *after* the potential human move
+                if chess_engine.should_ai_move(): 
+                    ai_move_made_uci = chess_engine.get_ai_move()
+                    
+                    if ai_move_made_uci:
+                        # Make the AI move (validates and updates engine board)
+                        if not chess_engine.make_move(ai_move_made_uci):
+                            # This is a serious issue - engine suggested then rejected its own move
+                            logger.error("AI move %s deemed illegal after generation", ai_move_made_uci)
+                            return jsonify({'success': False, 'error': f'Engine generated invalid move: {ai_move_made_uci}'}) 
+                    else:
+                        logger.debug("AI did not return a move for %s", board.fen())
+
+                # The session keeps the game, move stack included
+                session.board = chess_engine.get_board()
+                ai_move_source = chess_engine.get_ai_move_source() if ai_move_made_uci else None
+                # Depth/nodes/time the AI search reached within its budget
+                ai_search = chess_engine.get_last_search() if ai_move_made_uci else None
+
+                # Think about the human's most likely reply until their move arrives
+                if ai_move_made_uci:
+                    chess_engine.start_ponder()
+
+            # --- Prepare Response --- 
+            # Get the final state from the session's board
+            final_fen = session.board.fen()
+            with engine_pool.engine(prefer=session.last_analysis_engine, role='analysis',
+                                    deadline=deadline) as analysis_engine:
+                with metrics.span('position'):
+                    analysis_engine.set_game(session.game_id, session.board)
+                session.last_analysis_engine = analysis_engine
+                analysis = analysis_engine.analyze_position(final_fen)
+            with metrics.span('insights'):
+                insights = position_analyzer.analyze_position(final_fen, analysis)
             
-            if ai_move_made_uci:
-                # Make the AI move (validates and updates engine board)
-                if chess_engine.make_move(ai_move_made_uci):
-                    print(f"API: AI move {ai_move_made_uci} successful (Engine board updated).")
-                else:
-                    # This is a serious issue - engine suggested then rejected its own move
-                    print(f"API: Error - AI move {ai_move_made_uci} deemed illegal after generation?")
-                    return jsonify({'success': False, 'error': f'Engine generated invalid move: {ai_move_made_uci}'}) 
-            else:
-                print("API: AI did not return a move (or suggested invalid one).")
-        else:
-            print("API: Not AI's turn.")
-
-        # --- Prepare Response --- 
-        # Get the final state from the engine's board
-        final_fen = board.fen()
-        analysis = chess_engine.analyze_position(final_fen)
-        insights = position_analyzer.analyze_position(final_fen)
-        
-        response = {
-            'success': True,
-            'fen': final_fen, # The FEN *after* all successful moves (human and/or AI)
-            'analysis': analysis,
-            'insights': insights,
-            'ai_move': ai_move_made_uci # Send back AI move UCI if one was made this turn
-        }
-        print(f"API: Sending successful response: {response}")
-        return jsonify(response)
+            state = {
+                'fen': final_fen, # The FEN *after* all successful moves (human and/or AI)
+                'analysis': analysis,
+                'insights': insights,
+                'ai_move': ai_move_made_uci, # Send back AI move UCI if one was made this turn
+                'ai_move_source': ai_move_source,
+                'ai_search': ai_search
+            }
+            with metrics.span('serialize'):
+                response = {'success': True, 'game_id': session.game_id, 'watch_id': session.watch_id,
+                            **publish_game(session, state, data.get('since'))}
+                logger.debug("Move response: %s", response)
+                return wire_response(response)
         
-    except Exception as e:
-        print(f"API: Error processing move sequence: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': f'Server error: {str(e)}'})
+        except Exception as e:
+            logger.exception("Error processing move sequence")
+            return jsonify({'success': False, 'error': f'Server error: {str(e)}'})
+
+def same_position(board, fen):
+    """Whether `fen` describes `board`'s position, move counters included.
+
+    chess.js always writes the en passant square after a double pawn push,
+    python-chess only when the capture is legal, so `fen` is parsed first.
+    """
+    try:
+        return board.fen() == chess.Board(fen).fen()
+    except ValueError:
+        return False
 
 @app.route('/api/undo', methods=['POST'])
 def undo_move():
-    data = request.get_json()
-    fen_after_undo = data.get('fen') # Get the FEN state we want to revert TO
+    with metrics.request_timer('api_undo'):
+        return _undo_move()
+
+def _undo_move():
+    with metrics.span('parse'):
+        data = request.get_json()
+        fen_after_undo = data.get('fen') # Get the FEN state we want to revert TO
+        session = game_sessions.get(data.get('game_id'))
     
-    if not fen_after_undo:
-        print("API: Undo request missing FEN.")
-        return jsonify({'success': False, 'error': 'FEN required for undo'}), 400
+    if session is None and not fen_after_undo:
+        logger.info("Undo request missing game and FEN")
+        return jsonify({'success': False, 'error': 'Game or FEN required for undo'}), 400
         
-    print(f"API: Received undo request. Reverting engine to FEN: {fen_after_undo}")
+    logger.debug("Undo request - Game: %s, target FEN: %s", data.get('game_id'), fen_after_undo)
     
     try:
-        # Set the engine's position to the provided FEN
-        if not chess_engine.set_position(fen_after_undo):
-            print(f"API: Error - Failed to set engine position during undo: {fen_after_undo}")
-            return jsonify({'success': False, 'error': 'Invalid FEN during undo'}) 
+        # Take back one ply in the session; start a new session from the FEN
+        # if there is no game to undo in or it disagrees with the client
+        if session is not None:
+            with session.lock:
+                if session.board.move_stack:
+                    board = session.board.copy()
+                    board.pop()
+                    if fen_after_undo and not same_position(board, fen_after_undo):
+                        session = None
+                    else:
+                        session.board = board
+                else:
+                    session = None
+        if session is None:
+            try:
+                with metrics.span('parse'):
+                    session = game_sessions.create(fen_after_undo)
+            except ValueError:
+                logger.info("Invalid FEN during undo: %s", fen_after_undo)
+                return jsonify({'success': False, 'error': 'Invalid FEN during undo'}) 
         
-        # Get analysis and insights for the reverted position
-        # Note: analyze_position uses the higher analysis settings automatically
-        analysis = chess_engine.analyze_position(fen_after_undo)
-        insights = position_analyzer.analyze_position(fen_after_undo)
+        with session.lock, engine_pool.engine(prefer=session.last_analysis_engine, budgeted=True,
+                                              role='analysis') as chess_engine:
+            with metrics.span('position'):
+                chess_engine.set_game(session.game_id, session.board)
+            session.last_analysis_engine = chess_engine
+            fen_after_undo = session.board.fen()
+            
+            # Get analysis and insights for the reverted position
+            # Note: analyze_position uses the higher analysis settings automatically
+            analysis = chess_engine.analyze_position(fen_after_undo)
+        with metrics.span('insights'):
+            insights = position_analyzer.analyze_position(fen_after_undo, analysis)
         
-        response = {
-            'success': True,
+        state = {
             'fen': fen_after_undo, # Confirm the FEN state
             'analysis': analysis,
-            'insights': insights
-            # No 'ai_move' here, as we don't trigger one on undo
+            'insights': insights,
+            'ai_move': None, # No AI move on undo
+            'ai_move_source': None,
+            'ai_search': None
         }
-        print(f"API: Sending undo response: {response}")
-        return jsonify(response)
+        with metrics.span('serialize'):
+            response = {'success': True, 'game_id': session.game_id, 'watch_id': session.watch_id,
+                        **publish_game(session, state, data.get('since'))}
+            logger.debug("Undo response: %s", response)
+            return wire_response(response)
         
     except Exception as e:
-        print(f"API: Error processing undo request: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error processing undo request")
         return jsonify({'success': False, 'error': f'Server error during undo: {str(e)}'}), 500
 
+@app.route('/api/game/<game_id>', methods=['GET'])
+def get_game_state(game_id):
+    # The game's latest full state, for a client whose delta did not apply;
+    # replaying the move or undo instead would apply it twice
+    session = game_sessions.get(game_id)
+    snapshot = session.channel.snapshot() if session is not None else None
+    if snapshot is None:
+        return jsonify({'success': False, 'error': 'Unknown game', 'unknown_game': True}), 404
+    return wire_response({'success': True, 'game_id': session.game_id, 'watch_id': session.watch_id,
+                          **snapshot['full'], 'seq': snapshot['seq']})
+
+def emit_stream_update(client_id, fen, analysis, final):
+    with metrics.span('insights'):
+        insights = position_analyzer.analyze_position(fen, analysis)
+    with metrics.span('emit'):
+        send_to_client(client_id, 'analysis_update', {
+            'fen': fen,
+            'analysis': analysis,
+            'insights': insights,
+            'final': final
+        })
+
+analysis_streamer = AnalysisStreamer(engine_pool, socketio.start_background_task, emit_stream_update)
+
 @socketio.on('analyze_position')
-def handle_analysis(fen):
-    analysis = chess_engine.analyze_position(fen)
-    insights = position_analyzer.analyze_position(fen)
-    socketio.emit('analysis_update', {
-        'analysis': analysis,
-        'insights': insights
-    })
+def handle_analysis(data):
+    # Accepts a bare FEN (one-shot analysis) or {'fen': ..., 'stream': true}
+    # for progressive deepening with an update per completed depth
+    if isinstance(data, dict):
+        fen, stream = data.get('fen'), data.get('stream', False)
+    else:
+        fen, stream = data, False
+    if not fen:
+        return
+    if stream:
+        # Replaces (and stops) this client's previous streaming search
+        analysis_streamer.start(request.sid, fen)
+        return
+    with metrics.request_timer('socket_analyze'):
+        analysis = engine_pool.analyze(fen, budgeted=True)
+        with metrics.span('insights'):
+            insights = position_analyzer.analyze_position(fen, analysis)
+        with metrics.span('emit'):
+            send_to_client(request.sid, 'analysis_update', {
+                'fen': fen,
+                'analysis': analysis,
+                'insights': insights,
+                'final': True
+            })
+
+@socketio.on('stop_analysis')
+def handle_stop_analysis():
+    analysis_streamer.stop(request.sid)
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    # Clients opt in to MessagePack and delta updates: io({auth: {encoding: 'msgpack', deltas: true}})
+    auth = auth if isinstance(auth, dict) else {}
+    wire_clients[request.sid] = wire.Client(wire.negotiate(auth.get('encoding')), bool(auth.get('deltas')))
+
+@socketio.on('watch_game')
+def handle_watch_game(data):
+    # Spectators name the game by its watch ID, join its room and get its
+    # current state, then one game_update (seq/full or seq/base/delta) per move
+    watch_id = data.get('watch_id') if isinstance(data, dict) else data
+    session = game_sessions.get_watched(watch_id)
+    client = wire_clients.get(request.sid)
+    if session is None or client is None:
+        socketio.emit('watch_error', {'watch_id': watch_id, 'error': 'Unknown game'}, to=request.sid)
+        return
+    with session.channel.lock:
+        join_room(game_room(watch_id, client.encoding))
+        session.watchers[request.sid] = client.encoding
+        client.watching.add(watch_id)
+        send_game_snapshot(request.sid, client, session)
+
+@socketio.on('unwatch_game')
+def handle_unwatch_game(data):
+    watch_id = data.get('watch_id') if isinstance(data, dict) else data
+    client = wire_clients.get(request.sid)
+    if client is None or watch_id not in client.watching:
+        return
+    client.watching.discard(watch_id)
+    session = game_sessions.get_watched(watch_id)
+    if session is not None:
+        with session.channel.lock:
+            session.watchers.pop(request.sid, None)
+    leave_room(game_room(watch_id, client.encoding))
+
+@socketio.on('wire_resync')
+def handle_wire_resync(event):
+    # A client that cannot apply a delta asks for the full state again
+    client = wire_clients.get(request.sid)
+    if client is None:
+        return
+    if event == 'game_update':
+        for watch_id in list(client.watching):
+            session = game_sessions.get_watched(watch_id)
+            if session is not None:
+                with session.channel.lock:
+                    send_game_snapshot(request.sid, client, session)
+    else:
+        client.channel(event).reset()
+
+def send_game_snapshot(client_id, client, session):
+    # Caller holds session.channel.lock, so no move can slip in between
+    snapshot = session.channel.snapshot()
+    if snapshot is not None:
+        socketio.emit('game_update', wire.encode(dict(snapshot, watch_id=session.watch_id), client.encoding),
+                      to=client_id)
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    analysis_streamer.stop(request.sid)
+    client = wire_clients.pop(request.sid, None)
+    for watch_id in client.watching if client is not None else ():
+        session = game_sessions.get_watched(watch_id)
+        if session is not None:
+            with session.channel.lock:
+                session.watchers.pop(request.sid, None)
+
+@app.route('/api/review', methods=['POST'])
+def review_game():
+    # Full-game review: evaluation, best move and centipawn loss for every move
+    data = request.get_json()
+    pgn = data.get('pgn')
+    if not pgn:
+        return jsonify({'success': False, 'error': 'PGN required for review'}), 400
+    try:
+        review = game_reviewer.review_pgn(pgn)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, **review})
+
+@socketio.on('review_game')
+def handle_review_game(data):
+    # Same review over the socket, with a review_progress event per move as it completes
+    pgn = data.get('pgn') if isinstance(data, dict) else data
+    client_id = request.sid
+
+    def run_review():
+        try:
+            review = game_reviewer.review_pgn(
+                pgn,
+                on_move=lambda move, done, total: socketio.emit(
+                    'review_progress', {'move': move, 'done': done, 'total': total}, to=client_id)
+            )
+        except ValueError as e:
+            socketio.emit('review_error', {'error': str(e)}, to=client_id)
+            return
+        socketio.emit('review_complete', review, to=client_id)
+
+    if not pgn:
+        socketio.emit('review_error', {'error': 'PGN required for review'}, to=client_id)
+        return
+    socketio.start_background_task(run_review)
+
+@app.route('/api/puzzles', methods=['GET'])
+def get_puzzles():
+    # Random puzzles, optionally filtered by theme and rating range
+    if puzzle_store is None:
+        return jsonify({'success': False, 'error': 'No puzzle store configured'}), 404
+    # Unparseable numbers fall back to no bound / the default limit
+    filters = {name: request.args.get(name, type=int) for name in ('min_rating', 'max_rating')}
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    puzzles = puzzle_store.query(theme=request.args.get('theme'), limit=limit, **filters)
+    return jsonify({'success': True, 'puzzles': puzzles})
+
+@app.route('/api/puzzles/themes', methods=['GET'])
+def get_puzzle_themes():
+    if puzzle_store is None:
+        return jsonify({'success': False, 'error': 'No puzzle store configured'}), 404
+    return jsonify({'success': True, 'themes': puzzle_store.themes(), 'total': puzzle_store.count()})
+
+@app.route('/api/puzzles/<puzzle_id>', methods=['GET'])
+def get_puzzle(puzzle_id):
+    puzzle = puzzle_store.get(puzzle_id) if puzzle_store is not None else None
+    if puzzle is None:
+        return jsonify({'success': False, 'error': 'Puzzle not found'}), 404
+    return jsonify({'success': True, 'puzzle': puzzle})
 
 @app.route('/api/engine/settings', methods=['GET', 'POST'])
 def handle_engine_settings():
@@ -170,20 +492,46 @@ def handle_engine_settings():
                      raise ValueError("Skill level out of range")
             except ValueError:
                 return jsonify({'error': 'Invalid skill level value'}), 400
+
+        # Search budgets: AI movetime (ms), AI node limit, request latency SLO (ms); 0 removes a limit
+        budgets = {}
+        for name, limit in (('movetime', 600000), ('nodes', 10**10), ('slo_ms', 600000)):
+            value = data.get(name)
+            if value is None:
+                continue
+            try:
+                value = int(value)
+                if not (0 <= value <= limit):
+                    raise ValueError(f"{name} out of range")
+            except ValueError:
+                return jsonify({'error': f'Invalid {name} value'}), 400
+            budgets[name] = value
         
         # Update settings using the correct method name
-        print(f"API: Updating AI settings - Depth: {depth}, Skill: {skill_level}")
-        chess_engine.update_engine_settings(depth=depth, skill_level=skill_level)
+        engine_pool.update_engine_settings(depth=depth, skill_level=skill_level, **budgets)
         
         # Get the current settings after update to return them
-        current_settings = chess_engine.get_engine_settings()
-        print(f"API: Returning updated AI settings: {current_settings}")
+        current_settings = engine_pool.get_engine_settings()
+        logger.info("AI settings updated: %s", current_settings)
         return jsonify(current_settings)
     else:
         # GET request - return current settings
-        current_settings = chess_engine.get_engine_settings()
-        print(f"API: Getting current AI settings: {current_settings}")
-        return jsonify(current_settings)
+        return jsonify(engine_pool.get_engine_settings())
+
+@app.route('/api/engine/cache', methods=['GET'])
+def handle_engine_cache():
+    # Hit/miss counters for the shared analysis cache, plus searches saved by coalescing
+    return jsonify(dict(analysis_cache.stats(), coalescing=engine_pool.coalescer.stats()))
+
+@app.route('/metrics', methods=['GET'])
+def handle_metrics():
+    # Request, stage and search histograms in Prometheus text format
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/engine/resources', methods=['GET'])
+def handle_engine_resources():
+    # Threads, hash and CPU placement of every engine worker
+    return jsonify(engine_pool.resources())
 
 @app.route('/api/engine/side', methods=['GET', 'POST'])
 def handle_engine_side():
@@ -193,19 +541,18 @@ def handle_engine_side():
         
         # Validate and set the side in the engine
         if side not in ['white', 'black', None]:
-            print(f"API: Invalid side received: {side}. Setting to None.")
+            logger.info("Invalid side received: %s. Setting to None.", side)
             side = None # Default to None for invalid inputs
             
-        # Update AI side in the engine instance
-        chess_engine.set_ai_side(side)
-        print(f"API: AI side set to {side}")
+        # Update AI side for all engine workers
+        engine_pool.set_ai_side(side)
+        logger.info("AI side set to %s", side)
         
         # Return the successfully set side
         return jsonify({'ai_side': side})
     else:
-        # GET request - return current side from the engine
-        current_side = chess_engine.get_ai_side()
-        print(f"API: Getting current AI side: {current_side}")
+        # GET request - return current side from the engine pool
+        current_side = engine_pool.get_ai_side()
         # Ensure response is always a valid JSON object
         return jsonify({'ai_side': current_side})
 
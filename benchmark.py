@@ -0,0 +1,310 @@
+"""Latency and throughput benchmarks for the Python side of the engine stack.
+
+Stockfish's own `bench` measures the C++ search alone. These suites replay a
+fixed corpus through the layers on top of it:
+
+    ai_move    ChessEngine.get_ai_move
+    analysis   ChessEngine.analyze_position
+    insights   PositionAnalyzer.analyze_position (given a precomputed analysis)
+    http_move  POST /api/move through the Flask test client
+
+Every suite runs at each concurrency level with that many client threads
+and, for the engine suites, a pool of that many Stockfish processes. Results
+(p50/p95/p99 latency, throughput) are written as JSON so runs on different
+commits can be compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+Searches are limited by depth, never by time, and every position starts
+from a fresh hash (ucinewgame), so the engine does the same work on every
+run. The analysis cache, opening book, tablebases and engine farm are
+turned off, as are the latency SLO and the analysis time and node budgets.
+The AI opponent's Skill Level picks among its candidate moves at random, so
+the moves it plays (not the work it does) can differ between runs.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import chess
+import chess.pgn
+
+# Fixed corpus: opening, middlegame and endgame positions...
+FENS = [
+    chess.STARTING_FEN,
+    'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+    'rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5',
+    'r1bq1rk1/ppp2ppp/2np1n2/2b1p3/2B1P3/2PP1N2/PP3PPP/RNBQ1RK1 w - - 1 7',
+    'r2q1rk1/pp2bppp/2n1pn2/3p4/3P1B2/2PB1N2/PP1N1PPP/R2QK2R w KQ - 4 10',
+    'r1b2rk1/2q1bppp/p2p1n2/np2p3/3PP3/5N1P/PPBN1PP1/R1BQR1K1 b - - 1 13',
+    '2rq1rk1/pb2bppp/1pn1pn2/2pp4/3P4/1PNBPN2/PB3PPP/2RQ1RK1 w - - 2 12',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1',
+    '8/8/4k3/8/2p5/2P5/2K5/8 w - - 0 1',
+    '8/5pk1/6p1/7p/7P/6P1/5PK1/8 w - - 0 1',
+    '4r1k1/pp3ppp/8/3p4/3P4/P7/1P3PPP/4R1K1 b - - 0 25',
+]
+
+# ...plus every position of one complete game (Morphy - Duke of Brunswick and
+# Count Isouard, Paris 1858), which /api/move replays move by move
+PGN = """
+1. e4 e5 2. Nf3 d6 3. d4 Bg4 4. dxe5 Bxf3 5. Qxf3 dxe5 6. Bc4 Nf6 7. Qb3 Qe7
+8. Nc3 c6 9. Bg5 b5 10. Nxb5 cxb5 11. Bxb5+ Nbd7 12. O-O-O Rd8 13. Rxd7 Rxd7
+14. Rd1 Qe6 15. Bxd7+ Nxd7 16. Qb8+ Nxb8 17. Rd8# 1-0
+"""
+
+SUITES = ['ai_move', 'analysis', 'insights', 'http_move']
+
+
+def load_corpus(pgn=None):
+    """Corpus positions as FENs, plus the (fen, move) pairs of the game."""
+    game = chess.pgn.read_game(io.StringIO(pgn or PGN))
+    if game is None:
+        raise ValueError("No game found in PGN")
+    board = game.board()
+    moves = []
+    for move in game.mainline_moves():
+        moves.append((board.fen(), move.uci()))
+        board.push(move)
+    fens = FENS + [fen for fen, _ in moves]
+    return fens, moves
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def summarize(latencies, wall, errors):
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        'ops': len(latencies),
+        'errors': errors,
+        'wall_seconds': round(wall, 3),
+        'throughput': round(len(latencies) / wall, 3) if wall else None,
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'p99': ms(percentile(latencies, 99)),
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+            'min': ms(latencies[0]) if latencies else None,
+            'max': ms(latencies[-1]) if latencies else None
+        }
+    }
+
+
+def run_concurrent(items, concurrency, operation):
+    """Run operation(item) over `items` from `concurrency` threads.
+
+    operation returns the seconds to count for that item (so per-item setup
+    can be left out of the measurement). Returns the latencies, the wall
+    time and the number of failed items.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(operation, item) for item in items]
+    elapsed = time.perf_counter() - start
+    # Counted from the futures, so threads never update a shared counter
+    latencies = [future.result() for future in futures if future.exception() is None]
+    return latencies, elapsed, len(futures) - len(latencies)
+
+
+def engine_suites(suites, fens, concurrency, rounds, ai_depth, analysis_depth):
+    """ai_move, analysis and insights suites on a fresh pool of `concurrency` engines."""
+    from chess_engine.pool import EnginePool
+    from learning.analyzer import PositionAnalyzer
+
+    pool = EnginePool(size=concurrency, cache=None, ponder=False)
+    try:
+        return _run_engine_suites(pool, PositionAnalyzer(), suites, fens * rounds, fens, ai_depth, analysis_depth)
+    finally:
+        pool.close()
+
+
+def _run_engine_suites(pool, analyzer, suites, items, fens, ai_depth, analysis_depth):
+    pool.update_engine_settings(depth=ai_depth)
+    concurrency = pool.size
+    results = {}
+
+    def ai_move(fen):
+        with pool.engine() as chess_engine:
+            chess_engine.set_position(fen) # ucinewgame: fresh hash every time
+            chess_engine.set_ai_side('white' if chess.Board(fen).turn == chess.WHITE else 'black')
+            start = time.perf_counter()
+            chess_engine.get_ai_move()
+            return time.perf_counter() - start
+
+    def analysis(fen):
+        with pool.engine() as chess_engine:
+            chess_engine.set_position(fen)
+            start = time.perf_counter()
+            chess_engine.analyze_position(fen, depth=analysis_depth)
+            return time.perf_counter() - start
+
+    if 'ai_move' in suites:
+        results['ai_move'] = run_concurrent(items, concurrency, ai_move)
+    if 'analysis' in suites:
+        results['analysis'] = run_concurrent(items, concurrency, analysis)
+    if 'insights' in suites:
+        # Analyse once up front so only the Python feature extraction is timed
+        with pool.engine() as chess_engine:
+            analyses = {fen: chess_engine.analyze_position(fen, depth=analysis_depth) for fen in fens}
+
+        def insights(fen):
+            start = time.perf_counter()
+            analyzer.analyze_position(fen, analyses[fen])
+            return time.perf_counter() - start
+
+        results['insights'] = run_concurrent(items, concurrency, insights)
+    return results
+
+
+def http_suite(app_module, moves, concurrency, rounds):
+    """POST /api/move for every move of the game, each as a new session."""
+    client = app_module.app.test_client()
+
+    def post_move(item):
+        fen, move = item
+        start = time.perf_counter()
+        response = client.post('/api/move', json={'fen': fen, 'move': move})
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200 or not response.get_json().get('success'):
+            raise RuntimeError(f"/api/move failed for {fen} {move}")
+        return elapsed
+
+    return run_concurrent(moves * rounds, concurrency, post_move)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextlib.contextmanager
+def quiet_logging():
+    """Hides the engine's and app's per-request logging; warnings still show."""
+    logging.disable(logging.INFO)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def compare(results, baseline):
+    """Print p50/p95/throughput changes against a baseline results file."""
+    previous = {(r['suite'], r['concurrency']): r for r in baseline['results']}
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'}:", file=sys.stderr)
+    for result in results:
+        old = previous.get((result['suite'], result['concurrency']))
+        if old is None:
+            continue
+        changes = []
+        for label, new_value, old_value in (
+            ('p50', result['latency_ms']['p50'], old['latency_ms']['p50']),
+            ('p95', result['latency_ms']['p95'], old['latency_ms']['p95']),
+            ('throughput', result['throughput'], old['throughput'])
+        ):
+            if new_value is not None and old_value:
+                changes.append(f"{label} {(new_value - old_value) / old_value * 100:+.1f}%")
+        print(f"  {result['suite']:<10} x{result['concurrency']:<3} {', '.join(changes)}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=SUITES)
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 2, 4],
+                        help="client threads (and engine processes) per run")
+    parser.add_argument('--rounds', type=int, default=1, help="passes over the corpus per run")
+    parser.add_argument('--ai-depth', type=int, default=5)
+    parser.add_argument('--analysis-depth', type=int, default=15)
+    parser.add_argument('--pgn', help="PGN file to replay instead of the built-in game")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="results JSON of an earlier run to compare against")
+    parser.add_argument('--verbose', action='store_true', help="show engine and app logging")
+    args = parser.parse_args(argv)
+
+    pgn = None
+    if args.pgn:
+        with open(args.pgn) as f:
+            pgn = f.read()
+    fens, moves = load_corpus(pgn)
+
+    # Every request must reach a local engine: no cache, book, tablebase or
+    # farm; and searches stop at their depth, with no time or node budget
+    os.environ.update({
+        'ANALYSIS_CACHE_SIZE': '0', 'ANALYSIS_CACHE_PATH': '', 'OPENING_BOOK_PATH': '',
+        'SYZYGY_PATH': '', 'ENGINE_PONDER': 'false', 'ENGINE_POOL_SIZE': str(max(args.concurrency)),
+        'ENGINE_SPARES': '0', 'ENGINE_RECYCLE_AFTER': '0', 'ENGINE_BROKER': '',
+        'ENGINE_SLO_MS': '0', 'ANALYSIS_MOVETIME_MS': '0', 'ANALYSIS_NODES': '0'
+    })
+    quiet = contextlib.nullcontext if args.verbose else quiet_logging
+
+    results = []
+
+    def record(suite, concurrency, engines, measured):
+        result = {'suite': suite, 'concurrency': concurrency, 'engines': engines, **summarize(*measured)}
+        results.append(result)
+        latency = result['latency_ms']
+        print(f"{suite:<10} x{concurrency:<3} {result['ops']:>5} ops  {result['throughput'] or 0:>8.2f} ops/s  "
+              f"p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms"
+              + (f"  ({result['errors']} errors)" if result['errors'] else ""), file=sys.stderr)
+
+    app_module = None
+    for concurrency in args.concurrency:
+        with quiet():
+            measured = engine_suites(args.suites, fens, concurrency, args.rounds, args.ai_depth, args.analysis_depth)
+        for suite, values in measured.items():
+            record(suite, concurrency, concurrency, values)
+
+        if 'http_move' in args.suites:
+            with quiet():
+                if app_module is None:
+                    import app as app_module # Starts the app's own engine pool
+                values = http_suite(app_module, moves, concurrency, args.rounds)
+            record('http_move', concurrency, app_module.engine_pool.size, values)
+
+    output = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'stockfish': os.path.basename(os.getenv('STOCKFISH_PATH') or ''),
+            'positions': len(fens),
+            'moves': len(moves),
+            'rounds': args.rounds,
+            'ai_depth': args.ai_depth,
+            'analysis_depth': args.analysis_depth
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return output
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import os
+import chess
+import chess.polyglot
+import chess.syzygy
+
+# Score reported for tablebase wins: decisive, but below the mate scores the
+# game review folds mates into (learning.review.MATE_SCORE = 10000), so a
+# move that mates never looks worse than the tablebase's top move
+TB_WIN_SCORE = 9000
+
+
+class OpeningBook:
+    """Polyglot opening book lookups for positions that do not need a search."""
+
+    def __init__(self, path):
+        self._reader = chess.polyglot.open_reader(path)
+
+    @classmethod
+    def from_env(cls):
+        path = os.getenv('OPENING_BOOK_PATH')
+        return cls(path) if path else None
+
+    def choose(self, board):
+        """A book move picked at random by weight, or None if out of book."""
+        try:
+            return self._reader.weighted_choice(board).move
+        except IndexError:
+            return None
+
+    def analyze(self, board, num_moves=3):
+        """Book moves in the analysis format (most played first), or None if out of book."""
+        entries = sorted(self._reader.find_all(board), key=lambda entry: entry.weight, reverse=True)
+        if not entries:
+            return None
+        best_moves = []
+        for entry in entries:
+            if entry.move.uci() in (m['Move'] for m in best_moves):
+                continue
+            best_moves.append({'Move': entry.move.uci(), 'Centipawn': None, 'Mate': None,
+                               'PV': [entry.move.uci()], 'Weight': entry.weight})
+            if len(best_moves) == num_moves:
+                break
+        # A book line carries no score; book positions are treated as balanced
+        return {'evaluation': {'type': 'cp', 'value': 0}, 'best_moves': best_moves, 'depth': 0, 'source': 'book'}
+
+
+class Tablebase:
+    """Syzygy tablebase probes: exact results for positions with few pieces."""
+
+    def __init__(self, path):
+        self._tablebase = chess.syzygy.open_tablebase(path)
+        # Table names look like "KQvK": one letter per piece plus the "v"
+        self.max_pieces = max((len(name) - 1 for name in self._tablebase.wdl), default=0)
+
+    @classmethod
+    def from_env(cls):
+        path = os.getenv('SYZYGY_PATH')
+        return cls(path) if path else None
+
+    def covers(self, board):
+        return chess.popcount(board.occupied) <= self.max_pieces and not board.castling_rights
+
+    def _ranked_moves(self, board):
+        """Legal moves ranked best first for the side to move, with their WDL.
+
+        Wins are ranked by the fewest plies to the next capture or pawn move
+        (DTZ), losses by the most, so the winning side makes progress and the
+        losing side holds out. Returns None if a table is missing.
+        """
+        ranked = []
+        for move in board.legal_moves:
+            board.push(move)
+            try:
+                if board.is_checkmate():
+                    wdl, dtz = 2, 0
+                else:
+                    wdl = -self._tablebase.probe_wdl(board)
+                    dtz = abs(self._tablebase.probe_dtz(board))
+            except KeyError:
+                return None
+            finally:
+                board.pop()
+            ranked.append((wdl, -dtz if wdl > 0 else dtz, move))
+        ranked.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        return ranked
+
+    def best_move(self, board):
+        if not self.covers(board):
+            return None
+        ranked = self._ranked_moves(board)
+        return ranked[0][2] if ranked else None
+
+    def analyze(self, board, num_moves=3):
+        """Exact evaluation and best moves, or None if the position is not covered."""
+        if not self.covers(board):
+            return None
+        ranked = self._ranked_moves(board)
+        if ranked is None:
+            return None
+        sign = 1 if board.turn == chess.WHITE else -1
+
+        def score(wdl):
+            # Cursed wins and blessed losses are draws under the 50-move rule
+            return sign * TB_WIN_SCORE * (1 if wdl == 2 else -1 if wdl == -2 else 0)
+
+        try:
+            wdl = self._tablebase.probe_wdl(board)
+        except KeyError:
+            return None
+        best_moves = [{'Move': move.uci(), 'Centipawn': score(move_wdl), 'Mate': None, 'PV': [move.uci()]}
+                      for move_wdl, _, move in ranked[:num_moves]]
+        return {'evaluation': {'type': 'cp', 'value': score(wdl)}, 'best_moves': best_moves,
+                'depth': 0, 'source': 'tablebase'}
@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import chess
+
+
+def position_key(fen):
+    """Normalize a FEN to the part that affects analysis.
+
+    The halfmove clock and fullmove number are dropped, so the same position
+    reached at different points of a game shares one cache entry. The en
+    passant square is kept only when a capture is legal: chess.js writes it
+    after every double push, python-chess only when it matters.
+    """
+    try:
+        fen = chess.Board(fen).fen(en_passant='legal')
+    except ValueError:
+        pass # Left as given; the search reports the bad FEN
+    return ' '.join(fen.split()[:4])
+
+
+class AnalysisCache:
+    """Thread-safe LRU cache of engine analysis results.
+
+    Entries are keyed on (normalized position, depth, MultiPV). When `path` is
+    given, entries are also written to a SQLite file so they survive restarts;
+    a memory miss falls through to disk before counting as a miss.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=10000, path=None):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis ("
+                "position TEXT NOT NULL, depth INTEGER NOT NULL, multipv INTEGER NOT NULL, "
+                "result TEXT NOT NULL, PRIMARY KEY (position, depth, multipv))"
+            )
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from ANALYSIS_CACHE_SIZE and ANALYSIS_CACHE_PATH."""
+        return cls(
+            max_entries=int(os.getenv('ANALYSIS_CACHE_SIZE', 10000)),
+            path=os.getenv('ANALYSIS_CACHE_PATH') or None
+        )
+
+    def get(self, fen, depth, multipv):
+        key = (position_key(fen), depth, multipv)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return result
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT result FROM analysis WHERE position = ? AND depth = ? AND multipv = ?", key
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._store(key, result)
+                    self._disk_hits += 1
+                    return result
+
+            self._misses += 1
+            return None
+
+    def put(self, fen, depth, multipv, result):
+        key = (position_key(fen), depth, multipv)
+        with self._lock:
+            self._store(key, result)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis (position, depth, multipv, result) VALUES (?, ?, ?, ?)",
+                    key + (json.dumps(result),)
+                )
+
+    def _store(self, key, result):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM analysis")
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self._max_entries,
+                'persistent': self._db is not None,
+                'hits': self._hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'hit_rate': (self._hits + self._disk_hits) / lookups if lookups else 0.0
+            }
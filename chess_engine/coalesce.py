@@ -0,0 +1,68 @@
+import threading
+from chess_engine.cache import position_key
+
+
+def analysis_key(fen, depth, num_moves, movetime=None, nodes=None):
+    """Identity of an analysis request: normalized position plus search settings."""
+    return (position_key(fen), depth, num_moves, movetime, nodes)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Coalescer:
+    """Collapses concurrent identical calls into one.
+
+    The first caller for a key runs the call; anyone asking for the same key
+    while it runs waits and receives the same result (or exception). Once
+    the call finishes the key is forgotten, so later callers start afresh;
+    the analysis cache takes over from there.
+
+    Results are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._coalesced = 0
+
+    def run(self, key, call):
+        with self._lock:
+            pending = self._calls.get(key)
+            if pending is None:
+                pending = self._calls[key] = _Call()
+                self._runs += 1
+                leader = True
+            else:
+                self._coalesced += 1
+                leader = False
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
+
+        try:
+            pending.result = call()
+            return pending.result
+        except BaseException as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            pending.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'runs': self._runs,
+                'coalesced': self._coalesced
+            }
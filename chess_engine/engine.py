@@ -1,66 +1,375 @@
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 from stockfish import Stockfish, StockfishException
 import chess
 from dotenv import load_dotenv
+from chess_engine import metrics
+from chess_engine.coalesce import analysis_key
+from chess_engine.farm import RemoteStockfish, search_priority
+from chess_engine.uci import parse_info, parse_bestmove, build_analysis, search_stats
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Shortest movetime (ms) a deadline can squeeze a search to
+MIN_MOVETIME = 10
+
+# Share of a request's remaining time budget the AI move may use; the rest
+# is left for the analysis of the resulting position
+AI_BUDGET_SHARE = 0.5
+
+
+def _env_limit(name):
+    """Positive integer from the environment, or None if unset or invalid."""
+    try:
+        return max(0, int(os.getenv(name, 0))) or None
+    except ValueError:
+        return None
+
 class ChessEngine:
-    def __init__(self):
-        stockfish_path = os.getenv('STOCKFISH_PATH')
-        if not stockfish_path:
-            raise ValueError("STOCKFISH_PATH environment variable not set")
-        
-        self._engine = Stockfish(path=stockfish_path)
+    def __init__(self, cache=None, ponder=False, book=None, tablebase=None, resources=None, coalescer=None):
+        broker = os.getenv('ENGINE_BROKER')
+        if broker:
+            # Searches run on the engine farm (see chess_engine.farm)
+            self._engine = RemoteStockfish(broker, token=os.getenv('ENGINE_FARM_TOKEN'))
+        else:
+            stockfish_path = os.getenv('STOCKFISH_PATH')
+            if not stockfish_path:
+                raise ValueError("STOCKFISH_PATH environment variable not set")
+            self._engine = Stockfish(path=stockfish_path)
+        self._remote = bool(broker)
+        self._batch = False # Farm searches queue behind interactive ones
         
         # Separate settings for AI opponent and Analysis
         self._ai_depth = 5       # Default AI opponent depth (lower)
         self._skill_level = 10   # Default AI opponent skill (0-20)
         self._analysis_depth = 15 # Fixed higher depth for analysis
+        self._mode = None        # 'play' or 'analysis': which option set Stockfish has
+        self._cache = cache      # Optional AnalysisCache shared between engines
+        self._coalescer = coalescer # Optional Coalescer shared between engines
+
+        # Optional search budgets; a search stops at its depth or budget, whichever comes first
+        self._ai_movetime = None  # ms
+        self._ai_nodes = None
+        self._analysis_movetime = _env_limit('ANALYSIS_MOVETIME_MS')
+        self._analysis_nodes = _env_limit('ANALYSIS_NODES')
+        self._deadline = None     # time.monotonic() by which the current request should be answered
+        self._last_search = None  # depth/nodes/nps/time reached by the last AI search
+
+        # Optional OpeningBook / Tablebase answered before any search
+        self._book = book
+        self._tablebase = tablebase
+        self._ai_move_source = None
         
         self._ai_side = 'black'
         self._board = chess.Board()
+        self._game_id = None       # Session whose game the engine last loaded
+        self._position_sent = None # Last `position` command sent to Stockfish
+
+        # Pondering: after the AI moves, search the expected reply while the human thinks
+        self._ponder_enabled = ponder
+        self._ponder_move = None   # Reply Stockfish expects after its last AI move
+        self._ponder = None        # In-flight speculative search: {'move': ..., 'hit': ...}
+
+        # Lets another thread interrupt a streaming search
+        self._search_lock = threading.Lock()
+        self._searching = None # Cancel event of the streaming search in progress
+        self._stop_sent = False
+
+        # Lifecycle bookkeeping for the supervisor
+        self._searches = 0        # Searches run by this process
+        self._busy_since = None   # time.monotonic() when the current blocking read began
+        self._busy_limit = None   # Seconds that read should take at most, None if unknown
+        self._search_limit = None # Movetime (s) of the last search started, None if unbounded in time
+        self._resources = {'role': 'play', 'threads': 1, 'hash_mb': 16, 'cpus': None, 'numa_policy': None}
+        if resources is not None:
+            self.configure(resources)
+        if tablebase is not None and os.getenv('SYZYGY_PATH'):
+            # Let Stockfish's own search use the tables as well
+            self._apply_options({'SyzygyPath': os.getenv('SYZYGY_PATH')})
         self._apply_ai_settings() # Apply initial AI settings
     
     # --- Helper methods to apply settings --- 
     def _apply_ai_settings(self):
         """Applies AI opponent settings to the engine."""
+        self._engine.set_depth(self._ai_depth)
+        self._apply_options({
+            "Skill Level": self._skill_level,
+            "UCI_LimitStrength": "true", # Enable skill limit for AI moves
+            "MultiPV": 1 # AI play only needs the best line
+        })
+        self._mode = 'play'
+
+    def _apply_analysis_settings(self, num_lines=1):
+        """Applies Analysis settings to the engine."""
+        self._engine.set_depth(self._analysis_depth)
+        self._apply_options({
+            "Skill Level": 20, # Max skill for analysis
+            "UCI_LimitStrength": "false", # Disable skill limit for analysis
+            "MultiPV": num_lines
+        })
+        self._mode = 'analysis'
+
+    def _apply_options(self, options):
+        """Sends only the UCI options that differ from what the engine already has.
+
+        Switching between play and analysis used to resend every option, each
+        followed by its own isready round-trip. Unchanged options now cost
+        nothing, and changed ones share a single isready.
+        """
+        current = self._engine.get_parameters()
+        changed = {name: value for name, value in options.items() if current.get(name) != value}
+        if not changed:
+            return
+        self._finish_ponder() # Options cannot change mid-search
         try:
-            self._engine.set_depth(self._ai_depth)
-            params = {
-                "Skill Level": self._skill_level,
-                "UCI_LimitStrength": "true" # Enable skill limit for AI moves
-            }
-            self._engine.update_engine_parameters(params)
-            # print(f"Engine: Applied AI settings - Depth: {self._ai_depth}, Skill: {self._skill_level}")
+            with metrics.span('options'), self._busy():
+                for name, value in changed.items():
+                    self._engine._put(f"setoption name {name} value {value}")
+                self._engine._is_ready()
+            current.update(changed) # Keep the wrapper's view of the options in sync
         except StockfishException as e:
-            print(f"Error applying AI settings: {e}")
+            logger.error("Error applying engine options %s: %s", changed, e)
 
-    def _apply_analysis_settings(self):
-        """Applies Analysis settings to the engine."""
+    def _search(self, go_command, mode):
+        """Sends a `go` command and reads until `bestmove`.
+
+        Returns the best move, the expected reply (ponder move) and the last
+        info line seen for each MultiPV slot. The search is recorded in the
+        metrics under `mode` ('ai', 'analysis', ...).
+        """
+        self._finish_ponder()
+        self._searches += 1
+        self._start_search(go_command, mode)
+        return self._timed_read_search(mode)
+
+    def _start_search(self, go_command, mode):
+        """Starts a search; on the engine farm it is queued at the priority of `mode`."""
+        tokens = go_command.split()
+        if self._remote:
+            self._engine.priority = search_priority(mode, self._batch)
+            self._search_limit = None # Time queued on the farm has no bound
+        elif 'movetime' in tokens:
+            self._search_limit = int(tokens[tokens.index('movetime') + 1]) / 1000
+        else:
+            self._search_limit = None # Depth or nodes only: no telling how long it takes
+        self._engine._put(go_command)
+
+    def set_batch(self, batch):
+        """Marks this engine's searches as batch work (reviews, puzzle mining), which
+        the engine farm runs only when no interactive search is waiting."""
+        self._batch = batch
+
+    def _timed_read_search(self, mode):
+        start = time.perf_counter()
+        with metrics.span('search'):
+            best, ponder, infos = self._read_search()
+        metrics.observe_search(mode, infos, time.perf_counter() - start)
+        return best, ponder, infos
+
+    def _read_search(self):
+        infos = {}
+        with self._busy(self._search_limit):
+            while True:
+                line = self._engine._read_line()
+                best = parse_bestmove(line)
+                if best is not None:
+                    return best[0], best[1], infos
+                info = parse_info(line)
+                if info is not None and 'bound' not in info:
+                    infos[info.get('multipv', 1)] = info
+
+    @contextmanager
+    def _busy(self, limit=None):
+        """Marks a blocking wait on Stockfish's output, so a watchdog can spot a hang.
+
+        `limit` is how many seconds the wait should take at most, if known.
+        """
+        self._busy_since = time.monotonic()
+        self._busy_limit = limit
         try:
-            self._engine.set_depth(self._analysis_depth)
-            params = {
-                "Skill Level": 20, # Max skill for analysis
-                "UCI_LimitStrength": "false" # Disable skill limit for analysis
-            }
-            self._engine.update_engine_parameters(params)
-            # print(f"Engine: Applied Analysis settings - Depth: {self._analysis_depth}")
+            yield
+        finally:
+            self._busy_since = None
+            self._busy_limit = None
+
+    # --- Resources (see chess_engine.resources) ---
+    def configure(self, resources):
+        """Applies a worker's role, Threads, Hash and NumaPolicy."""
+        options = {}
+        if resources.get('numa_policy'):
+            options['NumaPolicy'] = resources['numa_policy'] # Before Threads, so new threads are bound
+        options['Threads'] = resources['threads']
+        options['Hash'] = resources['hash_mb']
+        self._apply_options(options)
+        self._resources = dict(resources)
+
+    @property
+    def role(self):
+        return self._resources['role']
+
+    @property
+    def mode(self):
+        """'play' or 'analysis': the option set applied last. Switching costs a setoption round-trip."""
+        return self._mode
+
+    def get_resources(self):
+        """This worker's resource allocation, with its process ID and search count."""
+        return dict(self._resources, pid=self._engine._stockfish.pid, searches=self._searches)
+
+    # --- Process lifecycle (used by the pool's supervisor) ---
+    def is_alive(self):
+        return self._engine._stockfish.poll() is None
+
+    def busy_for(self):
+        """Seconds the current wait on Stockfish has lasted, or 0 when not waiting."""
+        busy_since = self._busy_since
+        return time.monotonic() - busy_since if busy_since is not None else 0.0
+
+    def busy_limit(self):
+        """Seconds the current wait should take at most (a search's movetime), or None if unknown."""
+        return self._busy_limit
+
+    def search_count(self):
+        return self._searches
+
+    def warm_up(self):
+        """Loads the network and touches the hash with a tiny search before taking traffic."""
+        with self._busy():
+            self._engine._is_ready()
+        if self._remote:
+            return # Farm workers warm up their own Stockfish
+        self._search("go depth 1", 'warmup')
+        self._engine._prepare_for_new_position(True)
+        self._position_sent = None
+
+    def kill(self):
+        """Kills a hung process; the blocked read then fails with StockfishException."""
+        self._engine._stockfish.kill()
+
+    def quit(self, timeout=5):
+        process = self._engine._stockfish
+        if process.poll() is None:
+            try:
+                self._engine._put("quit")
+                process.wait(timeout)
+            except Exception:
+                process.kill()
+        self._engine._has_quit_command_been_sent = True
+
+    def start_ponder(self, expected_move=None):
+        """Starts the AI's next search on the position after `expected_move`.
+
+        Defaults to the reply Stockfish predicted with its last move. If the
+        human then plays that move, get_ai_move returns this search's result
+        (waiting for it if it is still running). Otherwise the search is
+        stopped and only its hash entries are kept.
+
+        This is a normal depth-limited search, not `go ponder`: in ponder mode
+        Stockfish busy-waits once it reaches the depth limit, which would pin
+        a core for as long as the human thinks.
+        """
+        if not self._ponder_enabled or self._ponder is not None:
+            return
+        expected_move = expected_move or self._ponder_move
+        try:
+            move = chess.Move.from_uci(expected_move) if expected_move else None
+            if move is None or move not in self._board.legal_moves:
+                return
+            board = self._board.copy()
+            board.push(move)
+            if self._table_move(board) is not None:
+                return # The reply will come from the book or tablebase
+            self._apply_ai_settings()
+            self._send_position(self._position_command(board))
+            self._searches += 1
+            self._start_search(self._go_command(self._ai_depth, self._ai_movetime, self._ai_nodes), 'ponder')
+            self._ponder = {'move': move.uci(), 'hit': False}
+        except (ValueError, StockfishException) as e:
+            logger.warning("Error starting ponder on %s: %s", expected_move, e)
+
+    def _finish_ponder(self):
+        """Stops a speculative search that was not used and drains its output."""
+        if self._ponder is None:
+            return
+        self._ponder = None
+        self._engine._put("stop") # Ignored if the search already finished
+        self._read_search()
+
+    def is_pondering(self):
+        return self._ponder is not None
+
+    def _send_position(self, command):
+        """Sends a `position` command unless Stockfish already has exactly that position."""
+        self._finish_ponder()
+        if command != self._position_sent:
+            self._engine._put(command)
+            self._position_sent = command
+
+    def _sync_position(self, new_game=False):
+        """Sends the board to Stockfish as its root position plus the moves played.
+
+        Passing the move list (rather than the current FEN) lets Stockfish see
+        repetitions. `ucinewgame` is only sent for a new game, so the hash
+        table stays useful from one move to the next.
+        """
+        if new_game:
+            self._finish_ponder()
+            with self._busy():
+                self._engine._prepare_for_new_position(True)
+            self._position_sent = None
+        self._send_position(self._position_command(self._board))
+
+    @staticmethod
+    def _position_command(board):
+        root_fen = board.root().fen()
+        base = 'startpos' if root_fen == chess.STARTING_FEN else f"fen {root_fen}"
+        moves = ' '.join(move.uci() for move in board.move_stack)
+        return f"position {base} moves {moves}" if moves else f"position {base}"
+
+    def _set_search_position(self, fen):
+        """Points Stockfish at `fen`, reusing the game history when it is the current board."""
+        if fen == self._board.fen():
+            self._sync_position()
+        else:
+            self._send_position(f"position fen {fen}")
+
+    def set_game(self, game_id, board):
+        """Loads a session's game (root position and move stack) into this engine."""
+        if self._ponder is not None and game_id == self._game_id and board.move_stack == self._board.move_stack:
+            # Same game, no moves since we started pondering: keep the search running
+            self._board = board.copy()
+            return
+        self._board = board.copy()
+        new_game = game_id != self._game_id
+        self._game_id = game_id
+        try:
+            self._sync_position(new_game)
         except StockfishException as e:
-            print(f"Error applying analysis settings: {e}")
-            
+            logger.error("Error loading game %s: %s", game_id, e)
+            self._game_id = None
+
+    def get_board(self):
+        """A copy of the engine's board, including its move stack."""
+        return self._board.copy()
+
     def set_position(self, fen):
-        print(f"Engine: Setting position via FEN: {fen}")
+        logger.debug("Setting position via FEN: %s", fen)
         try:
-            self._board.set_fen(fen)
-            self._engine.set_fen_position(fen)
+            self._board = chess.Board(fen)
+            self._game_id = None
+            self._sync_position(new_game=True)
             return True
         except (ValueError, StockfishException) as e:
-            print(f"Error setting position: {e}")
+            logger.warning("Error setting position %s: %s", fen, e)
             return False
     
     def set_ai_side(self, side):
-        print(f"Engine: Setting AI side to: {side}")
+        logger.debug("Setting AI side to: %s", side)
         self._ai_side = side
     
     def get_ai_side(self):
@@ -83,101 +392,301 @@ class ChessEngine:
         except ValueError:
             return False
         except Exception as e:
-            print(f"Error validating move {move_uci}: {e}")
+            logger.warning("Error validating move %s: %s", move_uci, e)
             return False
     
     def make_move(self, move_uci):
-        print(f"Engine: Attempting to make move: {move_uci} on board: {self._board.fen()}")
         try:
             if not self.is_valid_move(move_uci):
-                print(f"Engine: Invalid move rejected: {move_uci}")
+                logger.debug("Invalid move rejected: %s", move_uci)
                 return False
                 
             move = chess.Move.from_uci(move_uci.strip().lower())
             self._board.push(move)
-            new_fen = self._board.fen()
-            print(f"Engine: Board updated. New FEN: {new_fen}")
             
-            self._engine.set_fen_position(new_fen)
-            print(f"Engine: Successfully made move: {move_uci}")
+            if self._ponder is not None and move.uci() == self._ponder['move']:
+                # Ponder hit: the speculative search is already on this position
+                logger.debug("Ponder hit on %s", move_uci)
+                self._ponder['hit'] = True
+            else:
+                self._sync_position()
+            logger.debug("Made move %s, new FEN: %s", move_uci, self._board.fen())
             return True
         except (ValueError, StockfishException) as e:
-            print(f"Error making move {move_uci}: {e}")
+            logger.warning("Error making move %s: %s", move_uci, e)
             return False
     
     def get_ai_move(self):
-        current_fen = self._board.fen()
-        print(f"Engine: Getting AI move for: {current_fen}")
         try:
-            self._apply_ai_settings() # Apply AI settings before getting move
-            best_move = self._engine.get_best_move()
-            print(f"Engine: AI Suggested move (using AI settings): {best_move}")
+            table_move = self._table_move(self._board)
+            if table_move is not None:
+                self._ponder_move = None
+                self._last_search = None
+                logger.debug("AI move from %s: %s", self._ai_move_source, table_move)
+                return table_move
+
+            self._ai_move_source = 'engine'
+            if self._ponder is not None and self._ponder['hit']:
+                # Result of the search started while the human was thinking
+                self._ponder = None
+                best_move, self._ponder_move, infos = self._timed_read_search('ponder')
+            else:
+                self._apply_ai_settings() # Apply AI settings before getting move
+                go_command = self._go_command(self._ai_depth, self._ai_movetime, self._ai_nodes, AI_BUDGET_SHARE)
+                best_move, self._ponder_move, infos = self._search(go_command, 'ai')
+            self._last_search = search_stats(infos)
             
             if not best_move:
-                print("Engine: Did not return a move")
+                if not self._board.is_game_over():
+                    logger.warning("Engine did not return a move for %s", self._board.fen())
                 return None
                 
             if self.is_valid_move(best_move):
-                print(f"Engine: Selected valid move: {best_move}")
+                logger.debug("AI move: %s", best_move)
                 return best_move
             else:
-                print(f"Engine: ERROR - Suggested invalid move: {best_move} for FEN: {current_fen}")
-                print(f"Legal moves were: {list(self._board.legal_moves)}")
+                logger.error("Engine suggested invalid move %s for FEN %s", best_move, self._board.fen())
                 return None
         except StockfishException as e:
-            print(f"Stockfish error getting AI move: {e}")
+            logger.error("Stockfish error getting AI move: %s", e)
             return None
-        except Exception as e:
-            print(f"General error getting AI move: {e}")
+        except Exception:
+            logger.exception("General error getting AI move")
             return None
     
+    def get_last_search(self):
+        """Depth, nodes, NPS and time (ms) reached by the last AI search, or None."""
+        return self._last_search
+
+    def set_deadline(self, deadline):
+        """Bounds the searches of the current request.
+
+        Until cleared with None, every AI move or analysis search gets a
+        movetime that fits within the time left before `deadline` (a
+        time.monotonic() value), on top of its own depth, time and node
+        limits.
+        """
+        self._deadline = deadline
+
+    def _go_command(self, depth, movetime=None, nodes=None, share=None):
+        """`go` with a depth limit plus any time and node budget.
+
+        Stockfish stops at whichever limit it reaches first. With a deadline
+        set and a `share` given, movetime is cut to that share of the time
+        left, so requests that waited for a worker search for less.
+        """
+        if share is not None and self._deadline is not None:
+            remaining = int((self._deadline - time.monotonic()) * 1000 * share)
+            budget = max(MIN_MOVETIME, remaining)
+            movetime = min(movetime, budget) if movetime else budget
+        command = f"go depth {depth}"
+        if movetime:
+            command += f" movetime {movetime}"
+        if nodes:
+            command += f" nodes {nodes}"
+        return command
+
+    def get_ai_move_source(self):
+        """Where the last AI move came from: 'book', 'tablebase' or 'engine'."""
+        return self._ai_move_source
+
+    def _table_move(self, board):
+        """Move from the opening book or tablebase, or None if neither answers."""
+        if self._tablebase is not None:
+            move = self._tablebase.best_move(board)
+            if move is not None:
+                self._ai_move_source = 'tablebase'
+                return move.uci()
+        if self._book is not None:
+            move = self._book.choose(board)
+            if move is not None and move in board.legal_moves:
+                self._ai_move_source = 'book'
+                return move.uci()
+        return None
+
+    def _table_analysis(self, fen, num_moves):
+        """Exact tablebase or book analysis of `fen`, or None if a search is needed."""
+        if self._book is None and self._tablebase is None:
+            return None
+        board = chess.Board(fen)
+        if self._tablebase is not None:
+            result = self._tablebase.analyze(board, num_moves)
+            if result is not None:
+                return result
+        if self._book is not None:
+            return self._book.analyze(board, num_moves)
+        return None
+
     def get_engine_settings(self):
         # Return the settings relevant to the UI controls (AI opponent)
         return {
             'depth': self._ai_depth, # Return AI depth
             'skill_level': self._skill_level,
-            'ai_side': self._ai_side
+            'ai_side': self._ai_side,
+            'movetime': self._ai_movetime,
+            'nodes': self._ai_nodes
         }
     
-    def update_engine_settings(self, depth=None, skill_level=None):
+    def update_engine_settings(self, depth=None, skill_level=None, movetime=None, nodes=None):
         # This function now updates only AI opponent settings
+        # movetime (ms) and nodes: None leaves them unchanged, 0 removes the limit
         if depth is not None:
             self._ai_depth = max(1, min(30, depth)) 
-            print(f"Engine: AI Depth set to: {self._ai_depth}")
         if skill_level is not None:
             self._skill_level = max(0, min(20, skill_level))
-            print(f"Engine: AI Skill Level set to: {self._skill_level}")
+        if movetime is not None:
+            self._ai_movetime = max(0, movetime) or None
+        if nodes is not None:
+            self._ai_nodes = max(0, nodes) or None
         
         # Apply the new AI settings immediately if needed (or rely on get_ai_move)
         # self._apply_ai_settings() 
-        print(f"Engine AI settings updated - Depth: {self._ai_depth}, Skill Level: {self._skill_level}")
+        logger.debug("AI settings updated: %s", self.get_engine_settings())
+
+    def analyze_position(self, fen, num_moves=3, depth=None, movetime=None, nodes=None, tables=True):
+        """Evaluation and top `num_moves` moves for `fen`.
+
+        The search stops at `depth` (default 15) or when its movetime (ms) or
+        node budget runs out; the result's 'depth' is the depth it reached.
+        With tables=False the opening book and tablebase are skipped, for
+        callers that need a real engine score for every position.
+        """
+        logger.debug("Analyzing FEN: %s", fen)
+        return self._analyze(fen, num_moves, depth, movetime, nodes, tables)
 
-    def analyze_position(self, fen):
-        print(f"Engine: Analyzing FEN (using Analysis settings): {fen}")
+    def get_move_suggestions(self, fen, num_moves=3):
+        logger.debug("Getting suggestions for FEN: %s", fen)
+        return self._analyze(fen, num_moves)['best_moves']
+
+    def _analyze(self, fen, num_moves, depth=None, movetime=None, nodes=None, tables=True):
+        """Evaluation and top moves for `fen`, served from the tables or cache when possible."""
+        depth = depth or self._analysis_depth
+        movetime = movetime or self._analysis_movetime
+        nodes = nodes or self._analysis_nodes
+        try:
+            result = self._table_analysis(fen, num_moves) if tables else None
+        except ValueError as e:
+            logger.warning("Error analyzing position %s: %s", fen, e)
+            result = None
+        if result is not None:
+            return result
+        if self._cache is not None:
+            cached = self._cache.get(fen, depth, num_moves)
+            if cached is not None:
+                return cached
+        if self._coalescer is None:
+            return self._search_analysis(fen, num_moves, depth, movetime, nodes)
+        # Identical analyses already running on other engines are waited on, not
+        # repeated; a search under a request deadline is only shared with others under one
+        key = analysis_key(fen, depth, num_moves, movetime, nodes) + (self._deadline is not None,)
+        return self._coalescer.run(key, lambda: self._search_analysis(fen, num_moves, depth, movetime, nodes))
+
+    def _search_analysis(self, fen, num_moves, depth, movetime, nodes):
+        if self._cache is not None:
+            # An identical search may have finished between the cache miss and this call
+            cached = self._cache.get(fen, depth, num_moves)
+            if cached is not None:
+                return cached
         try:
             # Ensure correct FEN is set before applying analysis settings
-            self._engine.set_fen_position(fen) 
-            self._apply_analysis_settings() # Apply analysis settings
+            self._set_search_position(fen)
+            self._apply_analysis_settings(num_moves) # Apply analysis settings
             
-            evaluation = self._engine.get_evaluation()
-            best_moves = self._engine.get_top_moves(3) 
-            return {
-                'evaluation': evaluation,
-                'best_moves': best_moves
-            }
+            # One MultiPV search: line 1 carries the evaluation, lines 1..k the top moves
+            _, _, infos = self._search(self._go_command(depth, movetime, nodes, share=1.0), 'analysis')
+            result = build_analysis(infos, fen.split()[1] == 'w')
+            result['source'] = 'engine'
         except (ValueError, StockfishException) as e:
-            print(f"Error analyzing position {fen}: {e}")
+            logger.warning("Error analyzing position %s: %s", fen, e)
             return {
                 'evaluation': {'type': 'cp', 'value': 0},
                 'best_moves': []
             }
+        # A search cut short by its budget is not the result for `depth`
+        if self._cache is not None and result['depth'] >= depth:
+            self._cache.put(fen, depth, num_moves, result)
+        return result
 
-    def get_move_suggestions(self, fen, num_moves=3):
-        print(f"Engine: Getting suggestions (using Analysis settings) for FEN: {fen}")
+    def stream_analysis(self, fen, on_update, cancelled, num_moves=3, max_depth=None, min_interval=0.1):
+        """Progressive-deepening analysis of `fen`.
+
+        Calls on_update(result, final) each time a depth completes (at most
+        once per `min_interval` seconds) and once more with final=True when the
+        search ends. Setting the `cancelled` event stops the search early, in
+        which case no final update is sent.
+        """
+        depth = max_depth or self._analysis_depth
+        try:
+            table_result = self._table_analysis(fen, num_moves)
+        except ValueError:
+            table_result = None
+        if table_result is not None:
+            on_update(table_result, True)
+            return table_result
+        if self._cache is not None:
+            cached = self._cache.get(fen, depth, num_moves)
+            if cached is not None:
+                on_update(cached, True)
+                return cached
+
+        white_to_move = fen.split()[1] == 'w'
+        infos = {}
+        started = time.perf_counter()
         try:
-            self._engine.set_fen_position(fen)
-            self._apply_analysis_settings() # Apply analysis settings
-            return self._engine.get_top_moves(num_moves) 
+            # A depth is complete once its last MultiPV line has arrived
+            expected_lines = min(num_moves, chess.Board(fen).legal_moves.count())
+            self._set_search_position(fen)
+            self._apply_analysis_settings(num_moves)
+
+            self._searches += 1
+            self._busy_since = time.monotonic()
+            # `go` is sent under the lock, so a stop_search cannot land before
+            # it and be lost (or reach the engine farm under an earlier job)
+            with self._search_lock:
+                self._searching = cancelled
+                self._stop_sent = False
+                self._start_search(self._go_command(depth, self._analysis_movetime, self._analysis_nodes), 'stream')
+            self._busy_limit = self._search_limit
+            last_update = 0.0
+            while True:
+                line = self._engine._read_line()
+                if parse_bestmove(line) is not None:
+                    break
+                if cancelled.is_set():
+                    self.stop_search(cancelled)
+                info = parse_info(line)
+                if info is None or 'bound' in info:
+                    continue
+                infos[info.get('multipv', 1)] = info
+                now = time.monotonic()
+                if info.get('multipv', 1) == expected_lines and now - last_update >= min_interval:
+                    last_update = now
+                    on_update(build_analysis(infos, white_to_move), False)
         except (ValueError, StockfishException) as e:
-            print(f"Error getting suggestions for {fen}: {e}")
-            return [] 
\ No newline at end of file
+            logger.warning("Error streaming analysis for %s: %s", fen, e)
+        finally:
+            self._busy_since = None
+            self._busy_limit = None
+            with self._search_lock:
+                self._searching = None
+            metrics.observe_search('stream', infos, time.perf_counter() - started)
+
+        result = build_analysis(infos, white_to_move)
+        result['source'] = 'engine'
+        if cancelled.is_set():
+            return result
+        if self._cache is not None and result['depth'] >= depth:
+            self._cache.put(fen, depth, num_moves, result)
+        on_update(result, True)
+        return result
+
+    def stop_search(self, cancelled):
+        """Stops the streaming search started with this `cancelled` event.
+
+        Safe to call from any thread; does nothing if that search has already
+        finished, so a late call never interrupts another request's search.
+        """
+        with self._search_lock:
+            if self._searching is cancelled and not self._stop_sent:
+                self._engine._put("stop")
+                self._stop_sent = True
@@ -0,0 +1,539 @@
+"""Engine farm: Stockfish searches run on worker machines, behind a broker.
+
+    web tier (ChessEngine over RemoteStockfish)  ->  Broker  ->  FarmWorker (Stockfish)
+
+The broker queues search jobs from the web tier and hands each one to the
+next free worker, most urgent first, relaying the worker's output back as it
+arrives. A job holds what Stockfish needs for one search:
+- the `position` command
+- the UCI options (MultiPV, Skill Level, ...)
+- the `go` command with its depth/movetime/nodes limits
+
+The results come back as Stockfish's own score lines (evaluation and PV per
+MultiPV line) followed by `bestmove`. RemoteStockfish offers ChessEngine
+the same interface as a local process. Analysis, streaming, pondering and
+search budgets therefore work unchanged when ENGINE_BROKER=host:port is set.
+
+Every connection carries one JSON message per line, starting with
+{"op": "hello", "token"}. A broker given a token (ENGINE_FARM_TOKEN) drops
+connections that do not present it.
+
+    engine -> broker   {"op": "go", "id", "priority", "job": {"position", "options", "go", "new_game"}}
+                       {"op": "stop", "id"}
+    broker -> engine   {"op": "line", "id", "line"}
+    worker -> broker   {"op": "ready"}, {"op": "line", "id", "line"}, {"op": "done", "id"}
+    broker -> worker   {"op": "job", "id", "job"}, {"op": "stop", "id"}
+
+Workers keep their own Threads, Hash, NumaPolicy and SyzygyPath. They
+apply only the search options ChessEngine sets (JOB_OPTIONS) and refuse jobs
+whose commands are not a single `position`/`go` line.
+"""
+import heapq
+import hmac
+import itertools
+import json
+import logging
+import queue
+import socket
+import socketserver
+import subprocess
+import threading
+import uuid
+from collections import deque
+from stockfish import Stockfish, StockfishException
+from chess_engine.uci import parse_bestmove, parse_info
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 7777
+
+# Lower runs first: interactive play, then interactive analysis, then batch work
+PRIORITIES = {'ai': 0, 'ponder': 1, 'analysis': 1, 'stream': 1, 'warmup': 1, 'batch': 2}
+
+# The only options a job may set on a worker; anything else (file paths in
+# particular) stays under the worker's control
+JOB_OPTIONS = ('MultiPV', 'Skill Level', 'UCI_LimitStrength')
+
+
+def search_priority(mode, batch=False):
+    """Queue priority of a search started in `mode` ('ai', 'analysis', ...)."""
+    return PRIORITIES['batch'] if batch else PRIORITIES.get(mode, PRIORITIES['analysis'])
+
+
+def parse_address(address):
+    """'host:port' (or just 'host') -> (host, port)"""
+    host, _, port = address.rpartition(':')
+    if not host:
+        return address, DEFAULT_PORT
+    return host, int(port)
+
+
+def _single_command(command, verb):
+    """True if `command` is one UCI line starting with `verb`."""
+    return (isinstance(command, str) and command.startswith(verb + ' ')
+            and '\n' not in command and '\r' not in command)
+
+
+def check_job(job):
+    """Raises ValueError unless `job` is safe to hand to Stockfish."""
+    if not isinstance(job, dict):
+        raise ValueError("job must be an object")
+    if not _single_command(job.get('position'), 'position'):
+        raise ValueError("bad position command")
+    if not _single_command(job.get('go'), 'go'):
+        raise ValueError("bad go command")
+    options = job.get('options') or {}
+    if not isinstance(options, dict):
+        raise ValueError("options must be an object")
+    for name, value in options.items():
+        if name not in JOB_OPTIONS:
+            continue # Ignored, see JOB_OPTIONS
+        if not isinstance(value, (int, str)) or any(c in str(value) for c in '\r\n'):
+            raise ValueError(f"bad value for option {name}")
+
+
+class Connection:
+    """JSON messages, one per line, over a socket. send() is thread-safe."""
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._reader = sock.makefile('r', encoding='utf-8', newline='\n')
+        self._send_lock = threading.Lock()
+
+    @classmethod
+    def connect(cls, address, token=None, timeout=10):
+        """Connects to a broker and introduces itself with `token`."""
+        sock = socket.create_connection(parse_address(address), timeout=timeout)
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # Lines are small and latency-bound
+        conn = cls(sock)
+        conn.send({'op': 'hello', 'token': token})
+        return conn
+
+    def send(self, message):
+        data = (json.dumps(message) + '\n').encode()
+        with self._send_lock:
+            self._sock.sendall(data)
+
+    def messages(self):
+        """Incoming messages until the connection closes."""
+        try:
+            for line in self._reader:
+                if line.strip():
+                    yield json.loads(line)
+        except (OSError, ValueError):
+            return
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+
+class _Job:
+    def __init__(self, job_id, priority, payload, client):
+        self.id = job_id
+        self.priority = priority
+        self.payload = payload
+        self.client = client # Connection of the engine that submitted it
+        self.worker = None   # Connection of the worker running it
+        self.order = None
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Broker:
+    """Queues search jobs by priority and hands them to free workers.
+
+    Jobs of equal priority run in arrival order. If a worker disconnects,
+    its job goes back on the queue. If an engine disconnects, its queued
+    jobs are dropped and its running ones are stopped. serve() listens on a
+    background thread, so a broker can run inside another process (tests,
+    a single-host setup) as well as on its own (engine_farm.py broker).
+    """
+
+    def __init__(self, token=None):
+        self._token = token
+        self._lock = threading.Lock()
+        self._queue = []          # (priority, order, job ID); stopped jobs are skipped lazily
+        self._order = itertools.count()
+        self._jobs = {}           # Job ID -> _Job, queued or running
+        self._idle = deque()      # Workers waiting for a job
+        self._running = {}        # Worker -> _Job
+        self._completed = 0
+        self._server = None
+
+    def serve(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """Starts listening for engines and workers. Returns the bound (host, port)."""
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                broker.handle(Connection(self.request))
+
+        self._server = _Server((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name='engine-broker', daemon=True).start()
+        return self._server.server_address
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, conn):
+        """Serves one engine or worker connection until it closes."""
+        messages = conn.messages()
+        hello = next(messages, None)
+        if not self._authorized(hello):
+            logger.warning("Engine broker refused a connection without a valid token")
+            conn.close()
+            return
+        try:
+            for message in messages:
+                op = message.get('op')
+                if op == 'go':
+                    self.submit(conn, message['id'], message.get('priority', PRIORITIES['analysis']), message['job'])
+                elif op == 'stop':
+                    self.stop(message['id'])
+                elif op == 'line':
+                    self.line(message['id'], message['line'])
+                elif op == 'ready':
+                    self.ready(conn)
+                elif op == 'done':
+                    self.done(conn, message['id'])
+        except (KeyError, TypeError, AttributeError) as e:
+            logger.warning("Engine broker dropped a connection after a malformed message: %r", e)
+        finally:
+            self.disconnected(conn)
+
+    def _authorized(self, hello):
+        if not isinstance(hello, dict) or hello.get('op') != 'hello':
+            return False
+        if self._token is None:
+            return True
+        token = hello.get('token')
+        return isinstance(token, str) and hmac.compare_digest(token.encode(), self._token.encode())
+
+    # --- Engines ---
+    def submit(self, client, job_id, priority, payload):
+        with self._lock:
+            job = self._jobs[job_id] = _Job(job_id, priority, payload, client)
+            self._enqueue(job)
+            assignments = self._dispatch()
+        self._send_jobs(assignments)
+
+    def stop(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return # Already finished
+            worker = job.worker
+            if worker is None:
+                del self._jobs[job_id]
+        if worker is None:
+            # Never started: answer for it so the engine's read ends
+            _send_quietly(job.client, {'op': 'line', 'id': job_id, 'line': 'bestmove (none)'})
+        else:
+            _send_quietly(worker, {'op': 'stop', 'id': job_id})
+
+    # --- Workers ---
+    def ready(self, worker):
+        with self._lock:
+            self._idle.append(worker)
+            assignments = self._dispatch()
+        self._send_jobs(assignments)
+
+    def line(self, job_id, line):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            _send_quietly(job.client, {'op': 'line', 'id': job_id, 'line': line})
+
+    def done(self, worker, job_id):
+        """The worker finished `job_id` and is free again."""
+        with self._lock:
+            if self._jobs.pop(job_id, None) is not None:
+                self._completed += 1
+            self._running.pop(worker, None)
+            self._idle.append(worker)
+            assignments = self._dispatch()
+        self._send_jobs(assignments)
+
+    def disconnected(self, peer):
+        stops = []
+        with self._lock:
+            if peer in self._idle:
+                self._idle.remove(peer)
+            job = self._running.pop(peer, None)
+            if job is not None and job.id in self._jobs:
+                logger.warning("Engine farm worker lost mid-search, requeueing job %s", job.id)
+                job.worker = None
+                self._enqueue(job)
+            for job in [j for j in self._jobs.values() if j.client is peer]:
+                del self._jobs[job.id]
+                if job.worker is not None:
+                    stops.append((job.worker, job.id))
+            assignments = self._dispatch()
+        for worker, job_id in stops:
+            _send_quietly(worker, {'op': 'stop', 'id': job_id})
+        self._send_jobs(assignments)
+
+    def stats(self):
+        with self._lock:
+            queued = {}
+            for job in self._jobs.values():
+                if job.worker is None:
+                    queued[job.priority] = queued.get(job.priority, 0) + 1
+            return {
+                'queued': queued,
+                'idle_workers': len(self._idle),
+                'busy_workers': len(self._running),
+                'completed': self._completed
+            }
+
+    def _enqueue(self, job):
+        if job.order is None:
+            job.order = next(self._order) # A requeued job keeps its place
+        heapq.heappush(self._queue, (job.priority, job.order, job.id))
+
+    def _dispatch(self):
+        """Pairs free workers with the most urgent jobs (under the lock); the caller sends them."""
+        assignments = []
+        while self._idle and self._queue:
+            _, _, job_id = heapq.heappop(self._queue)
+            job = self._jobs.get(job_id)
+            if job is None or job.worker is not None:
+                continue
+            worker = self._idle.popleft()
+            job.worker = worker
+            self._running[worker] = job
+            assignments.append((worker, job))
+        return assignments
+
+    def _send_jobs(self, assignments):
+        for worker, job in assignments:
+            try:
+                worker.send({'op': 'job', 'id': job.id, 'job': job.payload})
+            except OSError:
+                self.disconnected(worker) # Puts the job back on the queue
+
+
+def _send_quietly(conn, message):
+    # A peer that has gone away is cleaned up by its own connection handler
+    try:
+        conn.send(message)
+    except OSError:
+        pass
+
+
+class _RemoteProcess:
+    """The parts of subprocess.Popen that ChessEngine uses, for a broker connection."""
+
+    pid = None
+
+    def __init__(self, conn, closed):
+        self._conn = conn
+        self._closed = closed
+
+    def poll(self):
+        return 0 if self._closed.is_set() else None
+
+    def kill(self):
+        self._conn.close()
+
+    def wait(self, timeout=None):
+        if not self._closed.wait(timeout):
+            raise subprocess.TimeoutExpired('engine-farm', timeout)
+        return 0
+
+
+class RemoteStockfish:
+    """Stands in for the stockfish.Stockfish wrapper, running each search on the farm.
+
+    Commands are not sent one by one. `setoption` and `position` update the
+    state the next job carries, and `go` submits that job to the broker.
+    The job's output is read back with _read_line, as from a local process.
+    A lost broker connection reads as a crashed engine (StockfishException),
+    so the pool's supervisor replaces it.
+    """
+
+    def __init__(self, address, token=None, timeout=10):
+        self._conn = Connection.connect(address, token, timeout)
+        self._closed = threading.Event()
+        self._lines = queue.Queue()
+        self._parameters = {}
+        self._position = 'position startpos'
+        self._new_game = False
+        self._job_id = None
+        self.priority = PRIORITIES['analysis'] # Set by ChessEngine before each `go`
+        self.depth = None
+        self._has_quit_command_been_sent = False
+        self._stockfish = _RemoteProcess(self._conn, self._closed)
+        threading.Thread(target=self._receive, name='engine-farm-client', daemon=True).start()
+
+    def _receive(self):
+        for message in self._conn.messages():
+            if message.get('op') == 'line' and message.get('id') == self._job_id:
+                self._lines.put(message['line'])
+        self._closed.set()
+        self._lines.put(None)
+
+    def _check(self):
+        if self._closed.is_set():
+            raise StockfishException("The Stockfish process has crashed")
+
+    def _send(self, message):
+        try:
+            self._conn.send(message)
+        except OSError as e:
+            raise StockfishException("The Stockfish process has crashed") from e
+
+    def _put(self, command):
+        self._check()
+        tokens = command.split()
+        if not tokens:
+            return
+        if tokens[0] == 'setoption':
+            name, _, value = command[len('setoption name '):].partition(' value ')
+            self._parameters[name] = value
+        elif tokens[0] == 'position':
+            self._position = command
+        elif tokens[0] == 'ucinewgame':
+            self._new_game = True
+        elif tokens[0] == 'go':
+            self._job_id = uuid.uuid4().hex
+            job = {'position': self._position, 'options': dict(self._parameters), 'go': command,
+                   'new_game': self._new_game}
+            self._new_game = False
+            self._send({'op': 'go', 'id': self._job_id, 'priority': self.priority, 'job': job})
+        elif tokens[0] == 'stop':
+            if self._job_id is not None:
+                self._send({'op': 'stop', 'id': self._job_id})
+        elif tokens[0] == 'quit':
+            self._has_quit_command_been_sent = True
+            self._conn.close()
+        # `isready` needs no round trip: options travel with every job
+
+    def _read_line(self):
+        line = self._lines.get()
+        if line is None:
+            self._lines.put(None) # Every later read fails too
+            raise StockfishException("The Stockfish process has crashed")
+        return line
+
+    def _is_ready(self):
+        self._check()
+
+    def _prepare_for_new_position(self, send_ucinewgame_token=True):
+        if send_ucinewgame_token:
+            self._put('ucinewgame')
+
+    def set_depth(self, depth=15):
+        self.depth = depth
+
+    def get_parameters(self):
+        return self._parameters
+
+
+class FarmWorker:
+    """Runs one local Stockfish for the farm.
+
+    Takes jobs from the broker one at a time and streams each search's
+    score lines and `bestmove` back. If the broker or Stockfish goes away,
+    it reconnects with a fresh Stockfish.
+    """
+
+    def __init__(self, address, path, threads=1, hash_mb=16, options=None, token=None, retry=2.0):
+        self.address = address
+        self.token = token
+        self.path = path
+        self.options = dict(options or {}) # Further machine-specific options (NumaPolicy, SyzygyPath)
+        self.threads = threads
+        self.hash_mb = hash_mb
+        self.retry = retry
+        self._lock = threading.Lock()
+        self._job_id = None   # Job being searched
+        self._stopped = None  # Job the broker stopped, possibly before its `go` was sent
+
+    def run(self, stop=None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self._serve(stop)
+            except (OSError, StockfishException) as e:
+                logger.warning("Engine farm worker lost its connection: %s", e)
+            stop.wait(self.retry)
+
+    def _start_engine(self):
+        engine = Stockfish(path=self.path, parameters={'Threads': self.threads, 'Hash': self.hash_mb})
+        for name, value in self.options.items():
+            engine._put(f"setoption name {name} value {value}")
+        engine._is_ready()
+        engine.get_parameters().update(self.options)
+        return engine
+
+    def _serve(self, stop):
+        engine = self._start_engine()
+        conn = None
+        try:
+            conn = Connection.connect(self.address, self.token)
+            logger.info("Engine farm worker connected to %s", self.address)
+            conn.send({'op': 'ready'})
+            for message in conn.messages():
+                if stop.is_set():
+                    break
+                if message.get('op') == 'job':
+                    threading.Thread(target=self._search, args=(engine, conn, message['id'], message['job']),
+                                     name='engine-farm-search', daemon=True).start()
+                elif message.get('op') == 'stop':
+                    with self._lock:
+                        self._stopped = message.get('id')
+                        if self._stopped == self._job_id:
+                            engine._put('stop')
+        finally:
+            if conn is not None:
+                conn.close()
+            if engine._stockfish.poll() is None:
+                engine._put('quit')
+
+    def _search(self, engine, conn, job_id, job):
+        try:
+            check_job(job)
+        except ValueError as e:
+            logger.warning("Engine farm worker refused job %s: %s", job_id, e)
+            _send_quietly(conn, {'op': 'line', 'id': job_id, 'line': 'bestmove (none)'})
+            _send_quietly(conn, {'op': 'done', 'id': job_id})
+            return
+        try:
+            current = engine.get_parameters()
+            changed = {name: value for name, value in (job.get('options') or {}).items()
+                       if name in JOB_OPTIONS and str(current.get(name)) != str(value)}
+            for name, value in changed.items():
+                engine._put(f"setoption name {name} value {value}")
+            current.update(changed)
+            engine._prepare_for_new_position(job.get('new_game', False)) # Waits for readyok
+            engine._put(job['position'])
+            with self._lock:
+                self._job_id = job_id
+                engine._put(job['go'])
+                if self._stopped == job_id:
+                    engine._put('stop')
+            while True:
+                line = engine._read_line()
+                if parse_bestmove(line) is not None:
+                    conn.send({'op': 'line', 'id': job_id, 'line': line})
+                    break
+                if parse_info(line) is not None:
+                    conn.send({'op': 'line', 'id': job_id, 'line': line})
+            with self._lock:
+                self._job_id = None
+            conn.send({'op': 'done', 'id': job_id})
+        except (OSError, StockfishException) as e:
+            # Dropping the connection hands the job back to the broker
+            logger.error("Engine farm search failed: %s", e)
+            conn.close()
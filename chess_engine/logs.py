@@ -0,0 +1,36 @@
+import logging
+import os
+import random
+
+
+class SamplingFilter(logging.Filter):
+    """Passes every record at INFO and above, and a random fraction of DEBUG ones.
+
+    Per-request detail is logged at DEBUG; sampling keeps a representative
+    trickle of it under load without paying to format every record.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+def configure_logging(level=None, sample_rate=None):
+    """Leveled logging to stderr, from LOG_LEVEL (default INFO) and LOG_SAMPLE_RATE (default 1)."""
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    if sample_rate is None:
+        try:
+            sample_rate = float(os.getenv('LOG_SAMPLE_RATE', 1))
+        except ValueError:
+            sample_rate = 1.0
+    root = logging.getLogger()
+    root.setLevel(level)
+    if any(isinstance(f, SamplingFilter) for h in root.handlers for f in h.filters):
+        return # Already configured (e.g. by the Flask reloader)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handler.addFilter(SamplingFilter(sample_rate))
+    root.addHandler(handler)
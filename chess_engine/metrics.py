@@ -0,0 +1,140 @@
+"""Timing spans and engine search statistics, exported in Prometheus text format.
+
+A request handler wraps its work in `request_timer(handler)`; code it calls
+(the engine included) wraps each stage in `span(stage)`, which is recorded
+under the handler running on the current thread (or greenlet, once eventlet
+or gevent has patched threading). `render()` produces the text served at
+/metrics. Everything is aggregated in-process, so no client library is
+needed.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from chess_engine.uci import search_stats
+
+# Seconds, from a cached lookup up to a deep search
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+NODE_BUCKETS = (1e3, 1e4, 1e5, 3e5, 1e6, 3e6, 1e7, 3e7, 1e8)
+NPS_BUCKETS = (1e5, 2.5e5, 5e5, 1e6, 2e6, 4e6, 8e6, 1.6e7, 3.2e7)
+DEPTH_BUCKETS = (1, 2, 4, 6, 8, 10, 12, 15, 18, 21, 25, 30, 40)
+
+
+class Histogram:
+    """Cumulative histogram with one series per combination of label values."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                bucket_labels = ','.join(labels + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ''
+            lines.append(f"{self.name}_sum{suffix} {values[-1]:g}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'jchess_request_seconds', 'Time to handle a request or socket event', ('handler',))
+STAGE_SECONDS = REGISTRY.histogram(
+    'jchess_stage_seconds', 'Time spent in each stage of a request', ('handler', 'stage'))
+SEARCH_SECONDS = REGISTRY.histogram(
+    'jchess_search_seconds', 'Wall time of Stockfish searches', ('mode',))
+SEARCH_NODES = REGISTRY.histogram(
+    'jchess_search_nodes', 'Nodes searched per Stockfish search', ('mode',), NODE_BUCKETS)
+SEARCH_NPS = REGISTRY.histogram(
+    'jchess_search_nps', 'Nodes per second reported at the end of a search', ('mode',), NPS_BUCKETS)
+SEARCH_DEPTH = REGISTRY.histogram(
+    'jchess_search_depth', 'Depth reached per Stockfish search', ('mode',), DEPTH_BUCKETS)
+
+_current = threading.local()
+
+
+def current_handler():
+    return getattr(_current, 'handler', None) or 'background'
+
+
+@contextmanager
+def request_timer(handler):
+    """Times a whole request; spans inside it are attributed to `handler`."""
+    previous = getattr(_current, 'handler', None)
+    _current.handler = handler
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, handler=handler)
+        _current.handler = previous
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, handler=current_handler(), stage=stage)
+
+
+def observe_search(mode, infos, seconds):
+    """Records one search from its final info lines (one per MultiPV slot)."""
+    SEARCH_SECONDS.observe(seconds, mode=mode)
+    if not infos:
+        return
+    stats = search_stats(infos)
+    SEARCH_DEPTH.observe(stats['depth'], mode=mode)
+    if stats['nodes']:
+        SEARCH_NODES.observe(stats['nodes'], mode=mode)
+    if stats['nps']:
+        SEARCH_NPS.observe(stats['nps'], mode=mode)
+
+
+def render():
+    return REGISTRY.render()
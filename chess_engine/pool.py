@@ -0,0 +1,244 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from stockfish import StockfishException
+from chess_engine.coalesce import Coalescer, analysis_key
+from chess_engine.engine import ChessEngine
+from chess_engine.resources import available_cpus, plan_from_env
+from chess_engine.supervisor import EngineSupervisor
+
+logger = logging.getLogger(__name__)
+
+
+def default_pool_size():
+    """Pool size from ENGINE_POOL_SIZE, falling back to the number of cores."""
+    try:
+        size = int(os.getenv('ENGINE_POOL_SIZE', 0))
+    except ValueError:
+        size = 0
+    return size if size > 0 else (os.cpu_count() or 1)
+
+
+class EnginePool:
+    """A fixed set of ChessEngine workers, each owning its own Stockfish
+    process and chess.Board. A request checks out one worker for its whole
+    duration, so concurrent games never share a position.
+
+    An EngineSupervisor warms every process up before it joins the pool,
+    and swaps crashed, hung or worn-out workers for warm spares as they
+    are checked in (or, when idle, on its periodic health check).
+
+    Workers share a Coalescer, so concurrent analyses of the same position
+    with the same settings run one search and share its result."""
+
+    def __init__(self, size=None, cache=None, ponder=None, book=None, tablebase=None, coalescer=None):
+        self._size = size or default_pool_size()
+        self._cache = cache
+        self._coalescer = coalescer = coalescer or Coalescer()
+        if ponder is None:
+            ponder = os.getenv('ENGINE_PONDER', 'false').lower() in ('1', 'true', 'yes')
+        # Threads/Hash/NUMA per worker; spares start as play workers and are
+        # reconfigured to whichever slot they fill
+        self._plan = plan_from_env(self._size)
+        self._supervisor = EngineSupervisor.from_env(
+            lambda resources: ChessEngine(cache=cache, ponder=ponder, book=book, tablebase=tablebase,
+                                          resources=resources, coalescer=coalescer),
+            spare_resources=self._plan[0])
+        self._workers = [self._supervisor.start_engine(resources) for resources in self._plan] # By slot
+        self._idle = list(self._workers)
+        self._available = threading.Condition()
+        self._supervisor.start(on_check=self._check_idle)
+
+        # AI opponent settings are app-wide; workers pick them up on checkout
+        self._settings_lock = threading.Lock()
+        self._settings = {'depth': 5, 'skill_level': 10, 'ai_side': 'black', 'movetime': None, 'nodes': None}
+
+        # Latency target (ms) for budgeted checkouts, None for no target
+        try:
+            self._slo_ms = max(0, int(os.getenv('ENGINE_SLO_MS', 0))) or None
+        except ValueError:
+            self._slo_ms = None
+        for resources in self._plan:
+            logger.info("Engine worker: %s", resources)
+        logger.info("Started %s engine workers", self._size)
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def coalescer(self):
+        return self._coalescer
+
+    @contextmanager
+    def engine(self, timeout=None, prefer=None, budgeted=False, role='play', batch=False, deadline=None):
+        """Check out an idle worker, synced to the current AI settings.
+
+        Blocks until a worker is free (or raises TimeoutError after `timeout`).
+        If `prefer` (a worker from an earlier checkout) is idle and already
+        in `role`'s mode it is handed out again, so a game keeps landing on
+        the engine whose hash table already holds its positions. Otherwise
+        the most recently used worker of the requested `role` ('play' or
+        'analysis') that is not pondering for another game is returned.
+        Without workers of that role, one whose options are already in that
+        mode is taken, so workers are not switched between play and analysis
+        options on every request; failing that, any idle worker.
+
+        With `budgeted` and a latency SLO set, the worker's searches must
+        finish within the SLO counted from this call. Time spent queueing
+        for a worker comes out of the search budget, so searches get shorter
+        as the server comes under pressure. Passing a `deadline` from
+        request_deadline() instead lets several checkouts share one budget.
+
+        `batch` marks the checkout as background work: on the engine farm its
+        searches wait until no interactive search is queued.
+        """
+        if deadline is None and budgeted:
+            deadline = self.request_deadline()
+        with self._available:
+            if not self._available.wait_for(lambda: self._idle, timeout=timeout):
+                raise TimeoutError("No engine worker became available")
+            worker = self._pick(prefer, role)
+            self._idle.remove(worker)
+        try:
+            worker = self._healthy(worker) # Crashed while idle: hand out a spare instead
+            self._sync_settings(worker)
+            worker.set_deadline(deadline)
+            worker.set_batch(batch)
+            yield worker
+        finally:
+            worker.set_deadline(None)
+            worker.set_batch(False)
+            worker = self._healthy(worker)
+            with self._available:
+                self._idle.append(worker)
+                self._available.notify()
+
+    def analyze(self, fen, num_moves=3, budgeted=False, role='analysis'):
+        """ChessEngine.analyze_position on a checked-out worker.
+
+        Callers asking for a position already being analysed through this
+        method, with the same `budgeted` and `role`, wait for that result
+        instead of checking out a worker of their own. The returned dict is shared and must not be modified.
+        """
+        def run():
+            with self.engine(budgeted=budgeted, role=role) as chess_engine:
+                return chess_engine.analyze_position(fen, num_moves)
+        # Own key namespace: the leader's worker coalesces on the search key underneath.
+        # Budgeted and unbudgeted callers never share: one would overrun its SLO
+        # or the other would get a search cut short
+        key = ('checkout', budgeted, role) + analysis_key(fen, None, num_moves)
+        return self._coalescer.run(key, run)
+
+    def request_deadline(self):
+        """time.monotonic() by which a request starting now should be answered, or None without an SLO."""
+        slo_ms = self.get_slo_ms()
+        return time.monotonic() + slo_ms / 1000 if slo_ms else None
+
+    def _pick(self, prefer, role):
+        if prefer is not None and prefer in self._idle and prefer.mode == role:
+            return prefer
+        # Workers of this role already in its mode, then of this role, then in its mode
+        candidates = ([w for w in self._idle if w.role == role and w.mode == role]
+                      or [w for w in self._idle if w.role == role]
+                      or [w for w in self._idle if w.mode == role]
+                      or self._idle)
+        for worker in reversed(candidates):
+            if not worker.is_pondering():
+                return worker
+        return candidates[-1]
+
+    def _healthy(self, worker):
+        """`worker`, or its replacement if it crashed or is due for recycling."""
+        reason = self._supervisor.needs_replacing(worker)
+        if reason is None:
+            return worker
+        try:
+            slot = self._workers.index(worker)
+            replacement = self._supervisor.replacement(self._plan[slot])
+        except (StockfishException, OSError) as e:
+            logger.error("Could not replace %s engine: %s", reason, e)
+            return worker # Keep the slot; the next check tries again
+        logger.info("Replaced %s engine worker", reason)
+        self._workers[slot] = replacement
+        self._supervisor.retire(worker)
+        return replacement
+
+    def _check_idle(self):
+        """Replaces idle workers that crashed or are due for recycling (supervisor thread)."""
+        with self._available:
+            unhealthy = [w for w in self._idle if self._supervisor.needs_replacing(w)]
+            for worker in unhealthy:
+                self._idle.remove(worker)
+        for worker in unhealthy:
+            worker = self._healthy(worker)
+            with self._available:
+                self._idle.append(worker)
+                self._available.notify()
+
+    def resources(self):
+        """Resource allocation of every worker, idle or busy, plus host totals."""
+        with self._available:
+            idle = set(self._idle)
+        workers = [dict(worker.get_resources(), slot=slot, busy=worker not in idle)
+                   for slot, worker in enumerate(list(self._workers))]
+        return {
+            'cpus': len(available_cpus()),
+            'threads': sum(r['threads'] for r in self._plan),
+            'hash_mb': sum(r['hash_mb'] for r in self._plan),
+            'workers': workers
+        }
+
+    def close(self):
+        """Shuts down the supervisor and every idle worker's process."""
+        self._supervisor.stop()
+        with self._available:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.quit()
+
+    def _sync_settings(self, worker):
+        with self._settings_lock:
+            settings = dict(self._settings)
+        if worker.get_engine_settings() != settings:
+            # 0 clears a budget on the worker when the pool has none
+            worker.update_engine_settings(depth=settings['depth'], skill_level=settings['skill_level'],
+                                          movetime=settings['movetime'] or 0, nodes=settings['nodes'] or 0)
+            worker.set_ai_side(settings['ai_side'])
+
+    # --- Shared AI settings (same interface as ChessEngine) ---
+    def get_engine_settings(self):
+        with self._settings_lock:
+            return dict(self._settings, slo_ms=self._slo_ms)
+
+    def update_engine_settings(self, depth=None, skill_level=None, movetime=None, nodes=None, slo_ms=None):
+        """Updates the AI settings; for movetime, nodes and slo_ms, 0 removes the limit."""
+        with self._settings_lock:
+            if depth is not None:
+                self._settings['depth'] = max(1, min(30, depth))
+            if skill_level is not None:
+                self._settings['skill_level'] = max(0, min(20, skill_level))
+            if movetime is not None:
+                self._settings['movetime'] = max(0, movetime) or None
+            if nodes is not None:
+                self._settings['nodes'] = max(0, nodes) or None
+            if slo_ms is not None:
+                self._slo_ms = max(0, slo_ms) or None
+
+    def get_slo_ms(self):
+        with self._settings_lock:
+            return self._slo_ms
+
+    def set_ai_side(self, side):
+        with self._settings_lock:
+            self._settings['ai_side'] = side
+
+    def get_ai_side(self):
+        with self._settings_lock:
+            return self._settings['ai_side']
@@ -0,0 +1,156 @@
+"""Splitting the host's cores and memory between engine workers.
+
+Each worker gets a role, a Threads count and a Hash size. By default every
+worker plays and analyses with an equal share of the cores. With
+ENGINE_ANALYSIS_WORKERS=N, N workers become deep-analysis workers with more
+threads and a bigger hash, and the rest play single-threaded.
+
+With ENGINE_PIN_THREADS=true each worker also gets its own slice of CPUs,
+taken NUMA node by NUMA node. The slice is passed to Stockfish as a custom
+NumaPolicy ("0-3:8-11", one CPU list per node), so Stockfish binds its
+threads there (and replicates its network per node) instead of every
+process piling onto the first node. ENGINE_NUMA_POLICY sets the policy
+as-is (auto, system, none, ...) when not pinning.
+"""
+import glob
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HASH_PER_THREAD = 16 # MB, Stockfish's own default for one thread
+
+
+def _env_int(name):
+    try:
+        return max(0, int(os.getenv(name, 0))) or None
+    except ValueError:
+        return None
+
+
+def available_cpus():
+    """CPUs this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_cpu_list(text):
+    """'0-3,8' -> [0, 1, 2, 3, 8]"""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def format_cpu_list(cpus):
+    """[0, 1, 2, 3, 8] -> '0-3,8'"""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def numa_nodes(cpus=None):
+    """Available CPUs grouped by NUMA node (a single group if the topology is unknown)."""
+    cpus = set(available_cpus() if cpus is None else cpus)
+    nodes = []
+    paths = sorted(glob.glob('/sys/devices/system/node/node[0-9]*/cpulist'),
+                   key=lambda path: int(re.search(r'node(\d+)', path).group(1)))
+    for path in paths:
+        try:
+            with open(path) as f:
+                node = [cpu for cpu in parse_cpu_list(f.read()) if cpu in cpus]
+        except (OSError, ValueError):
+            continue
+        if node:
+            nodes.append(node)
+    # CPUs the topology does not mention form a group of their own
+    leftover = cpus.difference(*nodes)
+    if leftover:
+        nodes.append(sorted(leftover))
+    return nodes
+
+
+def physical_memory_mb():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def plan_workers(size, analysis_workers=0, play_threads=None, analysis_threads=None,
+                 hash_total_mb=None, pin=False, numa_policy=None, cpus=None):
+    """Resources for each of `size` workers, play workers first.
+
+    Returns a list of dicts with role ('play' or 'analysis'), threads,
+    hash_mb, cpus (the pinned CPU list, or None) and numa_policy (the
+    NumaPolicy to send, or None to leave Stockfish's default).
+    """
+    cpus = available_cpus() if cpus is None else cpus
+    analysis_workers = max(0, min(analysis_workers, size - 1)) # Keep at least one play worker
+    play_workers = size - analysis_workers
+
+    if play_threads is None:
+        play_threads = 1 if analysis_workers else max(1, len(cpus) // size)
+    if analysis_threads is None and analysis_workers:
+        analysis_threads = max(1, (len(cpus) - play_workers * play_threads) // analysis_workers)
+    threads = [play_threads] * play_workers + [analysis_threads] * analysis_workers
+    total_threads = sum(threads)
+    if total_threads > len(cpus):
+        logger.warning("%s engine threads on %s CPUs: workers will compete for cores", total_threads, len(cpus))
+
+    # Hash in proportion to threads: deep-analysis workers get the big tables
+    if hash_total_mb is None:
+        hash_total_mb = DEFAULT_HASH_PER_THREAD * total_threads
+    memory = physical_memory_mb()
+    if memory and hash_total_mb > memory // 2:
+        logger.warning("Engine hash capped at half of physical memory (%s MB)", memory // 2)
+        hash_total_mb = memory // 2
+
+    # Pinned workers take consecutive CPUs, node by node (wrapping if oversubscribed)
+    nodes = numa_nodes(cpus) if pin else []
+    ordered = [(index, cpu) for index, node in enumerate(nodes) for cpu in node]
+    next_cpu = 0
+
+    plan = []
+    for slot, count in enumerate(threads):
+        worker = {
+            'role': 'play' if slot < play_workers else 'analysis',
+            'threads': count,
+            'hash_mb': max(1, hash_total_mb * count // total_threads),
+            'cpus': None,
+            'numa_policy': numa_policy
+        }
+        if ordered:
+            assigned = [ordered[(next_cpu + i) % len(ordered)] for i in range(count)]
+            next_cpu += count
+            worker['cpus'] = sorted({cpu for _, cpu in assigned})
+            by_node = {}
+            for node, cpu in assigned:
+                by_node.setdefault(node, set()).add(cpu)
+            worker['numa_policy'] = ':'.join(format_cpu_list(by_node[node]) for node in sorted(by_node))
+        plan.append(worker)
+    return plan
+
+
+def plan_from_env(size):
+    """plan_workers configured from ENGINE_ANALYSIS_WORKERS, ENGINE_THREADS,
+    ENGINE_ANALYSIS_THREADS, ENGINE_HASH_MB (total), ENGINE_PIN_THREADS and
+    ENGINE_NUMA_POLICY."""
+    return plan_workers(
+        size,
+        analysis_workers=_env_int('ENGINE_ANALYSIS_WORKERS') or 0,
+        play_threads=_env_int('ENGINE_THREADS'),
+        analysis_threads=_env_int('ENGINE_ANALYSIS_THREADS'),
+        hash_total_mb=_env_int('ENGINE_HASH_MB'),
+        pin=os.getenv('ENGINE_PIN_THREADS', 'false').lower() in ('1', 'true', 'yes'),
+        numa_policy=os.getenv('ENGINE_NUMA_POLICY') or None
+    )
@@ -0,0 +1,84 @@
+import secrets
+import threading
+import time
+import chess
+from chess_engine.wire import DeltaChannel
+
+
+class GameSession:
+    """Server-side state of one game: the board with its full move stack.
+
+    `game_id` lets its holder play moves; `watch_id` only lets spectators follow the game.
+    """
+
+    def __init__(self, game_id, board):
+        self.game_id = game_id
+        self.watch_id = secrets.token_urlsafe(12)
+        self.board = board
+        self.lock = threading.Lock()   # One request at a time per game
+        self.last_engine = None        # Worker that played this game's AI moves last (warm hash)
+        self.last_analysis_engine = None # Worker that analysed this game last
+        self.touched = time.monotonic()
+        self.channel = DeltaChannel()  # Updates sent to the player (HTTP) and spectators
+        self.watchers = {}             # Spectating socket client ID -> encoding
+
+
+class SessionStore:
+    """In-memory game sessions keyed by game ID (and by watch ID for spectators).
+
+    Sessions idle for longer than `ttl` seconds are dropped, and the oldest
+    ones are evicted beyond `max_sessions`.
+    """
+
+    def __init__(self, ttl=3600, max_sessions=10000):
+        self._ttl = ttl
+        self._max_sessions = max_sessions
+        self._sessions = {}
+        self._watched = {} # Watch ID -> session
+        self._lock = threading.Lock()
+
+    def create(self, fen=None):
+        """Start a game from `fen` (or the initial position). Raises ValueError for a bad FEN."""
+        board = chess.Board(fen) if fen else chess.Board()
+        session = GameSession(secrets.token_urlsafe(12), board)
+        with self._lock:
+            self._expire()
+            self._sessions[session.game_id] = session
+            self._watched[session.watch_id] = session
+        return session
+
+    def get(self, game_id):
+        if not game_id:
+            return None
+        with self._lock:
+            session = self._sessions.get(game_id)
+            if session is not None:
+                session.touched = time.monotonic()
+            return session
+
+    def get_watched(self, watch_id):
+        """The session spectators know as `watch_id`; does not keep it alive."""
+        if not watch_id:
+            return None
+        with self._lock:
+            return self._watched.get(watch_id)
+
+    def discard(self, game_id):
+        with self._lock:
+            session = self._sessions.pop(game_id, None)
+            if session is not None:
+                self._watched.pop(session.watch_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self._ttl
+        for session in [s for s in self._sessions.values() if s.touched < cutoff]:
+            self._remove(session)
+        while len(self._sessions) >= self._max_sessions:
+            self._remove(min(self._sessions.values(), key=lambda s: s.touched))
+
+    def _remove(self, session):
+        del self._sessions[session.game_id]
+        self._watched.pop(session.watch_id, None)
@@ -0,0 +1,71 @@
+import threading
+from chess_engine import metrics
+
+
+class _Stream:
+    def __init__(self, fen):
+        self.fen = fen
+        self.cancelled = threading.Event()
+        self.engine = None
+
+
+class AnalysisStreamer:
+    """Runs at most one streaming analysis per client.
+
+    Starting a new position for a client cancels that client's previous
+    search, so abandoned positions stop using engine time. Searches run on
+    workers checked out from the engine pool, in background tasks started
+    with `start_task` (e.g. socketio.start_background_task).
+    """
+
+    def __init__(self, engine_pool, start_task, on_update, num_moves=3, min_interval=0.1):
+        self._engine_pool = engine_pool
+        self._start_task = start_task
+        self._on_update = on_update # Called as on_update(client_id, fen, analysis, final)
+        self._num_moves = num_moves
+        self._min_interval = min_interval
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def start(self, client_id, fen):
+        stream = _Stream(fen)
+        with self._lock:
+            previous = self._streams.get(client_id)
+            self._streams[client_id] = stream
+        if previous is not None:
+            self._cancel(previous)
+        self._start_task(self._run, client_id, stream)
+
+    def stop(self, client_id):
+        with self._lock:
+            stream = self._streams.pop(client_id, None)
+        if stream is not None:
+            self._cancel(stream)
+
+    def _cancel(self, stream):
+        stream.cancelled.set()
+        engine = stream.engine
+        if engine is not None:
+            engine.stop_search(stream.cancelled)
+
+    def _run(self, client_id, stream):
+        if stream.cancelled.is_set():
+            return
+        with metrics.request_timer('socket_stream'), self._engine_pool.engine(role='analysis') as chess_engine:
+            stream.engine = chess_engine
+            # The stream may have been cancelled while waiting for a worker
+            if stream.cancelled.is_set():
+                return
+            try:
+                chess_engine.stream_analysis(
+                    stream.fen,
+                    lambda analysis, final: self._on_update(client_id, stream.fen, analysis, final),
+                    stream.cancelled,
+                    num_moves=self._num_moves,
+                    min_interval=self._min_interval
+                )
+            finally:
+                stream.engine = None
+                with self._lock:
+                    if self._streams.get(client_id) is stream:
+                        del self._streams[client_id]
@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+from stockfish import StockfishException
+
+logger = logging.getLogger(__name__)
+
+# Grace (s) past a search's own movetime before it counts as hung
+SEARCH_MARGIN = 30
+
+
+def _env_int(name, default):
+    try:
+        return max(0, int(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+class EngineSupervisor:
+    """Starts, warms, watches and replaces the pool's Stockfish processes.
+
+    Engines are warmed up (network loaded, `isready` answered, one tiny
+    search) before they take traffic, and `spares` warm engines are kept
+    ready so a replacement never starts cold on the request path. A
+    background thread kills any engine stuck waiting on Stockfish: a search
+    with a movetime once it overruns that by SEARCH_MARGIN seconds, any
+    other wait (depth- or node-limited searches, option changes) after
+    `search_timeout` seconds. The blocked request then fails like a crash,
+    and the pool swaps the engine for a spare. Engines are also recycled
+    after `recycle_after` searches (0 to never recycle).
+    """
+
+    def __init__(self, factory, spares=1, recycle_after=0, search_timeout=600, check_interval=1.0,
+                 spare_resources=None):
+        self._factory = factory # factory(resources) -> ChessEngine
+        self._spare_resources = spare_resources
+        self._spares_wanted = spares
+        self._recycle_after = recycle_after
+        self._search_timeout = search_timeout
+        self._check_interval = check_interval
+
+        self._spares = []
+        self._watched = set()
+        self._lock = threading.Lock()
+        self._refilling = False
+        self._stopped = threading.Event()
+        self._on_check = None
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, factory, spare_resources=None):
+        """Settings from ENGINE_SPARES, ENGINE_RECYCLE_AFTER and ENGINE_SEARCH_TIMEOUT."""
+        return cls(
+            factory,
+            spares=_env_int('ENGINE_SPARES', 1),
+            recycle_after=_env_int('ENGINE_RECYCLE_AFTER', 0),
+            search_timeout=_env_int('ENGINE_SEARCH_TIMEOUT', 600) or 600,
+            spare_resources=spare_resources
+        )
+
+    def start(self, on_check=None):
+        """Starts the watchdog thread; `on_check()` is called on every pass (idle health checks)."""
+        self._on_check = on_check
+        self._thread = threading.Thread(target=self._run, name='engine-supervisor', daemon=True)
+        self._thread.start()
+        self._refill()
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            spares, self._spares = self._spares, []
+        for engine in spares:
+            engine.quit()
+
+    def start_engine(self, resources=None):
+        """A new, warmed-up engine under watch. Raises StockfishException if it fails to start."""
+        engine = self._factory(resources or self._spare_resources)
+        try:
+            engine.warm_up()
+        except StockfishException:
+            engine.kill()
+            raise
+        with self._lock:
+            self._watched.add(engine)
+        return engine
+
+    def replacement(self, resources=None):
+        """A warm spare (reconfigured to `resources`) if one is ready, otherwise a freshly started engine."""
+        while True:
+            with self._lock:
+                engine = self._spares.pop() if self._spares else None
+            if engine is None or engine.is_alive():
+                break
+            self.retire(engine) # Spare died while waiting
+        self._refill()
+        if engine is None:
+            return self.start_engine(resources)
+        if resources is not None:
+            # Resizing threads and hash is far cheaper than a cold start
+            engine.configure(resources)
+        return engine
+
+    def retire(self, engine):
+        """Stops watching `engine` and shuts its process down in the background."""
+        with self._lock:
+            self._watched.discard(engine)
+        threading.Thread(target=engine.quit, daemon=True).start()
+
+    def needs_replacing(self, engine):
+        if not engine.is_alive():
+            return 'crashed'
+        if self._recycle_after and engine.search_count() >= self._recycle_after:
+            return 'recycled'
+        return None
+
+    def timeout_for(self, engine):
+        """Seconds `engine`'s current wait may last before it is killed as hung."""
+        limit = engine.busy_limit()
+        return limit + SEARCH_MARGIN if limit is not None else self._search_timeout
+
+    def _refill(self):
+        with self._lock:
+            if self._refilling or len(self._spares) >= self._spares_wanted or self._stopped.is_set():
+                return
+            self._refilling = True
+        threading.Thread(target=self._fill_spares, daemon=True).start()
+
+    def _fill_spares(self):
+        try:
+            while not self._stopped.is_set():
+                with self._lock:
+                    if len(self._spares) >= self._spares_wanted:
+                        return
+                try:
+                    engine = self.start_engine()
+                except (StockfishException, OSError) as e:
+                    logger.error("Could not start a spare engine: %s", e)
+                    return
+                with self._lock:
+                    self._spares.append(engine)
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def _run(self):
+        while not self._stopped.wait(self._check_interval):
+            with self._lock:
+                engines = list(self._watched)
+            for engine in engines:
+                if engine.busy_for() > self.timeout_for(engine):
+                    logger.error("Engine unresponsive for %.0fs, killing it", engine.busy_for())
+                    engine.kill()
+            try:
+                if self._on_check is not None:
+                    self._on_check()
+                self._refill()
+            except Exception:
+                logger.exception("Engine health check failed")
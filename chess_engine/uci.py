@@ -0,0 +1,92 @@
+"""Helpers for reading Stockfish's UCI output.
+
+Stockfish reports scores from the side to move's point of view; the app
+always shows them from White's, so conversion happens in build_analysis.
+"""
+
+_INT_FIELDS = ('depth', 'seldepth', 'multipv', 'nodes', 'nps', 'time', 'hashfull', 'tbhits')
+
+
+def parse_info(line):
+    """Parse a UCI `info` line carrying a score into a dict.
+
+    Returns None for anything else (`info string`, `currmove` updates,
+    `bestmove`, ...).
+    """
+    tokens = line.split()
+    if not tokens or tokens[0] != 'info' or 'score' not in tokens:
+        return None
+
+    info = {}
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token in _INT_FIELDS:
+            info[token] = int(tokens[i + 1])
+            i += 2
+        elif token == 'score':
+            info['score_type'] = tokens[i + 1]
+            info['score'] = int(tokens[i + 2])
+            i += 3
+            if i < len(tokens) and tokens[i] in ('lowerbound', 'upperbound'):
+                info['bound'] = tokens[i]
+                i += 1
+        elif token == 'wdl':
+            info['wdl'] = [int(x) for x in tokens[i + 1:i + 4]]
+            i += 4
+        elif token == 'pv':
+            info['pv'] = tokens[i + 1:]
+            break
+        elif token == 'string':
+            return None
+        else:
+            i += 1
+    return info
+
+
+def parse_bestmove(line):
+    """Return (bestmove, ponder) from a `bestmove` line, or None if it is not one."""
+    tokens = line.split()
+    if not tokens or tokens[0] != 'bestmove':
+        return None
+    best = tokens[1] if len(tokens) > 1 and tokens[1] != '(none)' else None
+    ponder = tokens[3] if len(tokens) > 3 and tokens[2] == 'ponder' else None
+    return best, ponder
+
+
+def build_analysis(infos, white_to_move):
+    """Turn the latest info line of each MultiPV slot into the analysis dict.
+
+    `infos` maps MultiPV index -> parsed info. The evaluation is taken from
+    the first line, so one MultiPV search yields both the evaluation and the
+    top moves.
+    """
+    sign = 1 if white_to_move else -1
+    best_moves = []
+    for slot in sorted(infos):
+        info = infos[slot]
+        if not info.get('pv'):
+            continue
+        best_moves.append({
+            'Move': info['pv'][0],
+            'Centipawn': info['score'] * sign if info['score_type'] == 'cp' else None,
+            'Mate': info['score'] * sign if info['score_type'] == 'mate' else None,
+            'PV': info['pv']
+        })
+
+    top = infos.get(1)
+    if top is None:
+        return {'evaluation': {'type': 'cp', 'value': 0}, 'best_moves': best_moves, 'depth': 0}
+    return {
+        'evaluation': {'type': top['score_type'], 'value': top['score'] * sign},
+        'best_moves': best_moves,
+        'depth': top.get('depth', 0)
+    }
+
+
+def search_stats(infos):
+    """How far a search got: depth, nodes, NPS and time (ms) from its last info lines."""
+    if not infos:
+        return {'depth': 0, 'nodes': 0, 'nps': 0, 'time': 0}
+    return {field: max(info.get(field, 0) for info in infos.values())
+            for field in ('depth', 'nodes', 'nps', 'time')}
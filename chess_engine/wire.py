@@ -0,0 +1,130 @@
+"""Delta updates and optional MessagePack encoding for responses and socket events.
+
+A DeltaChannel follows the successive states of one stream of updates (a
+game, or one client's analysis events) and turns each new state into a
+message carrying only what changed:
+
+    {'seq': 7, 'full': {...}}                  # the whole state
+    {'seq': 8, 'base': 7, 'delta': {...}}      # changes since seq 7
+
+A delta holds the changed keys. Nested dicts are diffed key by key, other
+values are replaced whole, and removed keys are listed under '$unset'. A
+receiver that does not hold `base` asks for a full state instead.
+
+Clients opt in to deltas and to MessagePack, so existing clients keep
+getting plain JSON. msgpack is optional: without it every client gets JSON.
+"""
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+UNSET = '$unset'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+
+def diff(old, new):
+    """Changes turning dict `old` into dict `new` (empty if they are equal)."""
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key, UNSET)
+        if previous == value:
+            continue
+        if isinstance(value, dict) and isinstance(previous, dict):
+            delta[key] = diff(previous, value)
+        else:
+            delta[key] = value
+    removed = [key for key in old if key not in new]
+    if removed:
+        delta[UNSET] = removed
+    return delta
+
+
+def patch(old, delta):
+    """`old` with `delta` applied, as a new dict (`old` is left unchanged)."""
+    new = dict(old)
+    for key in delta.get(UNSET, ()):
+        new.pop(key, None)
+    for key, value in delta.items():
+        if key == UNSET:
+            continue
+        if isinstance(value, dict) and isinstance(new.get(key), dict):
+            new[key] = patch(new[key], value)
+        else:
+            new[key] = value
+    return new
+
+
+def negotiate(requested):
+    """The encoding to use for a client asking for `requested`."""
+    return 'msgpack' if requested == 'msgpack' and msgpack is not None else 'json'
+
+
+def encodings():
+    return ('json', 'msgpack') if msgpack is not None else ('json',)
+
+
+def encode(message, encoding):
+    """`message` as MessagePack bytes, or unchanged for JSON (serialized by the transport)."""
+    if encoding == 'msgpack':
+        return msgpack.packb(message)
+    return message
+
+
+class DeltaChannel:
+    """Successive states of one update stream, numbered by `seq`.
+
+    Callers hold `lock` from update() until the message has been emitted,
+    so messages leave in sequence order.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._state = None
+        self._seq = 0
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def update(self, state):
+        """Records `state`. Returns (full message, delta message or None when
+        there is no earlier state to diff against)."""
+        previous = self._state
+        self._state = state
+        self._seq += 1
+        full = {'seq': self._seq, 'full': state}
+        if previous is None:
+            return full, None
+        return full, {'seq': self._seq, 'base': self._seq - 1, 'delta': diff(previous, state)}
+
+    def snapshot(self):
+        """A full message for the current state, or None before the first update."""
+        if self._state is None:
+            return None
+        return {'seq': self._seq, 'full': self._state}
+
+    def reset(self):
+        """Makes the next update go out as a full state."""
+        self._state = None
+
+
+class Client:
+    """How one socket client wants its updates: encoding, deltas and the
+    channel behind each delta-encoded event."""
+
+    def __init__(self, encoding='json', deltas=False):
+        self.encoding = encoding
+        self.deltas = deltas
+        self.watching = set() # Watch IDs of the games this client spectates
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def channel(self, event):
+        with self._lock:
+            channel = self._channels.get(event)
+            if channel is None:
+                channel = self._channels[event] = DeltaChannel()
+            return channel
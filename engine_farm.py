@@ -0,0 +1,106 @@
+"""Run the engine farm: a broker, or Stockfish workers that connect to it.
+
+The web tier sends its searches to the broker when ENGINE_BROKER=host:port
+is set (see chess_engine/farm.py). Start the broker once, then any number
+of worker machines:
+
+    python engine_farm.py broker --listen 0.0.0.0:7777 --token <secret>
+    python engine_farm.py worker --broker farm-host:7777 --token <secret> --processes 8 --hash 256
+
+The broker listens on 127.0.0.1 unless told otherwise, and only listens
+elsewhere with a token (--token or ENGINE_FARM_TOKEN), which the web tier
+and every worker must present.
+
+Each worker process runs one Stockfish and searches one job at a time.
+Interactive AI moves are handed out before analysis, and analysis before
+batch work such as game reviews and puzzle mining.
+"""
+import argparse
+import ipaddress
+import logging
+import os
+import threading
+from dotenv import load_dotenv
+from chess_engine.farm import DEFAULT_PORT, Broker, FarmWorker, parse_address
+from chess_engine.logs import configure_logging
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def run_broker(args):
+    host, port = parse_address(args.listen)
+    if not args.token and not _is_loopback(host):
+        raise SystemExit("Refusing to listen on %s without a token: set ENGINE_FARM_TOKEN or pass --token" % host)
+    broker = Broker(token=args.token)
+    host, port = broker.serve(host, port)
+    logger.info("Engine broker listening on %s:%s", host, port)
+    stop = threading.Event()
+    try:
+        while not stop.wait(args.report_every):
+            logger.info("Engine broker: %s", broker.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.close()
+
+
+def run_workers(args):
+    if not args.stockfish:
+        raise SystemExit("Set STOCKFISH_PATH or pass --stockfish")
+    options = {}
+    if args.syzygy:
+        options['SyzygyPath'] = args.syzygy
+    stop = threading.Event()
+    for i in range(args.processes):
+        worker = FarmWorker(args.broker, args.stockfish, threads=args.threads, hash_mb=args.hash, options=options,
+                            token=args.token)
+        threading.Thread(target=worker.run, args=(stop,), name=f'farm-worker-{i}', daemon=True).start()
+    logger.info("Started %d engine farm workers for %s", args.processes, args.broker)
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        stop.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    broker = commands.add_parser('broker', help="queue searches and hand them to workers")
+    broker.add_argument('--listen', default=f'127.0.0.1:{DEFAULT_PORT}', help="host:port to listen on")
+    broker.add_argument('--token', default=os.getenv('ENGINE_FARM_TOKEN'),
+                        help="shared secret engines and workers must present (default: ENGINE_FARM_TOKEN)")
+    broker.add_argument('--report-every', type=float, default=60.0, help="seconds between queue reports")
+    broker.set_defaults(run=run_broker)
+
+    worker = commands.add_parser('worker', help="run Stockfish processes for a broker")
+    worker.add_argument('--broker', default=os.getenv('ENGINE_BROKER') or f'127.0.0.1:{DEFAULT_PORT}',
+                        help="broker host:port (default: ENGINE_BROKER)")
+    worker.add_argument('--stockfish', default=os.getenv('STOCKFISH_PATH'),
+                        help="Stockfish executable (default: STOCKFISH_PATH)")
+    worker.add_argument('--processes', type=int, default=os.cpu_count() or 1, help="Stockfish processes")
+    worker.add_argument('--threads', type=int, default=1, help="Threads per process")
+    worker.add_argument('--hash', type=int, default=64, help="hash per process (MB)")
+    worker.add_argument('--token', default=os.getenv('ENGINE_FARM_TOKEN'),
+                        help="broker's shared secret (default: ENGINE_FARM_TOKEN)")
+    worker.add_argument('--syzygy', default=os.getenv('SYZYGY_PATH'), help="Syzygy tablebase directory")
+    worker.set_defaults(run=run_workers)
+
+    args = parser.parse_args(argv)
+    configure_logging()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Mine tactics puzzles from PGN archives into the puzzle store.
+
+PGN files are streamed game by game, so archives of any size can be used.
+Every game is mined by a pool of worker processes, each driving its own
+Stockfish (see learning/puzzles.py for how positions are picked and
+verified). Puzzles go to a SQLite file the app serves from PUZZLE_DB_PATH:
+
+    python generate_puzzles.py lichess_db_2024-01.pgn --db puzzles.db
+
+After every game the store records how far into each file it got, so an
+interrupted run picks up where it stopped when started again with the same
+file and --db (use --restart to mine a file from the beginning). Progress
+and throughput (positions per second) are reported as games complete.
+"""
+import argparse
+import io
+import logging
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import chess.pgn
+from chess_engine.engine import ChessEngine
+from chess_engine.logs import configure_logging
+from learning.puzzles import MIN_GAP, MIN_SWING, MIN_WINNING, PuzzleMiner, PuzzleStore
+
+logger = logging.getLogger(__name__)
+
+_miner = None # One per worker process
+_resources = None
+
+
+def iter_games(path, offset=0):
+    """(PGN text, end offset) of each game in `path`, starting at byte `offset`.
+
+    Games are split on the first tag line after a game's movetext, so the
+    file is read line by line and never held in memory.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        lines = []
+        in_movetext = False
+        for line in f:
+            if line.startswith(b'[') and in_movetext:
+                yield b''.join(lines).decode('utf-8', errors='replace'), offset
+                lines = []
+                in_movetext = False
+            lines.append(line)
+            offset += len(line)
+            if line.strip() and not line.startswith(b'['):
+                in_movetext = True
+        if in_movetext:
+            yield b''.join(lines).decode('utf-8', errors='replace'), offset
+
+
+def _new_engine():
+    engine = ChessEngine(resources=_resources)
+    engine.set_batch(True) # With ENGINE_BROKER set, mining yields to the app's searches
+    return engine
+
+
+def _start_miner(hash_mb, settings):
+    global _miner, _resources
+    # Ctrl-C is for the main process, which stops handing out games; the
+    # worker (and the Stockfish it starts, which inherits this) finishes its game
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_logging()
+    _resources = {'role': 'analysis', 'threads': 1, 'hash_mb': hash_mb, 'cpus': None, 'numa_policy': None}
+    _miner = PuzzleMiner(_new_engine(), **settings)
+
+
+def _mine(text):
+    """Puzzles and counts for one game's PGN text (runs in a worker process)."""
+    try:
+        game = chess.pgn.read_game(io.StringIO(text))
+    except ValueError as e:
+        logger.warning("Skipping unreadable game: %s", e)
+        game = None
+    if game is None or game.errors:
+        return [], {'positions': 0, 'candidates': 0, 'verified': 0}
+    for _ in range(2):
+        result = _miner.mine(game)
+        if _miner.engine.is_alive():
+            return result
+        # Searches on a dead engine come back empty: mine the game again on a fresh one
+        logger.error("Engine crashed while mining a game, restarting it")
+        _miner.engine = _new_engine()
+    return [], {'positions': 0, 'candidates': 0, 'verified': 0}
+
+
+def mine_file(path, store, executor, window, limit=None, restart=False, report_every=10.0):
+    """Mines one PGN file, resuming from the store's progress. Returns the totals of this run."""
+    source = os.path.abspath(path)
+    if restart:
+        store.forget(source)
+    progress = store.progress(source)
+    offset = progress['offset'] if progress else 0
+    if progress:
+        print(f"{path}: resuming after {progress['games']} games ({progress['puzzles']} puzzles)", file=sys.stderr)
+
+    totals = {'games': 0, 'positions': 0, 'candidates': 0, 'verified': 0, 'puzzles': 0}
+    started = last_report = time.monotonic()
+
+    def report(final=False):
+        elapsed = time.monotonic() - started
+        rate = totals['positions'] / elapsed if elapsed else 0.0
+        print(f"{path}: {totals['games']} games, {totals['positions']} positions ({rate:.1f} positions/s), "
+              f"{totals['candidates']} candidates, {totals['verified']} verified, {totals['puzzles']} new puzzles"
+              + (f" in {elapsed:.1f}s" if final else ""), file=sys.stderr)
+
+    # A bounded window of games in flight: results are stored in file order,
+    # so the recorded offset never skips a game that has not been stored
+    pending = deque()
+    games = iter_games(path, offset)
+    while True:
+        while len(pending) < window and (limit is None or totals['games'] + len(pending) < limit):
+            game = next(games, None)
+            if game is None:
+                break
+            text, end = game
+            pending.append((executor.submit(_mine, text), end))
+        if not pending:
+            break
+        future, end = pending.popleft()
+        puzzles, stats = future.result()
+        totals['puzzles'] += store.add(puzzles, source=source, offset=end, games=1, positions=stats['positions'])
+        totals['games'] += 1
+        for name in ('positions', 'candidates', 'verified'):
+            totals[name] += stats[name]
+        if time.monotonic() - last_report >= report_every:
+            last_report = time.monotonic()
+            report()
+    report(final=True)
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('pgn', nargs='+', help="PGN files to mine")
+    parser.add_argument('--db', default=os.getenv('PUZZLE_DB_PATH') or 'puzzles.db',
+                        help="puzzle store (default: PUZZLE_DB_PATH or puzzles.db)")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help="worker processes, one Stockfish each")
+    parser.add_argument('--scan-depth', type=int, default=8, help="depth of the evaluation-swing search")
+    parser.add_argument('--verify-depth', type=int, default=16, help="depth of the MultiPV verification search")
+    parser.add_argument('--max-moves', type=int, default=3, help="most solver moves per puzzle")
+    parser.add_argument('--min-ply', type=int, default=10, help="skip positions before this ply")
+    parser.add_argument('--min-swing', type=int, default=MIN_SWING)
+    parser.add_argument('--min-winning', type=int, default=MIN_WINNING)
+    parser.add_argument('--min-gap', type=int, default=MIN_GAP)
+    parser.add_argument('--hash', type=int, default=64, help="Stockfish hash per process (MB)")
+    parser.add_argument('--limit', type=int, help="stop after this many games per file")
+    parser.add_argument('--restart', action='store_true', help="ignore recorded progress")
+    parser.add_argument('--report-every', type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    settings = {
+        'scan_depth': args.scan_depth, 'verify_depth': args.verify_depth, 'max_moves': args.max_moves,
+        'min_ply': args.min_ply, 'min_swing': args.min_swing, 'min_winning': args.min_winning,
+        'min_gap': args.min_gap
+    }
+    store = PuzzleStore(args.db)
+    executor = ProcessPoolExecutor(max_workers=args.processes, initializer=_start_miner,
+                                   initargs=(args.hash, settings))
+    results = {}
+    try:
+        for path in args.pgn:
+            results[path] = mine_file(path, store, executor, window=args.processes * 4,
+                                      limit=args.limit, restart=args.restart, report_every=args.report_every)
+    except KeyboardInterrupt:
+        print("Interrupted; run again with the same arguments to resume", file=sys.stderr)
+    finally:
+        # Games still in flight are dropped; the store's offset stops before them
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(f"{store.count()} puzzles in {args.db}", file=sys.stderr)
+        store.close()
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,22 @@
 import chess
-from chess_engine.engine import ChessEngine
+from learning import features
 
 class PositionAnalyzer:
-    def __init__(self):
-        self.chess_engine = ChessEngine()
+    def __init__(self, engine_pool=None):
+        # Shared pool, only used when a caller has no engine analysis to hand over
+        self.engine_pool = engine_pool
     
-    def analyze_position(self, fen):
-        """Analyze the position and provide learning insights"""
+    def analyze_position(self, fen, analysis=None):
+        """Analyze the position and provide learning insights.
+
+        `analysis` is the result of ChessEngine.analyze_position for this FEN.
+        Pass it in to avoid running the same search a second time.
+        """
         board = chess.Board(fen)
-        analysis = self.chess_engine.analyze_position(fen)
+        if analysis is None:
+            if self.engine_pool is None:
+                raise ValueError("No engine analysis given and no engine pool configured")
+            analysis = self.engine_pool.analyze(fen)
         
         insights = {
             'material_balance': self._calculate_material_balance(board),
@@ -21,87 +29,74 @@ class PositionAnalyzer:
     
     def _calculate_material_balance(self, board):
         """Calculate material balance between white and black"""
-        piece_values = {
-            'P': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 0,
-            'p': -1, 'n': -3, 'b': -3, 'r': -5, 'q': -9, 'k': 0
-        }
-        
-        material = 0
-        for piece in board.piece_map().values():
-            material += piece_values[piece.symbol()]
-        
-        return material
+        return features.material_balance(board)
     
     def _analyze_positional_features(self, board):
         """Analyze positional features of the current position"""
-        features = {
-            'center_control': self._evaluate_center_control(board),
+        # Attack maps are shared by center control, mobility and king safety
+        attacks = {
+            chess.WHITE: features.attack_mask(board, chess.WHITE),
+            chess.BLACK: features.attack_mask(board, chess.BLACK)
+        }
+        positional_features = {
+            'center_control': self._evaluate_center_control(board, attacks),
             'piece_activity': self._evaluate_piece_activity(board),
+            'mobility': self._evaluate_mobility(board, attacks),
             'pawn_structure': self._evaluate_pawn_structure(board),
-            'king_safety': self._evaluate_king_safety(board)
+            'king_safety': self._evaluate_king_safety(board, attacks)
         }
-        return features
+        return positional_features
     
-    def _evaluate_center_control(self, board):
+    def _evaluate_center_control(self, board, attacks):
         """Evaluate control of central squares"""
-        center_squares = [chess.E4, chess.D4, chess.E5, chess.D5]
-        control = {'white': 0, 'black': 0}
-        
-        for square in center_squares:
-            if board.is_attacked_by(chess.WHITE, square):
-                control['white'] += 1
-            if board.is_attacked_by(chess.BLACK, square):
-                control['black'] += 1
-        
-        return control
+        return {
+            'white': features.popcount(attacks[chess.WHITE] & chess.BB_CENTER),
+            'black': features.popcount(attacks[chess.BLACK] & chess.BB_CENTER)
+        }
     
     def _evaluate_piece_activity(self, board):
         """Evaluate piece activity and development"""
         activity = {
-            'white_developed': len([p for p in board.pieces(chess.KNIGHT, chess.WHITE) if p > chess.H2]),
-            'black_developed': len([p for p in board.pieces(chess.KNIGHT, chess.BLACK) if p < chess.H7])
+            'white_developed': features.popcount(board.pieces_mask(chess.KNIGHT, chess.WHITE) & features.WHITE_DEVELOPED),
+            'black_developed': features.popcount(board.pieces_mask(chess.KNIGHT, chess.BLACK) & features.BLACK_DEVELOPED)
         }
         return activity
     
-    def _evaluate_pawn_structure(self, board):
-        """Evaluate pawn structure"""
-        # Basic pawn structure analysis
-        white_pawns = board.pieces(chess.PAWN, chess.WHITE)
-        black_pawns = board.pieces(chess.PAWN, chess.BLACK)
-        
+    def _evaluate_mobility(self, board, attacks):
+        """Squares each side attacks that are not occupied by its own pieces"""
         return {
-            'white_pawns': len(white_pawns),
-            'black_pawns': len(black_pawns),
-            'isolated_pawns': self._count_isolated_pawns(board)
+            'white': features.popcount(attacks[chess.WHITE] & ~board.occupied_co[chess.WHITE]),
+            'black': features.popcount(attacks[chess.BLACK] & ~board.occupied_co[chess.BLACK])
         }
     
-    def _evaluate_king_safety(self, board):
-        """Evaluate king safety"""
-        # Basic king safety evaluation
-        white_king = board.king(chess.WHITE)
-        black_king = board.king(chess.BLACK)
+    def _evaluate_pawn_structure(self, board):
+        """Evaluate pawn structure"""
+        white_pawns = board.pieces_mask(chess.PAWN, chess.WHITE)
+        black_pawns = board.pieces_mask(chess.PAWN, chess.BLACK)
+        structure = features.pawn_structure(white_pawns, black_pawns)
         
         return {
-            'white_king_safety': len(list(board.attackers(chess.BLACK, white_king))),
-            'black_king_safety': len(list(board.attackers(chess.WHITE, black_king)))
+            'white_pawns': features.popcount(white_pawns),
+            'black_pawns': features.popcount(black_pawns),
+            'isolated_pawns': structure['isolated']['white'] + structure['isolated']['black'],
+            'doubled_pawns': structure['doubled'],
+            'passed_pawns': structure['passed'],
+            'open_files': structure['open_files']
         }
     
-    def _count_isolated_pawns(self, board):
-        """Count isolated pawns"""
-        isolated = 0
-        for color in [chess.WHITE, chess.BLACK]:
-            pawns = board.pieces(chess.PAWN, color)
-            for pawn in pawns:
-                file = chess.square_file(pawn)
-                has_adjacent = False
-                for adj_file in [file - 1, file + 1]:
-                    if 0 <= adj_file <= 7:
-                        if any(p for p in pawns if chess.square_file(p) == adj_file):
-                            has_adjacent = True
-                            break
-                if not has_adjacent:
-                    isolated += 1
-        return isolated
+    def _evaluate_king_safety(self, board, attacks):
+        """Evaluate king safety"""
+        safety = {}
+        for color, name in ((chess.WHITE, 'white'), (chess.BLACK, 'black')):
+            king = board.king(color)
+            if king is None:
+                safety[f'{name}_king_safety'] = 0
+                safety[f'{name}_king_zone_attacks'] = 0
+                continue
+            # Pieces giving check, and squares around the king the opponent attacks
+            safety[f'{name}_king_safety'] = features.popcount(board.attackers_mask(not color, king))
+            safety[f'{name}_king_zone_attacks'] = features.popcount(attacks[not color] & chess.BB_KING_ATTACKS[king])
+        return safety
     
     def _get_suggested_improvements(self, analysis):
         """Generate suggested improvements based on analysis"""
@@ -131,6 +126,15 @@ class PositionAnalyzer:
         top_cp = top_move.get('Centipawn') 
         top_mate = top_move.get('Mate')
 
+        source = analysis.get('source')
+        if source == 'book':
+            learning_points.append(f"Book move: {top_move.get('Move', 'N/A')} - this position is still in opening theory")
+            return learning_points
+        if source == 'tablebase':
+            result = "winning" if top_cp and top_cp > 0 else "losing" if top_cp and top_cp < 0 else "drawn"
+            learning_points.append(f"Tablebase move: {top_move.get('Move', 'N/A')} (White is {result} with perfect play)")
+            return learning_points
+
         eval_str = f"(Mate in {top_mate})" if top_mate is not None else f"({top_cp/100.0:.2f})" if top_cp is not None else "(N/A)"
         learning_points.append(f"Best move: {top_move.get('Move', 'N/A')} {eval_str}")
         
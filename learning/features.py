@@ -0,0 +1,198 @@
+"""Bitboard helpers for positional features.
+
+Everything here works on python-chess's 64-bit square masks
+(board.occupied_co, board.pieces_mask, ...) with shifts and popcounts, so a
+feature costs a handful of integer operations instead of a loop over
+squares. batch_pawn_features applies the same operations to NumPy uint64
+arrays to score many positions (e.g. a whole game review) at once; NumPy is
+optional and a per-position fallback is used without it.
+"""
+import chess
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9}
+
+NOT_FILE_A = chess.BB_ALL & ~chess.BB_FILE_A
+NOT_FILE_H = chess.BB_ALL & ~chess.BB_FILE_H
+
+# "Developed" knight squares as the analyzer has always counted them:
+# beyond h2 for White, before h7 for Black
+WHITE_DEVELOPED = chess.BB_ALL & ~((1 << (chess.H2 + 1)) - 1)
+BLACK_DEVELOPED = (1 << chess.H7) - 1
+
+
+popcount = chess.popcount
+
+
+def north_fill(mask):
+    mask |= (mask << 8) & chess.BB_ALL
+    mask |= (mask << 16) & chess.BB_ALL
+    mask |= (mask << 32) & chess.BB_ALL
+    return mask
+
+
+def south_fill(mask):
+    mask |= mask >> 8
+    mask |= mask >> 16
+    mask |= mask >> 32
+    return mask
+
+
+def shift_east(mask):
+    return (mask << 1) & NOT_FILE_A
+
+
+def shift_west(mask):
+    return (mask >> 1) & NOT_FILE_H
+
+
+def file_set(mask):
+    """Byte with bit f set if `mask` has a square on file f."""
+    return south_fill(mask) & chess.BB_RANK_1
+
+
+def pawn_attacks(pawns, color):
+    if color == chess.WHITE:
+        pushed = (pawns << 8) & chess.BB_ALL
+    else:
+        pushed = pawns >> 8
+    return shift_east(pushed) | shift_west(pushed)
+
+
+def attack_mask(board, color):
+    """Squares attacked by `color`: pawns by shifts, other pieces by attack tables."""
+    attacks = pawn_attacks(board.pieces_mask(chess.PAWN, color), color)
+    for square in chess.scan_forward(board.occupied_co[color] & ~board.pawns):
+        attacks |= board.attacks_mask(square)
+    return attacks
+
+
+def pawn_structure(white_pawns, black_pawns):
+    """Isolated, doubled and passed pawns per side, plus open files."""
+    white_files = file_set(white_pawns)
+    black_files = file_set(black_pawns)
+
+    def isolated(pawns, files):
+        lonely = files & ~((files << 1) | (files >> 1))
+        return popcount(pawns & north_fill(lonely))
+
+    # A pawn is passed when no enemy pawn is ahead of it on its own or an adjacent file
+    black_front = south_fill(black_pawns >> 8)
+    white_front = north_fill((white_pawns << 8) & chess.BB_ALL)
+    black_span = black_front | shift_east(black_front) | shift_west(black_front)
+    white_span = white_front | shift_east(white_front) | shift_west(white_front)
+
+    return {
+        'isolated': {'white': isolated(white_pawns, white_files), 'black': isolated(black_pawns, black_files)},
+        'doubled': {
+            'white': popcount(white_pawns) - popcount(white_files),
+            'black': popcount(black_pawns) - popcount(black_files)
+        },
+        'passed': {'white': popcount(white_pawns & ~black_span), 'black': popcount(black_pawns & ~white_span)},
+        'open_files': 8 - popcount(white_files | black_files)
+    }
+
+
+def material_balance(board):
+    return sum(
+        value * (popcount(board.pieces_mask(piece_type, chess.WHITE))
+                 - popcount(board.pieces_mask(piece_type, chess.BLACK)))
+        for piece_type, value in PIECE_VALUES.items()
+    )
+
+
+# --- Batched path ---
+
+if np is not None:
+    _POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+    _U = {n: np.uint64(n) for n in (1, 8, 16, 32)}
+
+
+def _np_popcount(masks):
+    return _POPCOUNT8[masks.view(np.uint8)].reshape(len(masks), 8).sum(axis=1)
+
+
+def _np_north_fill(masks):
+    for n in (8, 16, 32):
+        masks = masks | (masks << _U[n])
+    return masks
+
+
+def _np_south_fill(masks):
+    for n in (8, 16, 32):
+        masks = masks | (masks >> _U[n])
+    return masks
+
+
+def _np_east(masks):
+    return (masks << _U[1]) & np.uint64(NOT_FILE_A)
+
+
+def _np_west(masks):
+    return (masks >> _U[1]) & np.uint64(NOT_FILE_H)
+
+
+def batch_pawn_features(boards):
+    """Material balance and pawn structure for many boards at once.
+
+    Returns a dict of per-board lists: material_balance, isolated_white,
+    isolated_black, doubled_white, doubled_black, passed_white, passed_black
+    and open_files.
+    """
+    if np is None:
+        rows = []
+        for board in boards:
+            structure = pawn_structure(board.pieces_mask(chess.PAWN, chess.WHITE),
+                                       board.pieces_mask(chess.PAWN, chess.BLACK))
+            rows.append({
+                'material_balance': material_balance(board),
+                'isolated_white': structure['isolated']['white'],
+                'isolated_black': structure['isolated']['black'],
+                'doubled_white': structure['doubled']['white'],
+                'doubled_black': structure['doubled']['black'],
+                'passed_white': structure['passed']['white'],
+                'passed_black': structure['passed']['black'],
+                'open_files': structure['open_files']
+            })
+        return {key: [row[key] for row in rows] for key in rows[0]} if rows else {}
+
+    # One row per board, one column per (piece type, color) mask
+    masks = np.array(
+        [[board.pieces_mask(piece_type, color) for color in (chess.WHITE, chess.BLACK)
+          for piece_type in PIECE_VALUES] for board in boards],
+        dtype=np.uint64
+    ).reshape(len(boards), 2, len(PIECE_VALUES))
+    counts = _POPCOUNT8[masks.view(np.uint8)].reshape(len(boards), 2, len(PIECE_VALUES), 8).sum(axis=3)
+    values = np.array(list(PIECE_VALUES.values()), dtype=np.int64)
+    material = (counts[:, 0, :] - counts[:, 1, :]) @ values
+
+    white_pawns = np.ascontiguousarray(masks[:, 0, 0])
+    black_pawns = np.ascontiguousarray(masks[:, 1, 0])
+    rank_1 = np.uint64(chess.BB_RANK_1)
+    white_files = _np_south_fill(white_pawns) & rank_1
+    black_files = _np_south_fill(black_pawns) & rank_1
+
+    def isolated(pawns, files):
+        lonely = files & ~((files << _U[1]) | (files >> _U[1]))
+        return _np_popcount(pawns & _np_north_fill(lonely & rank_1))
+
+    black_front = _np_south_fill(black_pawns >> _U[8])
+    white_front = _np_north_fill(white_pawns << _U[8])
+    black_span = black_front | _np_east(black_front) | _np_west(black_front)
+    white_span = white_front | _np_east(white_front) | _np_west(white_front)
+
+    features = {
+        'material_balance': material,
+        'isolated_white': isolated(white_pawns, white_files),
+        'isolated_black': isolated(black_pawns, black_files),
+        'doubled_white': _np_popcount(white_pawns) - _np_popcount(white_files),
+        'doubled_black': _np_popcount(black_pawns) - _np_popcount(black_files),
+        'passed_white': _np_popcount(white_pawns & ~black_span),
+        'passed_black': _np_popcount(black_pawns & ~white_span),
+        'open_files': 8 - _np_popcount(white_files | black_files)
+    }
+    return {key: value.tolist() for key, value in features.items()}
@@ -0,0 +1,367 @@
+"""Tactics puzzles mined from played games, and the store the app serves them from.
+
+A puzzle starts right after a move that handed the other side a win. It is
+accepted only if the winning side has exactly one good move at every step
+of the solution. Candidates are found in three steps, each costlier than
+the last, so the expensive searches only run on a small share of positions:
+
+1. Bitboard features. The side to move can give check, promote, attack a
+   loose or more valuable piece, or press on the enemy king. This step skips quiet
+   positions without touching the engine.
+2. Evaluation swing. The position after the move is judged against the
+   position before it, using the game's own [%eval] comments when it has
+   them and a shallow search otherwise.
+3. Verification. A MultiPV 2 search must show the best move winning by a
+   clear margin over the second best. The same check is repeated for every
+   move of the solution.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import chess
+from chess_engine.cache import position_key
+from learning import features
+from learning.review import MATE_SCORE, score_cp
+
+# Thresholds in centipawns, from the solver's point of view
+MIN_SWING = 150      # The last move must cost at least this much...
+MIN_WINNING = 200    # ...and leave the solver at least this far ahead
+MIN_GAP = 250        # Best move must beat the second best by this much
+
+MIN_RATING = 600
+MAX_RATING = 2800
+
+
+def move_cp(move):
+    """White-relative centipawns of one analysis line (mates folded in)."""
+    if move.get('Mate') is not None:
+        return score_cp({'type': 'mate', 'value': move['Mate']})
+    return move.get('Centipawn') or 0
+
+
+def puzzle_id(fen):
+    return hashlib.sha1(position_key(fen).encode()).hexdigest()[:12]
+
+
+def is_tactical(board):
+    """Cheap pre-filter: the side to move has a forcing idea worth searching."""
+    us, them = board.turn, not board.turn
+    # Checks (and so every mate) and promotions
+    if any(move.promotion or board.gives_check(move) for move in board.legal_moves):
+        return True
+    attacks = features.attack_mask(board, us)
+    defended = features.attack_mask(board, them)
+    # Loose pieces we attack, kings excluded
+    if attacks & board.occupied_co[them] & ~defended & ~board.kings:
+        return True
+    # Pieces attacked by something cheaper
+    for square in chess.scan_forward(attacks & board.occupied_co[them] & ~board.kings & ~board.pawns):
+        value = features.PIECE_VALUES[board.piece_type_at(square)]
+        if any(features.PIECE_VALUES.get(board.piece_type_at(a), float('inf')) < value
+               for a in chess.scan_forward(board.attackers_mask(us, square))):
+            return True
+    king = board.king(them)
+    # Pressure around the enemy king
+    return king is not None and features.popcount(attacks & chess.BB_KING_ATTACKS[king]) >= 3
+
+
+def themes(board, solution, mate):
+    """Theme tags for a puzzle starting at `board` (solver to move)."""
+    tags = set()
+    first = solution[0]
+    solver = board.turn
+    if mate:
+        tags.add('mate')
+        tags.add(f"mate_in_{(len(solution) + 1) // 2}")
+    if board.is_capture(first):
+        victim = board.piece_type_at(first.to_square) or chess.PAWN # En passant
+        if not board.is_attacked_by(not solver, first.to_square) or \
+                features.PIECE_VALUES.get(victim, 0) > features.PIECE_VALUES.get(board.piece_type_at(first.from_square), 0):
+            tags.add('hanging_piece')
+    elif not board.gives_check(first) and not first.promotion:
+        tags.add('quiet_move')
+    if board.gives_check(first):
+        tags.add('check')
+    if any(move.promotion for move in solution[::2]):
+        tags.add('promotion')
+
+    after = board.copy(stack=False)
+    after.push(first)
+    moved = after.piece_type_at(first.to_square)
+    if moved != chess.KING:
+        # A fork hits two pieces worth at least a knight (or the king) at once
+        targets = [s for s in chess.scan_forward(after.attacks_mask(first.to_square) & after.occupied_co[not solver])
+                   if after.piece_type_at(s) == chess.KING or features.PIECE_VALUES[after.piece_type_at(s)] >= 3]
+        if len(targets) >= 2:
+            tags.add('fork')
+    # Sacrifice: the solver ends the line down material it started with
+    end = board.copy(stack=False)
+    for move in solution:
+        end.push(move)
+    lost = features.material_balance(end) - features.material_balance(board)
+    if lost * (1 if solver == chess.WHITE else -1) < 0 and not mate:
+        tags.add('sacrifice')
+
+    pieces = features.popcount(board.occupied & ~board.pawns & ~board.kings)
+    tags.add('endgame' if pieces <= 6 else 'opening' if board.fullmove_number <= 12 else 'middlegame')
+    tags.add('short' if len(solution) <= 1 else 'long' if len(solution) >= 5 else 'medium')
+    return sorted(tags)
+
+
+def rating(board, solution, tags, shallow_best):
+    """Rough difficulty: longer lines, quiet moves, sacrifices and moves a
+    shallow search misses are harder."""
+    value = 1000 + 150 * (len(solution) // 2)
+    if shallow_best != solution[0]:
+        value += 300
+    if 'quiet_move' in tags:
+        value += 250
+    if 'sacrifice' in tags:
+        value += 200
+    if 'hanging_piece' in tags:
+        value -= 200
+    if 'mate_in_1' in tags:
+        value -= 300
+    return max(MIN_RATING, min(MAX_RATING, value))
+
+
+class PuzzleMiner:
+    """Finds puzzles in games using one ChessEngine (not thread-safe).
+
+    `scan_depth` is the shallow search behind the evaluation swing,
+    `verify_depth` the MultiPV search that proves a move unique, and
+    `max_moves` caps the solver's moves per puzzle.
+    """
+
+    def __init__(self, engine, scan_depth=8, verify_depth=16, max_moves=3, min_ply=10,
+                 min_swing=MIN_SWING, min_winning=MIN_WINNING, min_gap=MIN_GAP):
+        self.engine = engine
+        self.scan_depth = scan_depth
+        self.verify_depth = verify_depth
+        self.max_moves = max_moves
+        self.min_ply = min_ply
+        self.min_swing = min_swing
+        self.min_winning = min_winning
+        self.min_gap = min_gap
+
+    def mine(self, game):
+        """Puzzles in the mainline of a chess.pgn.Game, plus counts of
+        positions scanned, tactical candidates and candidates verified."""
+        source = game.headers.get('Site') or \
+            f"{game.headers.get('White', '?')} - {game.headers.get('Black', '?')}, {game.headers.get('Date', '?')}"
+        stats = {'positions': 0, 'candidates': 0, 'verified': 0}
+        puzzles = []
+        shallow = {} # ply -> (white-relative cp, best move) of the position at that ply
+
+        board = game.board()
+        previous_eval = None
+        for ply, node in enumerate(game.mainline(), start=1):
+            last_move = node.move
+            board.push(last_move)
+            stats['positions'] += 1
+            # The game's own evaluation after this move, if annotated
+            annotated = node.eval()
+            current_eval = annotated.white().score(mate_score=MATE_SCORE) if annotated is not None else None
+            before_eval, previous_eval = previous_eval, current_eval
+
+            if ply < self.min_ply or board.is_game_over() or board.legal_moves.count() < 2:
+                continue
+            if not is_tactical(board):
+                continue
+            stats['candidates'] += 1
+
+            sign = 1 if board.turn == chess.WHITE else -1
+            best = None
+            if current_eval is None or before_eval is None:
+                current_eval, best = self._shallow(board, ply, shallow)
+                before = board.copy()
+                before.pop()
+                before_eval = self._shallow(before, ply - 1, shallow)[0]
+            # The opponent's last move must have thrown away a real advantage
+            if current_eval * sign < self.min_winning or (current_eval - before_eval) * sign < self.min_swing:
+                continue
+
+            stats['verified'] += 1
+            puzzle = self._verify(board, last_move, ply, best, source)
+            if puzzle is not None:
+                puzzles.append(puzzle)
+        return puzzles, stats
+
+    def _shallow(self, board, ply, memo):
+        if ply not in memo:
+            analysis = self.engine.analyze_position(board.fen(), num_moves=1, depth=self.scan_depth)
+            best = analysis['best_moves'][0]['Move'] if analysis['best_moves'] else None
+            memo[ply] = (score_cp(analysis['evaluation']), best and chess.Move.from_uci(best))
+        return memo[ply]
+
+    def _unique_best(self, board):
+        """The solver's only winning move and its principal variation, or None."""
+        analysis = self.engine.analyze_position(board.fen(), num_moves=2, depth=self.verify_depth)
+        lines = analysis['best_moves']
+        if not lines:
+            return None
+        sign = 1 if board.turn == chess.WHITE else -1
+        best = move_cp(lines[0]) * sign
+        second = move_cp(lines[1]) * sign if len(lines) > 1 else -MATE_SCORE
+        if best < self.min_winning or best - second < self.min_gap:
+            return None
+        return chess.Move.from_uci(lines[0]['Move']), lines[0].get('PV') or []
+
+    def _verify(self, board, last_move, ply, shallow_best, source):
+        start = board.copy(stack=False)
+        line = board.copy(stack=False)
+        solution = []
+        for _ in range(self.max_moves):
+            found = self._unique_best(line)
+            if found is None:
+                break
+            move, pv = found
+            solution.append(move)
+            line.push(move)
+            if line.is_game_over():
+                break
+            # The opponent's best defence, taken from the principal variation
+            reply = chess.Move.from_uci(pv[1]) if len(pv) > 1 else None
+            if reply is None or reply not in line.legal_moves:
+                break
+            solution.append(reply)
+            line.push(reply)
+        # A puzzle ends on the solver's move
+        if len(solution) % 2 == 0:
+            solution = solution[:-1]
+            if solution:
+                line.pop()
+        if not solution:
+            return None
+
+        if shallow_best is None:
+            shallow_best = self._shallow(start, ply, {})[1]
+        tags = themes(start, solution, line.is_checkmate())
+        return {
+            'id': puzzle_id(start.fen()),
+            'fen': start.fen(),
+            'last_move': last_move.uci(),
+            'moves': [move.uci() for move in solution],
+            'rating': rating(start, solution, tags, shallow_best),
+            'themes': tags,
+            'source': source,
+            'ply': ply
+        }
+
+
+class PuzzleStore:
+    """SQLite store of puzzles, indexed by theme and rating.
+
+    Also records how far each PGN source has been mined, so an interrupted
+    run can resume where it stopped.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS puzzles ("
+            "id TEXT PRIMARY KEY, fen TEXT NOT NULL, last_move TEXT, moves TEXT NOT NULL, "
+            "rating INTEGER NOT NULL, themes TEXT NOT NULL, source TEXT, ply INTEGER);"
+            "CREATE INDEX IF NOT EXISTS puzzles_rating ON puzzles (rating);"
+            # One row per (theme, puzzle): theme + rating queries are a single index range scan
+            "CREATE TABLE IF NOT EXISTS puzzle_themes ("
+            "theme TEXT NOT NULL, rating INTEGER NOT NULL, puzzle_id TEXT NOT NULL, "
+            "PRIMARY KEY (theme, rating, puzzle_id)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS progress ("
+            "source TEXT PRIMARY KEY, offset INTEGER NOT NULL, games INTEGER NOT NULL, "
+            "positions INTEGER NOT NULL, puzzles INTEGER NOT NULL);"
+        )
+
+    @classmethod
+    def from_env(cls):
+        path = os.getenv('PUZZLE_DB_PATH')
+        return cls(path) if path else None
+
+    def add(self, puzzles, source=None, offset=None, games=0, positions=0):
+        """Stores `puzzles` and, with `source`, advances its progress to byte
+        `offset`, both in one transaction. Returns the number of new puzzles."""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                added = 0
+                for puzzle in puzzles:
+                    cursor = self._db.execute(
+                        "INSERT OR IGNORE INTO puzzles (id, fen, last_move, moves, rating, themes, source, ply) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (puzzle['id'], puzzle['fen'], puzzle['last_move'], ' '.join(puzzle['moves']),
+                         puzzle['rating'], ' '.join(puzzle['themes']), puzzle['source'], puzzle['ply']))
+                    if cursor.rowcount:
+                        added += 1
+                        self._db.executemany(
+                            "INSERT OR IGNORE INTO puzzle_themes (theme, rating, puzzle_id) VALUES (?, ?, ?)",
+                            [(theme, puzzle['rating'], puzzle['id']) for theme in puzzle['themes']])
+                if source is not None:
+                    self._db.execute(
+                        "INSERT INTO progress (source, offset, games, positions, puzzles) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (source) DO UPDATE SET offset = excluded.offset, "
+                        "games = games + excluded.games, positions = positions + excluded.positions, "
+                        "puzzles = puzzles + excluded.puzzles",
+                        (source, offset, games, positions, added))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return added
+
+    def progress(self, source):
+        """{'offset', 'games', 'positions', 'puzzles'} mined so far from `source`, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT offset, games, positions, puzzles FROM progress WHERE source = ?", (source,)).fetchone()
+        return dict(zip(('offset', 'games', 'positions', 'puzzles'), row)) if row else None
+
+    def forget(self, source):
+        """Drops the recorded progress of `source` so it is mined from the start."""
+        with self._lock:
+            self._db.execute("DELETE FROM progress WHERE source = ?", (source,))
+
+    def get(self, puzzle_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, fen, last_move, moves, rating, themes, source, ply FROM puzzles WHERE id = ?",
+                (puzzle_id,)).fetchone()
+        return self._puzzle(row) if row else None
+
+    def query(self, theme=None, min_rating=None, max_rating=None, limit=10):
+        """Up to `limit` random puzzles with `theme` and a rating in range."""
+        low = MIN_RATING if min_rating is None else min_rating
+        high = MAX_RATING if max_rating is None else max_rating
+        columns = "p.id, p.fen, p.last_move, p.moves, p.rating, p.themes, p.source, p.ply"
+        if theme:
+            sql = (f"SELECT {columns} FROM puzzle_themes t JOIN puzzles p ON p.id = t.puzzle_id "
+                   "WHERE t.theme = ? AND t.rating BETWEEN ? AND ? ORDER BY RANDOM() LIMIT ?")
+            params = (theme, low, high, limit)
+        else:
+            sql = f"SELECT {columns} FROM puzzles p WHERE p.rating BETWEEN ? AND ? ORDER BY RANDOM() LIMIT ?"
+            params = (low, high, limit)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [self._puzzle(row) for row in rows]
+
+    def themes(self):
+        """Number of puzzles per theme."""
+        with self._lock:
+            rows = self._db.execute("SELECT theme, COUNT(*) FROM puzzle_themes GROUP BY theme").fetchall()
+        return dict(rows)
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM puzzles").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _puzzle(row):
+        id_, fen, last_move, moves, rating_, tags, source, ply = row
+        return {'id': id_, 'fen': fen, 'last_move': last_move, 'moves': moves.split(), 'rating': rating_,
+                'themes': tags.split(), 'source': source, 'ply': ply}
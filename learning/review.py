@@ -0,0 +1,161 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import chess
+import chess.pgn
+from learning.features import batch_pawn_features
+
+# Mate scores are folded into centipawns so losses can be compared
+MATE_SCORE = 10000
+
+# Centipawn loss thresholds, from the mover's point of view
+INACCURACY = 50
+MISTAKE = 100
+BLUNDER = 300
+
+
+def score_cp(evaluation):
+    """White-relative evaluation as a single centipawn number."""
+    if evaluation['type'] == 'mate':
+        value = evaluation['value']
+        return MATE_SCORE - abs(value) if value > 0 else -MATE_SCORE + abs(value)
+    return evaluation['value']
+
+
+def classify(cp_loss):
+    if cp_loss >= BLUNDER:
+        return 'blunder'
+    if cp_loss >= MISTAKE:
+        return 'mistake'
+    if cp_loss >= INACCURACY:
+        return 'inaccuracy'
+    return 'good'
+
+
+class GameReviewer:
+    """Reviews whole games by analysing every position on the engine pool.
+
+    The game's positions are split into contiguous chunks, one per worker,
+    so each engine searches consecutive plies and reuses its hash table from
+    one ply to the next. Positions already in the analysis cache (common
+    openings, for instance) cost nothing.
+    """
+
+    def __init__(self, engine_pool, max_workers=None, depth=None):
+        self.engine_pool = engine_pool
+        # Leave a worker free for interactive games
+        self.max_workers = max_workers or max(1, engine_pool.size - 1)
+        self.depth = depth
+
+    def review_pgn(self, pgn, on_move=None):
+        """Review the mainline of a PGN string.
+
+        Calls on_move(move_review, done, total) as soon as both positions
+        around a move have been analysed, in completion order. Returns the
+        per-move reviews in game order plus a per-side summary. Raises
+        ValueError if the PGN holds no game or no moves.
+        """
+        game = chess.pgn.read_game(io.StringIO(pgn))
+        if game is None:
+            raise ValueError("No game found in PGN")
+
+        board = game.board()
+        boards = [board.copy(stack=False)]
+        moves = []
+        for move in game.mainline_moves():
+            moves.append((move, board.san(move)))
+            board.push(move)
+            boards.append(board.copy(stack=False))
+        if not moves:
+            raise ValueError("No moves found in PGN")
+
+        evaluations = [None] * len(boards)
+        best_moves = [None] * len(boards)
+        reviews = [None] * len(moves)
+        lock = threading.Lock()
+        done = [0]
+
+        def move_ready(ply):
+            if 0 <= ply < len(moves) and reviews[ply] is None \
+                    and evaluations[ply] is not None and evaluations[ply + 1] is not None:
+                reviews[ply] = self._review_move(ply, boards[ply], moves[ply], evaluations, best_moves)
+                done[0] += 1
+                return reviews[ply]
+            return None
+
+        def analyse_chunk(indices):
+            with self.engine_pool.engine(role='analysis', batch=True) as chess_engine:
+                for index in indices:
+                    evaluation, best = self._evaluate(chess_engine, boards[index])
+                    with lock:
+                        evaluations[index] = evaluation
+                        best_moves[index] = best
+                        ready = [r for r in (move_ready(index - 1), move_ready(index)) if r is not None]
+                        progress = done[0]
+                    if on_move is not None:
+                        for review in ready:
+                            on_move(review, progress, len(moves))
+
+        workers = min(self.max_workers, len(boards))
+        chunk_size = -(-len(boards) // workers)
+        chunks = [range(start, min(start + chunk_size, len(boards))) for start in range(0, len(boards), chunk_size)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(analyse_chunk, chunk) for chunk in chunks]:
+                future.result()
+
+        # Material and pawn structure after every move, in one batched pass
+        features = batch_pawn_features(boards[1:])
+        for ply, review in enumerate(reviews):
+            review['features'] = {name: values[ply] for name, values in features.items()}
+
+        return {
+            'headers': dict(game.headers),
+            'moves': reviews,
+            'summary': self._summarize(reviews)
+        }
+
+    def _evaluate(self, chess_engine, board):
+        """White-relative centipawn score and best move (UCI) for one position."""
+        outcome = board.outcome()
+        if outcome is not None:
+            # Game over: score it directly instead of searching
+            if outcome.winner is None:
+                return 0, None
+            return (MATE_SCORE if outcome.winner == chess.WHITE else -MATE_SCORE), None
+        # The book scores every position 0, so losses are measured on engine scores only
+        analysis = chess_engine.analyze_position(board.fen(), num_moves=1, depth=self.depth, tables=False)
+        best = analysis['best_moves'][0]['Move'] if analysis['best_moves'] else None
+        return score_cp(analysis['evaluation']), best
+
+    def _review_move(self, ply, board, played, evaluations, best_moves):
+        move, san = played
+        sign = 1 if board.turn == chess.WHITE else -1
+        cp_loss = max(0, (evaluations[ply] - evaluations[ply + 1]) * sign)
+        best = best_moves[ply]
+        if best == move.uci():
+            cp_loss = 0
+        return {
+            'ply': ply + 1,
+            'move_number': board.fullmove_number,
+            'color': 'white' if board.turn == chess.WHITE else 'black',
+            'move': move.uci(),
+            'san': san,
+            'fen_before': board.fen(),
+            'evaluation': evaluations[ply + 1],
+            'best_move': best,
+            'best_move_san': board.san(chess.Move.from_uci(best)) if best else None,
+            'centipawn_loss': cp_loss,
+            'classification': 'best' if best == move.uci() else classify(cp_loss)
+        }
+
+    def _summarize(self, reviews):
+        summary = {}
+        for color in ('white', 'black'):
+            own = [r for r in reviews if r['color'] == color]
+            summary[color] = {
+                'average_centipawn_loss': round(sum(min(r['centipawn_loss'], 1000) for r in own) / len(own)) if own else 0,
+                'inaccuracies': sum(1 for r in own if r['classification'] == 'inaccuracy'),
+                'mistakes': sum(1 for r in own if r['classification'] == 'mistake'),
+                'blunders': sum(1 for r in own if r['classification'] == 'blunder')
+            }
+        return summary
@@ -1,12 +1,102 @@
 // Initialize chess board and game
 let board = null;
 let game = new Chess();
-let socket = io();
+// MessagePack when its decoder loaded, JSON otherwise; the server falls back to JSON if it lacks msgpack
+const wireEncoding = (typeof MessagePack !== 'undefined') ? 'msgpack' : 'json';
+let socket = io({ auth: { encoding: wireEncoding, deltas: true } });
 let latestAnalysisData = null; // Store latest analysis data for toggles (Re-added)
 let fenHistory = [game.fen()]; // Initialize with the actual starting FEN from the new game object
 let checkSquare = null; // Track the square with the king in check
 let currentViewIndex = 0; // Current position being viewed in the FEN history
 let isViewingHistory = false; // Flag to indicate if we're in history browsing mode
+let gameId = null; // Server-side session for this game (set from the first move response)
+let watchId = null; // Read-only ID others can follow this game with (?watch=<watch_id>)
+let gameState = null; // Last full move/undo response state and its seq, for delta responses
+let wireStates = {}; // Per socket event: last full state and its seq, for delta updates
+const watchGameId = new URLSearchParams(window.location.search).get('watch'); // Spectator mode: a watch ID
+
+// --- Wire format: optional MessagePack, and deltas against the last state ---
+function decodeWire(data) {
+    if (data instanceof ArrayBuffer) {
+        return MessagePack.decode(new Uint8Array(data));
+    }
+    return data;
+}
+
+// Apply a delta: changed keys, nested objects patched key by key, removed keys under '$unset'
+function applyPatch(state, delta) {
+    const result = Object.assign({}, state);
+    (delta['$unset'] || []).forEach(key => delete result[key]);
+    Object.keys(delta).forEach(key => {
+        if (key === '$unset') return;
+        const value = delta[key];
+        const current = result[key];
+        const isObject = v => v !== null && typeof v === 'object' && !Array.isArray(v);
+        result[key] = (isObject(value) && isObject(current)) ? applyPatch(current, value) : value;
+    });
+    return result;
+}
+
+// Full state for a {seq, full} or {seq, base, delta} socket message, or null if
+// a delta does not apply to what we hold (the server then resends in full)
+function receiveWire(event, data) {
+    const message = decodeWire(data);
+    if (!message) return null;
+    if (message.full === undefined && message.delta === undefined) return message; // Plain update
+    const held = wireStates[event];
+    let state;
+    if (message.full !== undefined) {
+        state = message.full;
+    } else if (held && held.seq === message.base) {
+        state = applyPatch(held.state, message.delta);
+    } else {
+        socket.emit('wire_resync', event);
+        return null;
+    }
+    wireStates[event] = { seq: message.seq, state: state };
+    return Object.assign({ watch_id: message.watch_id }, state);
+}
+
+// Fetch with JSON or MessagePack, whichever the server answers with
+async function fetchWire(url, options) {
+    const accept = wireEncoding === 'msgpack' ? 'application/msgpack, application/json;q=0.9' : 'application/json';
+    options = Object.assign({}, options, { headers: Object.assign({ 'Accept': accept }, options && options.headers) });
+    const res = await fetch(url, options);
+    const type = res.headers.get('Content-Type') || '';
+    return type.startsWith('application/msgpack')
+        ? decodeWire(await res.arrayBuffer())
+        : await res.json();
+}
+
+// POST to /api/move or /api/undo. Sends the seq we hold so the server can answer
+// with only the changes, and accepts MessagePack. Resolves to the full response.
+async function postWire(url, data) {
+    const held = gameState && data.game_id && gameState.gameId === data.game_id ? gameState : null;
+    const body = held ? Object.assign({ since: held.seq }, data) : data;
+    let response = await fetchWire(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    });
+    if (!response.success) return response;
+
+    let state;
+    if (response.delta !== undefined && (!held || held.seq !== response.base)) {
+        // Out of step. The server has already applied this request, so never
+        // send it again: fetch the game's whole current state instead
+        gameState = null;
+        response = await fetchWire(`/api/game/${encodeURIComponent(response.game_id)}`);
+        if (!response.success) return response;
+    }
+    if (response.delta !== undefined) {
+        state = applyPatch(held.state, response.delta);
+    } else {
+        state = Object.assign({}, response);
+        ['success', 'game_id', 'watch_id', 'seq'].forEach(key => delete state[key]);
+    }
+    gameState = { gameId: response.game_id, seq: response.seq, state: state };
+    return Object.assign({ success: true, game_id: response.game_id, watch_id: response.watch_id }, state);
+}
 
 // Configuration for chessboard.js
 const boardConfig = {
@@ -237,7 +327,17 @@ $(document).ready(function() {
     $('#moveForward').on('click', viewNextPosition);
     
     // Set up socket.io event listeners
-    socket.on('analysis_update', updateAnalysis);
+    socket.on('analysis_update', data => {
+        const update = receiveWire('analysis_update', data);
+        if (update) handleAnalysisUpdate(update);
+    });
+    socket.on('connect', () => {
+        wireStates = {}; // A new connection starts every delta stream afresh
+        if (watchGameId) socket.emit('watch_game', { watch_id: watchGameId });
+    });
+    socket.on('game_update', handleGameUpdate);
+    if (watchGameId && socket.connected) socket.emit('watch_game', { watch_id: watchGameId });
+    socket.on('watch_error', data => console.error("Cannot watch game:", data.error));
     
     // Initialize settings & panels
     initializeEngineSettings();
@@ -288,6 +388,8 @@ $(document).ready(function() {
 
 // Chess board event handlers
 function onDragStart(source, piece, position, orientation) {
+    // Spectators only watch
+    if (watchGameId) return false;
     // Prevent moving pieces if it's not the player's turn
     if (game.game_over()) return false;
     if ((game.turn() === 'w' && piece.search(/^b/) !== -1) ||
@@ -370,24 +472,26 @@ function clearCheckIndicator() {
 async function sendMoveToServer(fen_before_move, move_uci) {
     console.log(`Sending move to server: Move=${move_uci}, FEN Before=${fen_before_move}`); // Debug log
     
-    const data = {
-        fen: fen_before_move, 
-        move: move_uci        
+    // With a session the server already knows the position, so only the move is sent.
+    // The FEN is sent to start a session (or a new one if the server forgot ours).
+    const postMove = (data) => {
+        console.log("Sending data to server:", data);
+        return postWire('/api/move', data);
     };
     
-    console.log("Sending data to server:", data);
-    
     try {
-        const response = await $.ajax({
-            url: '/api/move',
-            type: 'POST',
-            contentType: 'application/json',
-            data: JSON.stringify(data)
-        });
+        let response = gameId
+            ? await postMove({ game_id: gameId, move: move_uci })
+            : await postMove({ fen: fen_before_move, move: move_uci });
+        if (response.unknown_game) {
+            response = await postMove({ fen: fen_before_move, move: move_uci });
+        }
         
         console.log("Server response:", response);
         
         if (response.success) {
+            gameId = response.game_id;
+            watchId = response.watch_id;
             latestAnalysisData = response; 
 
             if (response.fen && response.fen !== game.fen()) {
@@ -574,6 +678,8 @@ async function newGame() {
     game = new Chess();
     board.position('start'); 
     latestAnalysisData = null; 
+    gameId = null; // The first move starts a new server-side session
+    watchId = null;
     fenHistory = [game.fen()]; // Reset history with starting FEN
     currentViewIndex = 0; // Reset view index
     isViewingHistory = false; // Exit history viewing mode
@@ -643,15 +749,12 @@ async function undoMove() {
     // 5. Send reverted FEN to backend to sync engine and get new analysis
     console.log("Sending undo request to server...");
     try {
-        const response = await $.ajax({
-            url: '/api/undo', 
-            type: 'POST',
-            contentType: 'application/json',
-            data: JSON.stringify({ fen: revertedFen })
-        });
+        const response = await postWire('/api/undo', { game_id: gameId, fen: revertedFen });
 
         console.log("Undo server response:", response);
         if (response.success) {
+            gameId = response.game_id;
+            watchId = response.watch_id;
             // Update analysis display with data for the reverted position
             updateAnalysis(response); 
         } else {
@@ -675,14 +778,47 @@ function flipBoard() {
     board.flip();
 }
 
+// Spectator mode (?watch=<watch_id>): follow another player's game
+function handleGameUpdate(data) {
+    const update = receiveWire('game_update', data);
+    if (!update || update.watch_id !== watchGameId) return;
+    game.load(update.fen);
+    board.position(update.fen);
+    if (fenHistory[fenHistory.length - 1] !== update.fen) {
+        fenHistory.push(update.fen);
+    }
+    currentViewIndex = fenHistory.length - 1;
+    isViewingHistory = false;
+    updateMoveNavigationButtons();
+    updateCheckStatus();
+    updateAnalysis(update);
+}
+
 // Analysis update functions
+function handleAnalysisUpdate(data) {
+    // Streamed updates arrive per completed depth; drop any for a position
+    // that is no longer on the board
+    const shownFen = isViewingHistory ? fenHistory[currentViewIndex] : game.fen();
+    if (!data || data.fen !== shownFen) return;
+
+    if (isViewingHistory) {
+        // Keep latestAnalysisData for the current position; no arrows in history mode
+        updateEvaluationBar(data.analysis?.evaluation, data.analysis?.source);
+        updateBestMoves(data.analysis?.best_moves || [], data.analysis?.source);
+        updateLearningInsights(data.insights || {});
+        updatePositionalFeatures(data.insights?.positional_features || {});
+    } else {
+        updateAnalysis(data);
+    }
+}
+
 function updateAnalysis(data) {
     if (!data) return; 
     latestAnalysisData = data; // Update stored data (Re-added)
 
     // Update all components - visibility handled by collapse/CSS
-    updateEvaluationBar(data.analysis?.evaluation);
-    updateBestMoves(data.analysis?.best_moves || []); 
+    updateEvaluationBar(data.analysis?.evaluation, data.analysis?.source);
+    updateBestMoves(data.analysis?.best_moves || [], data.analysis?.source); 
     updateLearningInsights(data.insights || {}); 
     updatePositionalFeatures(data.insights?.positional_features || {}); 
     
@@ -690,7 +826,7 @@ function updateAnalysis(data) {
     updateMoveArrows(data.analysis?.best_moves || []); 
 }
 
-function updateEvaluationBar(evaluation) {
+function updateEvaluationBar(evaluation, source) {
     const bar = $('.evaluation-fill');
     const label = $('.evaluation-label');
     let value = 0;
@@ -721,6 +857,14 @@ function updateEvaluationBar(evaluation) {
         const side = evaluation.value > 0 ? 'White' : 'Black';
         labelText = `${side} M${movesToMate}`;
     }
+
+    // Book and tablebase results come from lookups, not a search
+    if (source === 'tablebase') {
+        labelText = value > 0 ? 'White wins' : value < 0 ? 'Black wins' : 'Draw';
+        labelText += ' (tablebase)';
+    } else if (source === 'book') {
+        labelText = 'Book';
+    }
     
     // Normalize value to percentage (-10 to 10 becomes 0 to 100)
     const percentage = Math.min(Math.max((value + 10) * 5, 0), 100);
@@ -732,15 +876,25 @@ function updateEvaluationBar(evaluation) {
     label.text(labelText);
 }
 
-function updateBestMoves(bestMoves) {
+function updateBestMoves(bestMoves, source) {
     const container = $('#bestMoves');
     container.empty();
     if (!bestMoves) return; 
     bestMoves.forEach((move, index) => {
         const moveElement = $('<div>').addClass('move-item');
+        let evaluation;
+        if (source === 'book') {
+            evaluation = 'book';
+        } else if (source === 'tablebase') {
+            evaluation = move.Centipawn > 0 ? '1-0' : move.Centipawn < 0 ? '0-1' : '½-½';
+        } else if (move.Mate !== null && move.Mate !== undefined) {
+            evaluation = `M${move.Mate}`;
+        } else {
+            evaluation = move.Centipawn / 100;
+        }
         moveElement.html(`
             <strong>${index + 1}.</strong> ${move.Move}
-            <span class="evaluation">${move.Centipawn / 100}</span>
+            <span class="evaluation">${evaluation}</span>
         `);
         container.append(moveElement);
     });
@@ -784,6 +938,26 @@ function updatePositionalFeatures(features) {
         `Developed Pieces - White: ${activity.white_developed}, Black: ${activity.black_developed}`
     ));
     
+    // Mobility
+    const mobility = features.mobility;
+    if (mobility) {
+        container.append($('<div>').text(
+            `Mobility - White: ${mobility.white}, Black: ${mobility.black}`
+        ));
+    }
+    
+    // Pawn structure
+    const pawns = features.pawn_structure;
+    if (pawns && pawns.passed_pawns) {
+        container.append($('<div>').text(
+            `Passed Pawns - White: ${pawns.passed_pawns.white}, Black: ${pawns.passed_pawns.black}`
+        ));
+        container.append($('<div>').text(
+            `Doubled Pawns - White: ${pawns.doubled_pawns.white}, Black: ${pawns.doubled_pawns.black}` +
+            ` | Isolated: ${pawns.isolated_pawns} | Open Files: ${pawns.open_files}`
+        ));
+    }
+    
     // King safety
     const kingSafety = features.king_safety;
     container.append($('<div>').text(
@@ -910,10 +1084,11 @@ function viewNextPosition() {
         // If we've returned to the current position, exit history viewing mode
         if (currentViewIndex === fenHistory.length - 1) {
             isViewingHistory = false;
+            socket.emit('stop_analysis'); // No need to keep analysing the old position
             
-            // Restore move arrows for current position if we have analysis data
-            if (latestAnalysisData && latestAnalysisData.analysis && latestAnalysisData.analysis.best_moves) {
-                updateMoveArrows(latestAnalysisData.analysis.best_moves);
+            // Restore the analysis (and move arrows) for the current position
+            if (latestAnalysisData) {
+                updateAnalysis(latestAnalysisData);
             }
         }
     }
@@ -929,6 +1104,12 @@ function updateBoardToHistoryPosition() {
     // Use a temporary game object to get position data without affecting the main game
     const tempGame = new Chess(historicalFen);
     board.position(tempGame.fen());
+
+    // Stream analysis for the position being viewed; the server stops the
+    // previous search for this client when a new FEN arrives
+    if (isViewingHistory) {
+        socket.emit('analyze_position', { fen: historicalFen, stream: true });
+    }
     
     // Check if we need to update check indicator
     if (tempGame.in_check()) {
@@ -0,0 +1,13 @@
+from benchmark import run_concurrent
+
+
+def test_failed_items_are_counted_not_timed():
+    def operation(item):
+        if item % 3 == 0:
+            raise RuntimeError("engine crashed")
+        return item / 1000
+
+    latencies, elapsed, errors = run_concurrent(range(300), 8, operation)
+    assert errors == 100
+    assert sorted(latencies) == [item / 1000 for item in range(300) if item % 3]
+    assert elapsed > 0
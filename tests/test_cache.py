@@ -0,0 +1,45 @@
+from chess_engine.cache import AnalysisCache, position_key
+
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+AFTER_E4 = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1'
+RESULT = {'evaluation': {'type': 'cp', 'value': 30}, 'best_moves': [], 'depth': 15, 'source': 'engine'}
+
+
+def test_position_key_drops_clocks_and_illegal_en_passant():
+    assert position_key(START) == position_key(START.replace('0 1', '12 40'))
+    assert position_key(AFTER_E4) == position_key(AFTER_E4.replace(' - ', ' e3 '))
+
+
+def test_position_key_keeps_a_legal_en_passant_square():
+    fen = 'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3'
+    assert position_key(fen) == 'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6'
+
+
+def test_entries_are_keyed_on_position_depth_and_multipv():
+    cache = AnalysisCache()
+    cache.put(AFTER_E4, 15, 3, RESULT)
+    assert cache.get(AFTER_E4.replace(' - 0 1', ' e3 0 1'), 15, 3) is RESULT
+    assert cache.get(AFTER_E4, 16, 3) is None
+    assert cache.get(AFTER_E4, 15, 1) is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnalysisCache(max_entries=2)
+    cache.put(START, 1, 1, {'n': 1})
+    cache.put(START, 2, 1, {'n': 2})
+    cache.get(START, 1, 1) # Depth 2 is now the oldest
+    cache.put(START, 3, 1, {'n': 3})
+    assert cache.get(START, 2, 1) is None
+    assert cache.get(START, 1, 1) == {'n': 1}
+    assert cache.stats()['entries'] == 2
+
+
+def test_entries_survive_a_restart_on_disk(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    AnalysisCache(path=path).put(START, 15, 3, RESULT)
+    cache = AnalysisCache(path=path)
+    assert cache.get(START, 15, 3) == RESULT
+    assert cache.stats()['disk_hits'] == 1
+    cache.clear()
+    assert AnalysisCache(path=path).get(START, 15, 3) is None
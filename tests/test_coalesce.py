@@ -0,0 +1,84 @@
+import threading
+import time
+import pytest
+from chess_engine.coalesce import Coalescer, analysis_key
+
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def wait_for_waiters(coalescer, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while coalescer.stats()['coalesced'] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def run_concurrently(coalescer, key, call, callers):
+    results = [None] * callers
+    errors = [None] * callers
+
+    def caller(i):
+        try:
+            results[i] = coalescer.run(key, call)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_callers_share_one_run():
+    coalescer = Coalescer()
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return {'depth': 15}
+
+    threads, results, errors = run_concurrently(coalescer, 'key', call, 5)
+    wait_for_waiters(coalescer, 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert errors == [None] * 5
+    assert all(result is results[0] for result in results)
+    assert coalescer.stats() == {'in_flight': 0, 'runs': 1, 'coalesced': 4}
+
+
+def test_waiters_get_the_leaders_exception():
+    coalescer = Coalescer()
+    release = threading.Event()
+
+    def call():
+        release.wait(5)
+        raise RuntimeError("engine crashed")
+
+    threads, _, errors = run_concurrently(coalescer, 'key', call, 3)
+    wait_for_waiters(coalescer, 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert all(isinstance(e, RuntimeError) for e in errors)
+
+
+def test_finished_keys_run_again():
+    coalescer = Coalescer()
+    assert coalescer.run('key', lambda: 1) == 1
+    assert coalescer.run('key', lambda: 2) == 2
+    assert coalescer.stats()['runs'] == 2
+    with pytest.raises(ValueError):
+        coalescer.run('key', lambda: int('x'))
+    assert coalescer.stats()['in_flight'] == 0
+
+
+def test_analysis_key_ignores_clocks_and_dialect():
+    after_e4 = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1'
+    chess_js = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 7'
+    assert analysis_key(after_e4, 15, 3) == analysis_key(chess_js, 15, 3)
+    assert analysis_key(START, 15, 3) != analysis_key(START, 15, 2)
+    assert analysis_key(START, 15, 3) != analysis_key(START, 15, 3, movetime=500)
@@ -0,0 +1,114 @@
+import time
+import pytest
+from chess_engine import engine as engine_module
+from chess_engine.engine import MIN_MOVETIME, ChessEngine
+
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+BOOK_RESULT = {'evaluation': {'type': 'cp', 'value': 0}, 'best_moves': [], 'depth': 0, 'source': 'book'}
+
+
+class FakeProcess:
+    pid = 1234
+
+    def poll(self):
+        return None
+
+
+class FakeStockfish:
+    """Stands in for the stockfish wrapper: every search reports cp 42 and bestmove e2e4."""
+
+    def __init__(self, path=None, **kwargs):
+        self.sent = []
+        self.on_read = None # Called on every read, while the engine waits for output
+        self._output = []
+        self._parameters = {}
+        self._stockfish = FakeProcess()
+
+    def set_depth(self, depth):
+        pass
+
+    def get_parameters(self):
+        return self._parameters
+
+    def _put(self, command):
+        self.sent.append(command)
+        if command.startswith('go'):
+            self._output += ['info depth 15 seldepth 20 multipv 1 score cp 42 nodes 1000 nps 100000 time 10 pv e2e4 e7e5',
+                             'bestmove e2e4 ponder e7e5']
+
+    def _read_line(self):
+        if self.on_read is not None:
+            self.on_read()
+        return self._output.pop(0)
+
+    def _is_ready(self):
+        pass
+
+    def _prepare_for_new_position(self, send_ucinewgame_token=True):
+        pass
+
+
+class FakeBook:
+    def analyze(self, board, num_moves=3):
+        return BOOK_RESULT
+
+
+@pytest.fixture
+def make_engine(monkeypatch):
+    monkeypatch.setattr(engine_module, 'Stockfish', FakeStockfish)
+    monkeypatch.setenv('STOCKFISH_PATH', 'stockfish')
+    for name in ('ENGINE_BROKER', 'ANALYSIS_MOVETIME_MS', 'ANALYSIS_NODES', 'SYZYGY_PATH'):
+        monkeypatch.delenv(name, raising=False)
+    return ChessEngine
+
+
+def test_analysis_is_served_from_the_book(make_engine):
+    chess_engine = make_engine(book=FakeBook())
+    assert chess_engine.analyze_position(START) is BOOK_RESULT
+    assert not any(c.startswith('go') for c in chess_engine._engine.sent)
+
+
+def test_tables_can_be_skipped_for_a_real_score(make_engine):
+    chess_engine = make_engine(book=FakeBook())
+    result = chess_engine.analyze_position(START, num_moves=1, tables=False)
+    assert result['source'] == 'engine'
+    assert result['evaluation'] == {'type': 'cp', 'value': 42}
+    assert result['best_moves'][0]['Move'] == 'e2e4'
+
+
+def movetime(command):
+    tokens = command.split()
+    return int(tokens[tokens.index('movetime') + 1]) if 'movetime' in tokens else None
+
+
+def test_go_command_without_a_deadline(make_engine):
+    chess_engine = make_engine()
+    assert chess_engine._go_command(12) == 'go depth 12'
+    assert chess_engine._go_command(12, 300, 5000, share=0.5) == 'go depth 12 movetime 300 nodes 5000'
+
+
+def test_deadline_share_caps_the_movetime(make_engine):
+    chess_engine = make_engine()
+    chess_engine.set_deadline(time.monotonic() + 1)
+    assert 450 <= movetime(chess_engine._go_command(12, share=0.5)) <= 500
+    assert 900 <= movetime(chess_engine._go_command(12, share=1.0)) <= 1000
+    assert movetime(chess_engine._go_command(12, 100, share=0.5)) == 100 # A shorter own limit is kept
+    assert chess_engine._go_command(12) == 'go depth 12' # No share: the deadline does not apply
+
+
+def test_movetime_never_drops_below_the_floor(make_engine):
+    chess_engine = make_engine()
+    chess_engine.set_deadline(time.monotonic() - 5) # Already late
+    assert movetime(chess_engine._go_command(12, share=0.5)) == MIN_MOVETIME
+    chess_engine.set_deadline(None)
+    assert movetime(chess_engine._go_command(12)) is None
+
+
+def test_waits_on_a_search_carry_its_movetime(make_engine):
+    chess_engine = make_engine()
+    limits = []
+    chess_engine._engine.on_read = lambda: limits.append(chess_engine.busy_limit())
+    chess_engine.analyze_position(START, depth=30, movetime=2500)
+    chess_engine.analyze_position(START, depth=31)
+    assert limits == [2.5, 2.5, None, None]
+    assert chess_engine.busy_limit() is None # Not waiting
@@ -0,0 +1,183 @@
+import queue
+import threading
+import time
+import pytest
+from chess_engine.farm import PRIORITIES, Broker, Connection, check_job
+
+JOB = {'position': 'position startpos', 'options': {'MultiPV': 1}, 'go': 'go depth 5', 'new_game': False}
+
+
+class Peer:
+    """A raw broker connection standing in for an engine or a worker."""
+
+    def __init__(self, address, token=None):
+        self.conn = Connection.connect(address, token)
+        self.inbox = queue.Queue()
+        self.closed = threading.Event() # Set once the broker hangs up
+        threading.Thread(target=self._receive, daemon=True).start()
+
+    def _receive(self):
+        for message in self.conn.messages():
+            self.inbox.put(message)
+        self.closed.set()
+
+    def send(self, **message):
+        self.conn.send(message)
+
+    def receive(self, timeout=5):
+        return self.inbox.get(timeout=timeout)
+
+    def nothing_received(self, wait=0.2):
+        try:
+            self.inbox.get(timeout=wait)
+        except queue.Empty:
+            return True
+        return False
+
+    def close(self):
+        self.conn.close()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def broker():
+    broker = Broker()
+    host, port = broker.serve('127.0.0.1', 0)
+    broker.address = f'{host}:{port}'
+    yield broker
+    broker.close()
+
+
+def submit(engine, job_id, priority):
+    engine.send(op='go', id=job_id, priority=priority, job=JOB)
+
+
+def test_jobs_run_most_urgent_first(broker):
+    engine = Peer(broker.address)
+    submit(engine, 'batch', PRIORITIES['batch'])
+    submit(engine, 'analysis', PRIORITIES['analysis'])
+    submit(engine, 'ai', PRIORITIES['ai'])
+    wait_for(lambda: sum(broker.stats()['queued'].values()) == 3)
+
+    worker = Peer(broker.address)
+    worker.send(op='ready')
+    order = []
+    for _ in range(3):
+        message = worker.receive()
+        assert message['op'] == 'job' and message['job'] == JOB
+        order.append(message['id'])
+        worker.send(op='line', id=message['id'], line='bestmove e2e4')
+        worker.send(op='done', id=message['id'])
+        assert engine.receive() == {'op': 'line', 'id': message['id'], 'line': 'bestmove e2e4'}
+    assert order == ['ai', 'analysis', 'batch']
+    wait_for(lambda: broker.stats()['completed'] == 3)
+
+
+def test_equal_priorities_run_in_arrival_order(broker):
+    engine = Peer(broker.address)
+    for job_id in ('first', 'second'):
+        submit(engine, job_id, PRIORITIES['analysis'])
+    wait_for(lambda: sum(broker.stats()['queued'].values()) == 2)
+    worker = Peer(broker.address)
+    worker.send(op='ready')
+    assert worker.receive()['id'] == 'first'
+    worker.send(op='done', id='first')
+    assert worker.receive()['id'] == 'second'
+
+
+def test_stopping_a_queued_job_answers_for_it(broker):
+    engine = Peer(broker.address)
+    submit(engine, 'queued', PRIORITIES['analysis'])
+    engine.send(op='stop', id='queued')
+    assert engine.receive() == {'op': 'line', 'id': 'queued', 'line': 'bestmove (none)'}
+    wait_for(lambda: broker.stats()['queued'] == {})
+
+    worker = Peer(broker.address)
+    worker.send(op='ready')
+    assert worker.nothing_received() # The stopped job never runs
+
+
+def test_stopping_a_running_job_reaches_its_worker(broker):
+    worker = Peer(broker.address)
+    worker.send(op='ready')
+    engine = Peer(broker.address)
+    submit(engine, 'running', PRIORITIES['ai'])
+    assert worker.receive()['id'] == 'running'
+    engine.send(op='stop', id='running')
+    assert worker.receive() == {'op': 'stop', 'id': 'running'}
+
+
+def test_job_of_a_lost_worker_is_requeued(broker):
+    engine = Peer(broker.address)
+    first = Peer(broker.address)
+    first.send(op='ready')
+    submit(engine, 'job', PRIORITIES['analysis'])
+    assert first.receive()['id'] == 'job'
+    first.close()
+    wait_for(lambda: broker.stats()['queued'] == {PRIORITIES['analysis']: 1})
+
+    second = Peer(broker.address)
+    second.send(op='ready')
+    message = second.receive()
+    assert message['id'] == 'job' and message['job'] == JOB
+    second.send(op='line', id='job', line='bestmove d2d4')
+    assert engine.receive()['line'] == 'bestmove d2d4'
+
+
+def test_jobs_of_a_lost_engine_are_dropped(broker):
+    worker = Peer(broker.address)
+    worker.send(op='ready')
+    engine = Peer(broker.address)
+    submit(engine, 'running', PRIORITIES['analysis'])
+    assert worker.receive()['id'] == 'running'
+    submit(engine, 'queued', PRIORITIES['analysis'])
+    wait_for(lambda: sum(broker.stats()['queued'].values()) == 1)
+
+    engine.close()
+    assert worker.receive() == {'op': 'stop', 'id': 'running'}
+    wait_for(lambda: broker.stats()['queued'] == {})
+    worker.send(op='done', id='running')
+    assert worker.nothing_received() # Free again, and the queued job is gone
+    assert broker.stats()['completed'] == 0
+
+
+def test_connections_without_the_token_are_refused():
+    broker = Broker(token='secret')
+    host, port = broker.serve('127.0.0.1', 0)
+    try:
+        intruder = Peer(f'{host}:{port}', token='wrong')
+        submit(intruder, 'job', PRIORITIES['ai'])
+        intruder.closed.wait(5)
+        assert intruder.closed.is_set()
+        assert broker.stats()['queued'] == {}
+
+        engine = Peer(f'{host}:{port}', token='secret')
+        submit(engine, 'job', PRIORITIES['ai'])
+        wait_for(lambda: broker.stats()['queued'] == {PRIORITIES['ai']: 1})
+    finally:
+        broker.close()
+
+
+@pytest.mark.parametrize('job', [
+    dict(JOB, position='position startpos\nquit'),
+    dict(JOB, go='go depth 5\nsetoption name Debug Log File value /tmp/x'),
+    dict(JOB, position='setoption name EvalFile value /tmp/x'),
+    dict(JOB, go='quit'),
+    dict(JOB, options={'MultiPV': '1\nquit'}),
+])
+def test_unsafe_jobs_are_rejected(job):
+    with pytest.raises(ValueError):
+        check_job(job)
+
+
+def test_safe_jobs_pass():
+    check_job(JOB)
+    check_job(dict(JOB, options={'MultiPV': 3, 'Skill Level': 20, 'UCI_LimitStrength': 'false',
+                                 'Debug Log File': '/ignored'}))
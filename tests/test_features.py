@@ -0,0 +1,101 @@
+import chess
+import pytest
+from learning import features
+from learning.analyzer import PositionAnalyzer
+
+FENS = [
+    chess.STARTING_FEN,
+    'r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4',
+    'r2q1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/P4PPP/R1BQKB1R w KQ - 0 9',
+    '4k3/p1p4p/8/8/8/1P6/1P2P2P/4K3 w - - 0 1',
+    '8/5P2/8/3k4/8/8/1p6/4K3 b - - 0 1',
+    '4k3/8/8/8/8/8/8/4K3 w - - 0 1',
+]
+
+# Hand-counted: doubled b-pawns, everything isolated, e2 passed, d/f/g files open
+PAWNS = '4k3/p1p4p/8/8/8/1P6/1P2P2P/4K3 w - - 0 1'
+
+
+def reference_pawn_features(board):
+    """Square-by-square counts, as the analyzer computed them before the bitboard rewrite."""
+    row = {'material_balance': 0}
+    values = {'p': 1, 'n': 3, 'b': 3, 'r': 5, 'q': 9, 'k': 0}
+    for piece in board.piece_map().values():
+        value = values[piece.symbol().lower()]
+        row['material_balance'] += value if piece.color == chess.WHITE else -value
+    files = {color: [chess.square_file(s) for s in board.pieces(chess.PAWN, color)] for color in chess.COLORS}
+    for color, name in ((chess.WHITE, 'white'), (chess.BLACK, 'black')):
+        own, enemy = board.pieces(chess.PAWN, color), board.pieces(chess.PAWN, not color)
+        row[f'isolated_{name}'] = sum(1 for f in files[color] if f - 1 not in files[color] and f + 1 not in files[color])
+        row[f'doubled_{name}'] = len(files[color]) - len(set(files[color]))
+        ahead = (lambda a, b: a > b) if color == chess.WHITE else (lambda a, b: a < b)
+        row[f'passed_{name}'] = sum(
+            1 for s in own
+            if not any(abs(chess.square_file(e) - chess.square_file(s)) <= 1
+                       and ahead(chess.square_rank(e), chess.square_rank(s)) for e in enemy))
+    row['open_files'] = 8 - len(set(files[chess.WHITE]) | set(files[chess.BLACK]))
+    return row
+
+
+def scalar_pawn_features(board):
+    structure = features.pawn_structure(board.pieces_mask(chess.PAWN, chess.WHITE),
+                                        board.pieces_mask(chess.PAWN, chess.BLACK))
+    row = {'material_balance': features.material_balance(board), 'open_files': structure['open_files']}
+    for kind in ('isolated', 'doubled', 'passed'):
+        for name in ('white', 'black'):
+            row[f'{kind}_{name}'] = structure[kind][name]
+    return row
+
+
+def columns(rows):
+    return {key: [row[key] for row in rows] for key in rows[0]}
+
+
+def test_known_pawn_structure():
+    assert scalar_pawn_features(chess.Board(PAWNS)) == {
+        'material_balance': 1, 'isolated_white': 4, 'isolated_black': 3, 'doubled_white': 1,
+        'doubled_black': 0, 'passed_white': 1, 'passed_black': 0, 'open_files': 3
+    }
+    assert scalar_pawn_features(chess.Board()) == {
+        'material_balance': 0, 'isolated_white': 0, 'isolated_black': 0, 'doubled_white': 0,
+        'doubled_black': 0, 'passed_white': 0, 'passed_black': 0, 'open_files': 0
+    }
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_bitboards_match_the_square_loops(fen):
+    board = chess.Board(fen)
+    assert scalar_pawn_features(board) == reference_pawn_features(board)
+    for color in chess.COLORS:
+        expected = 0
+        for square in chess.SquareSet(board.occupied_co[color]):
+            expected |= int(board.attacks(square))
+        assert features.attack_mask(board, color) == expected
+
+
+@pytest.mark.skipif(features.np is None, reason="NumPy not installed")
+def test_batch_path_matches_the_scalar_path(monkeypatch):
+    boards = [chess.Board(fen) for fen in FENS]
+    expected = columns([scalar_pawn_features(board) for board in boards])
+    assert features.batch_pawn_features(boards) == expected
+    monkeypatch.setattr(features, 'np', None)
+    assert features.batch_pawn_features(boards) == expected
+
+
+def test_analyzer_features_match_the_square_loops():
+    for fen in FENS:
+        board = chess.Board(fen)
+        positional = PositionAnalyzer()._analyze_positional_features(board)
+        center = [chess.E4, chess.D4, chess.E5, chess.D5]
+        assert positional['center_control'] == {
+            'white': sum(board.is_attacked_by(chess.WHITE, s) for s in center),
+            'black': sum(board.is_attacked_by(chess.BLACK, s) for s in center)
+        }
+        assert positional['piece_activity'] == {
+            'white_developed': len([s for s in board.pieces(chess.KNIGHT, chess.WHITE) if s > chess.H2]),
+            'black_developed': len([s for s in board.pieces(chess.KNIGHT, chess.BLACK) if s < chess.H7])
+        }
+        reference = reference_pawn_features(board)
+        assert positional['pawn_structure']['isolated_pawns'] == reference['isolated_white'] + reference['isolated_black']
+        assert positional['king_safety']['white_king_safety'] == len(board.attackers(chess.BLACK, board.king(chess.WHITE)))
+        assert positional['king_safety']['black_king_safety'] == len(board.attackers(chess.WHITE, board.king(chess.BLACK)))
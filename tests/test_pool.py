@@ -0,0 +1,45 @@
+from chess_engine.pool import EnginePool
+
+
+class Worker:
+    def __init__(self, role='play', mode='play', pondering=False):
+        self.role = role
+        self.mode = mode
+        self.pondering = pondering
+
+    def is_pondering(self):
+        return self.pondering
+
+
+def pool_with(*workers):
+    pool = EnginePool.__new__(EnginePool) # No Stockfish processes: only the picking logic
+    pool._idle = list(workers)
+    return pool
+
+
+def test_workers_of_the_role_come_first():
+    play, analysis = Worker(), Worker(role='analysis', mode='analysis')
+    pool = pool_with(analysis, play)
+    assert pool._pick(None, 'analysis') is analysis
+    assert pool._pick(None, 'play') is play
+
+
+def test_without_the_role_a_worker_already_in_its_mode_is_taken():
+    playing, analysing = Worker(), Worker(mode='analysis')
+    pool = pool_with(analysing, playing)
+    assert pool._pick(None, 'analysis') is analysing
+    assert pool._pick(None, 'play') is playing
+
+
+def test_preferred_worker_is_kept_only_in_the_right_mode():
+    playing, analysing = Worker(), Worker(mode='analysis')
+    pool = pool_with(playing, analysing)
+    assert pool._pick(playing, 'play') is playing
+    assert pool._pick(analysing, 'play') is playing
+    assert pool._pick(analysing, 'analysis') is analysing
+
+
+def test_pondering_workers_are_passed_over_when_possible():
+    pondering, free = Worker(pondering=True), Worker()
+    assert pool_with(free, pondering)._pick(None, 'play') is free
+    assert pool_with(pondering)._pick(None, 'analysis') is pondering
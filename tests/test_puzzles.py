@@ -0,0 +1,108 @@
+import chess
+import pytest
+from learning.puzzles import PuzzleStore, is_tactical, puzzle_id, themes
+
+FEN = 'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3'
+SCHOLARS_MATE = 'r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4'
+BACK_RANK = '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'
+KNIGHT_FORK = 'r3k3/8/8/1N6/8/8/8/4K3 w - - 0 1'
+HANGING_QUEEN = '4k3/8/8/3q4/8/8/8/3RK3 w - - 0 1'
+
+
+def make_puzzle(fen, rating, themes, moves=('f3e5',)):
+    return {'id': puzzle_id(fen), 'fen': fen, 'last_move': 'b8c6', 'moves': list(moves), 'rating': rating,
+            'themes': list(themes), 'source': 'games.pgn', 'ply': 4}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PuzzleStore(str(tmp_path / 'puzzles.db'))
+    yield store
+    store.close()
+
+
+FORK = make_puzzle(FEN, 1200, ['fork', 'short'])
+MATE = make_puzzle(BACK_RANK, 900, ['mate', 'mate_in_1', 'short'], moves=('d1d8',))
+HARD = make_puzzle('r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4', 2200,
+                   ['fork', 'long'], moves=('f3g5', 'd7d5', 'e4d5'))
+
+
+def tags(fen, moves, mate=False):
+    return set(themes(chess.Board(fen), [chess.Move.from_uci(m) for m in moves], mate))
+
+
+@pytest.mark.parametrize('fen', [SCHOLARS_MATE, BACK_RANK, KNIGHT_FORK, HANGING_QUEEN])
+def test_tactical_positions_pass_the_pre_filter(fen):
+    assert is_tactical(chess.Board(fen))
+
+
+def test_quiet_positions_are_skipped():
+    assert not is_tactical(chess.Board())
+    assert not is_tactical(chess.Board('4k3/8/8/8/8/8/4P3/4K3 w - - 0 1'))
+
+
+def test_mate_themes():
+    assert {'mate', 'mate_in_1', 'check', 'opening', 'short'} <= tags(SCHOLARS_MATE, ['h5f7'], mate=True)
+    assert tags(BACK_RANK, ['d1d8'], mate=True) == {'mate', 'mate_in_1', 'check', 'endgame', 'short'}
+
+
+def test_fork_and_hanging_piece_themes():
+    assert tags(KNIGHT_FORK, ['b5c7', 'e8d8', 'c7a8']) == {'fork', 'check', 'endgame', 'medium'}
+    assert tags(HANGING_QUEEN, ['d1d5']) == {'hanging_piece', 'endgame', 'short'}
+
+
+def test_puzzle_ids_ignore_clocks_and_en_passant_dialect():
+    after_e4 = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1'
+    assert puzzle_id(after_e4) == puzzle_id(after_e4.replace(' - 0 1', ' e3 5 9'))
+    assert len(puzzle_id(after_e4)) == 12
+
+
+def test_puzzles_round_trip(store):
+    assert store.add([FORK, MATE]) == 2
+    assert store.get(FORK['id']) == FORK
+    assert store.get('missing') is None
+    assert store.count() == 2
+
+
+def test_duplicates_are_not_added_twice(store):
+    store.add([FORK])
+    assert store.add([FORK, MATE]) == 1
+    assert store.themes() == {'fork': 1, 'short': 2, 'mate': 1, 'mate_in_1': 1}
+
+
+def test_query_by_theme_and_rating(store):
+    store.add([FORK, MATE, HARD])
+    assert {p['id'] for p in store.query(theme='fork')} == {FORK['id'], HARD['id']}
+    assert [p['id'] for p in store.query(theme='fork', max_rating=1500)] == [FORK['id']]
+    assert [p['id'] for p in store.query(min_rating=2000)] == [HARD['id']]
+    assert store.query(theme='skewer') == []
+    assert len(store.query(limit=2)) == 2
+
+
+def test_progress_advances_with_the_puzzles(store):
+    assert store.progress('games.pgn') is None
+    store.add([FORK], source='games.pgn', offset=1000, games=1, positions=40)
+    store.add([FORK, MATE], source='games.pgn', offset=2500, games=2, positions=90)
+    assert store.progress('games.pgn') == {'offset': 2500, 'games': 3, 'positions': 130, 'puzzles': 2}
+    store.forget('games.pgn')
+    assert store.progress('games.pgn') is None
+    assert store.count() == 2 # Forgetting progress keeps the puzzles
+
+
+def test_failed_add_stores_nothing(store):
+    broken = {key: value for key, value in MATE.items() if key != 'moves'}
+    with pytest.raises(KeyError):
+        store.add([FORK, broken], source='games.pgn', offset=100, games=1)
+    assert store.count() == 0
+    assert store.progress('games.pgn') is None
+
+
+def test_store_survives_reopening(tmp_path):
+    path = str(tmp_path / 'puzzles.db')
+    store = PuzzleStore(path)
+    store.add([HARD], source='games.pgn', offset=10, games=1)
+    store.close()
+    store = PuzzleStore(path)
+    assert store.get(HARD['id']) == HARD
+    assert store.progress('games.pgn')['offset'] == 10
+    store.close()
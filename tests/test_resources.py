@@ -0,0 +1,68 @@
+import logging
+import pytest
+from chess_engine import resources
+from chess_engine.resources import format_cpu_list, parse_cpu_list, plan_workers
+
+CPUS = list(range(8))
+
+
+@pytest.fixture(autouse=True)
+def memory(monkeypatch):
+    # The host's memory caps the hash; pretend to have plenty unless a test says otherwise
+    monkeypatch.setattr(resources, 'physical_memory_mb', lambda: 64 * 1024)
+
+
+def summary(plan):
+    return [(w['role'], w['threads'], w['hash_mb']) for w in plan]
+
+
+def test_cores_are_split_evenly_by_default():
+    plan = plan_workers(4, cpus=CPUS)
+    assert summary(plan) == [('play', 2, 32)] * 4
+    assert all(w['cpus'] is None and w['numa_policy'] is None for w in plan)
+
+
+def test_analysis_workers_get_the_spare_cores_and_most_hash():
+    plan = plan_workers(4, analysis_workers=2, hash_total_mb=1400, cpus=CPUS)
+    # Two single-threaded players leave 6 cores, 3 per analyser; hash follows threads
+    assert summary(plan) == [('play', 1, 175), ('play', 1, 175), ('analysis', 3, 525), ('analysis', 3, 525)]
+
+
+def test_at_least_one_worker_plays():
+    assert [w['role'] for w in plan_workers(2, analysis_workers=5, cpus=CPUS)] == ['play', 'analysis']
+
+
+def test_explicit_thread_counts_win():
+    plan = plan_workers(3, analysis_workers=1, play_threads=2, analysis_threads=4, hash_total_mb=800, cpus=CPUS)
+    assert summary(plan) == [('play', 2, 200), ('play', 2, 200), ('analysis', 4, 400)]
+
+
+def test_oversubscription_is_allowed_with_a_warning(caplog):
+    with caplog.at_level(logging.WARNING, logger='chess_engine.resources'):
+        plan = plan_workers(4, play_threads=4, cpus=CPUS)
+    assert sum(w['threads'] for w in plan) == 16
+    assert "16 engine threads on 8 CPUs" in caplog.text
+
+
+def test_hash_is_capped_at_half_of_memory(monkeypatch):
+    monkeypatch.setattr(resources, 'physical_memory_mb', lambda: 1000)
+    assert [w['hash_mb'] for w in plan_workers(2, hash_total_mb=4096, cpus=CPUS)] == [250, 250]
+
+
+def test_pinned_workers_take_cpus_node_by_node(monkeypatch):
+    monkeypatch.setattr(resources, 'numa_nodes', lambda cpus: [[0, 1, 2, 3], [4, 5, 6, 7]])
+    plan = plan_workers(3, analysis_workers=1, play_threads=1, analysis_threads=6, pin=True, cpus=CPUS)
+    assert [w['cpus'] for w in plan] == [[0], [1], [2, 3, 4, 5, 6, 7]]
+    assert [w['numa_policy'] for w in plan] == ['0', '1', '2-3:4-7']
+
+
+def test_oversubscribed_pinning_wraps_around(monkeypatch):
+    monkeypatch.setattr(resources, 'numa_nodes', lambda cpus: [[0, 1]])
+    plan = plan_workers(3, play_threads=1, pin=True, cpus=[0, 1])
+    assert [w['cpus'] for w in plan] == [[0], [1], [0]]
+
+
+@pytest.mark.parametrize('text, cpus', [('0-3,8', [0, 1, 2, 3, 8]), ('5', [5]), ('0-1,4-5', [0, 1, 4, 5])])
+def test_cpu_lists_round_trip(text, cpus):
+    assert parse_cpu_list(text) == cpus
+    assert format_cpu_list(cpus) == text
@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+import chess
+import pytest
+from learning.review import MATE_SCORE, GameReviewer, classify, score_cp
+
+SCHOLARS_MATE = '1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0'
+
+
+class BookEngine:
+    """Answers from a book (always cp 0) unless the tables are skipped."""
+
+    def __init__(self, score=80):
+        self.score = score
+        self.calls = []
+
+    def analyze_position(self, fen, num_moves=3, depth=None, tables=True):
+        self.calls.append(tables)
+        if tables:
+            return {'evaluation': {'type': 'cp', 'value': 0}, 'best_moves': [{'Move': 'a2a3'}], 'source': 'book'}
+        return {'evaluation': {'type': 'cp', 'value': self.score}, 'best_moves': [], 'source': 'engine'}
+
+
+class StubPool:
+    size = 2
+
+    def __init__(self, chess_engine):
+        self.chess_engine = chess_engine
+
+    @contextmanager
+    def engine(self, role='play', batch=False):
+        yield self.chess_engine
+
+
+def test_reviews_skip_the_book():
+    chess_engine = BookEngine()
+    review = GameReviewer(StubPool(chess_engine)).review_pgn(SCHOLARS_MATE)
+    assert chess_engine.calls and not any(chess_engine.calls)
+    # Every ply before the mate is scored by the engine, never the book's 0
+    assert [m['evaluation'] for m in review['moves'][:-1]] == [80] * 6
+    assert review['moves'][-1]['evaluation'] == 10000
+
+
+@pytest.mark.parametrize('cp_loss, expected', [
+    (0, 'good'), (49, 'good'), (50, 'inaccuracy'), (99, 'inaccuracy'),
+    (100, 'mistake'), (299, 'mistake'), (300, 'blunder'), (5000, 'blunder'),
+])
+def test_classification_thresholds(cp_loss, expected):
+    assert classify(cp_loss) == expected
+
+
+@pytest.mark.parametrize('evaluation, expected', [
+    ({'type': 'cp', 'value': 35}, 35),
+    ({'type': 'cp', 'value': -420}, -420),
+    ({'type': 'mate', 'value': 1}, MATE_SCORE - 1),
+    ({'type': 'mate', 'value': 7}, MATE_SCORE - 7),
+    ({'type': 'mate', 'value': -2}, -MATE_SCORE + 2),
+])
+def test_score_conversion(evaluation, expected):
+    assert score_cp(evaluation) == expected
+
+
+def test_faster_mates_score_higher_than_any_cp():
+    assert score_cp({'type': 'mate', 'value': 1}) > score_cp({'type': 'mate', 'value': 5}) > 9000
+    assert score_cp({'type': 'mate', 'value': -1}) < score_cp({'type': 'mate', 'value': -5}) < -9000
+
+
+def review(board, move, before, after, best):
+    reviewer = GameReviewer(StubPool(None))
+    return reviewer._review_move(0, board, (chess.Move.from_uci(move), board.san(chess.Move.from_uci(move))),
+                                 [before, after], [best])
+
+
+def test_centipawn_loss_is_from_the_movers_side():
+    board = chess.Board()
+    assert review(board, 'f2f3', 30, -90, 'e2e4')['centipawn_loss'] == 120
+    assert review(board, 'f2f3', 30, -90, 'e2e4')['classification'] == 'mistake'
+    assert review(board, 'd2d4', 30, 60, 'e2e4')['centipawn_loss'] == 0 # Gains count as no loss
+    black = chess.Board('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1')
+    assert review(black, 'g7g5', 30, 400, 'e7e5')['classification'] == 'blunder'
+    assert review(black, 'e7e5', 30, 400, 'e7e5')['classification'] == 'best'
+
+
+def test_missing_a_mate_is_a_blunder():
+    board = chess.Board('6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1')
+    result = review(board, 'g1f1', MATE_SCORE - 1, 0, 'd1d8')
+    assert result['centipawn_loss'] == MATE_SCORE - 1
+    assert result['classification'] == 'blunder'
+    assert result['best_move_san'] == 'Rd8#'
+
+
+def test_summary_caps_each_loss_and_counts_classifications():
+    moves = [
+        {'color': 'white', 'centipawn_loss': 0, 'classification': 'best'},
+        {'color': 'white', 'centipawn_loss': 60, 'classification': 'inaccuracy'},
+        {'color': 'white', 'centipawn_loss': MATE_SCORE, 'classification': 'blunder'}, # Capped at 1000
+        {'color': 'black', 'centipawn_loss': 150, 'classification': 'mistake'},
+        {'color': 'black', 'centipawn_loss': 10, 'classification': 'good'},
+    ]
+    summary = GameReviewer(StubPool(None))._summarize(moves)
+    assert summary['white'] == {'average_centipawn_loss': 353, 'inaccuracies': 1, 'mistakes': 0, 'blunders': 1}
+    assert summary['black'] == {'average_centipawn_loss': 80, 'inaccuracies': 0, 'mistakes': 1, 'blunders': 0}
+    assert GameReviewer(StubPool(None))._summarize([])['white']['average_centipawn_loss'] == 0
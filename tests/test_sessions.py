@@ -0,0 +1,62 @@
+import time
+import chess
+import pytest
+from chess_engine.sessions import SessionStore
+
+AFTER_E4 = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1'
+
+
+def test_sessions_start_from_a_fen_or_the_initial_position():
+    store = SessionStore()
+    assert store.create().board == chess.Board()
+    assert store.create(AFTER_E4).board.fen() == AFTER_E4
+    with pytest.raises(ValueError):
+        store.create('not a fen')
+
+
+def test_sessions_are_found_by_game_id_only():
+    store = SessionStore()
+    session = store.create()
+    assert store.get(session.game_id) is session
+    assert store.get(session.watch_id) is None
+    assert store.get(None) is None and store.get('') is None
+
+
+def test_watch_id_only_finds_the_session_for_spectators():
+    store = SessionStore()
+    session = store.create()
+    assert session.watch_id != session.game_id
+    assert store.get_watched(session.watch_id) is session
+    assert store.get_watched(session.game_id) is None
+
+
+def test_discarded_sessions_are_gone_for_players_and_spectators():
+    store = SessionStore()
+    session = store.create()
+    store.discard(session.game_id)
+    assert store.get(session.game_id) is None
+    assert store.get_watched(session.watch_id) is None
+    assert len(store) == 0
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(ttl=60)
+    idle = store.create()
+    idle.touched = time.monotonic() - 120
+    active = store.create() # Creating a session expires idle ones
+    assert store.get(idle.game_id) is None
+    assert store.get_watched(idle.watch_id) is None
+    assert store.get(active.game_id) is active
+
+
+def test_oldest_sessions_are_evicted_beyond_the_limit():
+    store = SessionStore(max_sessions=2)
+    first = store.create()
+    second = store.create()
+    first.touched -= 10
+    second.touched -= 5
+    third = store.create()
+    assert len(store) == 2
+    assert store.get(first.game_id) is None
+    assert store.get_watched(first.watch_id) is None
+    assert store.get(third.game_id) is third
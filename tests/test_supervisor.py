@@ -0,0 +1,20 @@
+from chess_engine.supervisor import SEARCH_MARGIN, EngineSupervisor
+
+
+class Engine:
+    def __init__(self, limit):
+        self.limit = limit
+
+    def busy_limit(self):
+        return self.limit
+
+
+def test_searches_with_a_movetime_get_a_margin_past_it():
+    supervisor = EngineSupervisor(factory=None, search_timeout=600)
+    assert supervisor.timeout_for(Engine(2.5)) == 2.5 + SEARCH_MARGIN
+    assert supervisor.timeout_for(Engine(900)) == 900 + SEARCH_MARGIN # Longer than the default
+
+
+def test_other_waits_get_the_search_timeout():
+    assert EngineSupervisor(factory=None).timeout_for(Engine(None)) == 600
+    assert EngineSupervisor(factory=None, search_timeout=1800).timeout_for(Engine(None)) == 1800
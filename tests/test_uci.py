@@ -0,0 +1,93 @@
+import pytest
+from chess_engine.uci import build_analysis, parse_bestmove, parse_info, search_stats
+
+INFO_LINES = [
+    ('info depth 18 seldepth 24 multipv 1 score cp 35 nodes 412000 nps 820000 hashfull 120 tbhits 0 time 502 pv e2e4 e7e5',
+     {'depth': 18, 'seldepth': 24, 'multipv': 1, 'score_type': 'cp', 'score': 35, 'nodes': 412000, 'nps': 820000,
+      'hashfull': 120, 'tbhits': 0, 'time': 502, 'pv': ['e2e4', 'e7e5']}),
+    ('info depth 12 score cp -140 pv g8f6',
+     {'depth': 12, 'score_type': 'cp', 'score': -140, 'pv': ['g8f6']}),
+    ('info depth 20 multipv 2 score mate 3 pv d1h5 g7g6 h5f7',
+     {'depth': 20, 'multipv': 2, 'score_type': 'mate', 'score': 3, 'pv': ['d1h5', 'g7g6', 'h5f7']}),
+    ('info depth 9 score mate -2 pv e1f1',
+     {'depth': 9, 'score_type': 'mate', 'score': -2, 'pv': ['e1f1']}),
+    ('info depth 15 score cp 50 lowerbound nodes 900 pv d2d4',
+     {'depth': 15, 'score_type': 'cp', 'score': 50, 'bound': 'lowerbound', 'nodes': 900, 'pv': ['d2d4']}),
+    ('info depth 15 score cp 20 upperbound nodes 950',
+     {'depth': 15, 'score_type': 'cp', 'score': 20, 'bound': 'upperbound', 'nodes': 950}),
+    ('info depth 10 score cp 12 wdl 400 500 100 pv c2c4',
+     {'depth': 10, 'score_type': 'cp', 'score': 12, 'wdl': [400, 500, 100], 'pv': ['c2c4']}),
+]
+
+NOT_INFO = [
+    'info string NNUE evaluation using nn-1111cefa1111.nnue',
+    'info depth 5 currmove e2e4 currmovenumber 1',
+    'bestmove e2e4',
+    'readyok',
+    '',
+]
+
+BESTMOVES = [
+    ('bestmove e2e4', ('e2e4', None)),
+    ('bestmove e7e8q ponder d1d8', ('e7e8q', 'd1d8')),
+    ('bestmove (none)', (None, None)),
+    ('bestmove', (None, None)),
+    ('info depth 1 score cp 0', None),
+]
+
+
+@pytest.mark.parametrize('line, expected', INFO_LINES)
+def test_parse_info(line, expected):
+    assert parse_info(line) == expected
+
+
+@pytest.mark.parametrize('line', NOT_INFO)
+def test_lines_without_a_score_are_skipped(line):
+    assert parse_info(line) is None
+
+
+@pytest.mark.parametrize('line, expected', BESTMOVES)
+def test_parse_bestmove(line, expected):
+    assert parse_bestmove(line) == expected
+
+
+def multipv(*lines):
+    infos = {}
+    for line in lines:
+        info = parse_info(line)
+        infos[info.get('multipv', 1)] = info
+    return infos
+
+
+def test_analysis_lists_lines_by_multipv_and_scores_them_for_white():
+    infos = multipv('info depth 16 multipv 3 score cp -80 pv f7f6',
+                    'info depth 16 multipv 1 score cp 40 pv g8f6 b1c3',
+                    'info depth 16 multipv 2 score mate -4 pv d8h4')
+    # Black to move: scores flip sign
+    analysis = build_analysis(infos, white_to_move=False)
+    assert analysis['evaluation'] == {'type': 'cp', 'value': -40}
+    assert analysis['depth'] == 16
+    assert analysis['best_moves'] == [
+        {'Move': 'g8f6', 'Centipawn': -40, 'Mate': None, 'PV': ['g8f6', 'b1c3']},
+        {'Move': 'd8h4', 'Centipawn': None, 'Mate': 4, 'PV': ['d8h4']},
+        {'Move': 'f7f6', 'Centipawn': 80, 'Mate': None, 'PV': ['f7f6']},
+    ]
+
+
+def test_mate_evaluation_comes_from_the_first_line():
+    analysis = build_analysis(multipv('info depth 22 score mate 2 pv h5f7'), white_to_move=True)
+    assert analysis['evaluation'] == {'type': 'mate', 'value': 2}
+    assert analysis['best_moves'][0]['Mate'] == 2
+
+
+def test_analysis_without_lines_is_even():
+    assert build_analysis({}, True) == {'evaluation': {'type': 'cp', 'value': 0}, 'best_moves': [], 'depth': 0}
+    # Checkmated side to move: a score but no moves
+    assert build_analysis(multipv('info depth 0 score mate 0'), True)['best_moves'] == []
+
+
+def test_search_stats_take_the_furthest_line():
+    infos = multipv('info depth 14 multipv 1 score cp 10 nodes 5000 nps 100000 time 50 pv e2e4',
+                    'info depth 13 multipv 2 score cp 5 nodes 5200 nps 104000 time 50 pv d2d4')
+    assert search_stats(infos) == {'depth': 14, 'nodes': 5200, 'nps': 104000, 'time': 50}
+    assert search_stats({}) == {'depth': 0, 'nodes': 0, 'nps': 0, 'time': 0}
@@ -0,0 +1,78 @@
+import pytest
+from chess_engine.wire import UNSET, DeltaChannel, diff, encode, negotiate, patch
+
+STATES = [
+    ({}, {}),
+    ({'a': 1}, {'a': 1}),
+    ({'a': 1}, {'a': 2}),
+    ({'a': 1, 'b': 2}, {'a': 1}),
+    ({}, {'a': {'b': 1}}),
+    ({'a': {'b': 1, 'c': 2}}, {'a': {'b': 1, 'c': 3, 'd': 4}}),
+    ({'a': {'b': {'c': 1, 'd': 2}}}, {'a': {'b': {'c': 1}}}),
+    ({'a': {'b': 1}}, {'a': None}),
+    ({'a': None}, {'a': {'b': 1}}),
+    ({'a': {'b': 1}}, {'a': 5}),
+    ({'a': [1, 2]}, {'a': [1, 2, 3]}),
+    ({'analysis': {'evaluation': {'type': 'cp', 'value': 30}, 'best_moves': [{'Move': 'e2e4'}]}, 'ai_move': None},
+     {'analysis': {'evaluation': {'type': 'mate', 'value': 3}, 'best_moves': []}, 'ai_move': 'e7e5'}),
+]
+
+
+@pytest.mark.parametrize('old, new', STATES)
+def test_patch_of_diff_gives_the_new_state(old, new):
+    assert patch(old, diff(old, new)) == new
+
+
+def test_equal_states_have_an_empty_diff():
+    assert diff({'a': {'b': 1}}, {'a': {'b': 1}}) == {}
+
+
+def test_diff_holds_only_changes():
+    old = {'fen': 'x', 'analysis': {'depth': 10, 'evaluation': {'value': 1}}}
+    new = {'fen': 'x', 'analysis': {'depth': 12, 'evaluation': {'value': 1}}}
+    assert diff(old, new) == {'analysis': {'depth': 12}}
+
+
+def test_removed_keys_are_unset():
+    assert diff({'a': 1, 'b': 2, 'c': 3}, {'a': 1}) == {UNSET: ['b', 'c']}
+    assert diff({'a': {'b': 1, 'c': 2}}, {'a': {'b': 1}}) == {'a': {UNSET: ['c']}}
+
+
+def test_patch_leaves_the_old_state_alone():
+    old = {'a': {'b': 1}, 'c': 2}
+    patch(old, {'a': {'b': 2}, UNSET: ['c']})
+    assert old == {'a': {'b': 1}, 'c': 2}
+
+
+def test_channel_numbers_states_and_chains_deltas():
+    channel = DeltaChannel()
+    assert channel.snapshot() is None
+
+    full, delta = channel.update({'fen': 'a', 'depth': 1})
+    assert full == {'seq': 1, 'full': {'fen': 'a', 'depth': 1}}
+    assert delta is None
+
+    held = full
+    for seq, state in enumerate([{'fen': 'b', 'depth': 1}, {'fen': 'b'}, {'fen': 'c', 'ai_move': 'e2e4'}], start=2):
+        full, delta = channel.update(state)
+        assert full == {'seq': seq, 'full': state}
+        assert delta['seq'] == seq and delta['base'] == held['seq']
+        held = {'seq': delta['seq'], 'full': patch(held['full'], delta['delta'])}
+        assert held['full'] == state
+    assert channel.seq == 4
+    assert channel.snapshot() == {'seq': 4, 'full': {'fen': 'c', 'ai_move': 'e2e4'}}
+
+
+def test_reset_sends_the_next_state_in_full():
+    channel = DeltaChannel()
+    channel.update({'a': 1})
+    channel.reset()
+    full, delta = channel.update({'a': 2})
+    assert delta is None and full == {'seq': 2, 'full': {'a': 2}}
+
+
+def test_json_needs_no_encoding():
+    message = {'seq': 1, 'full': {}}
+    assert negotiate('json') == 'json'
+    assert negotiate(None) == 'json'
+    assert encode(message, 'json') is message